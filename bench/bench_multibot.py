@@ -0,0 +1,75 @@
+"""
+Memory per bot: start one process serving N bots (BOTS_FILE) and compare its RSS
+with N separate single-bot processes. Each child imports bot.py, builds every
+Application and opens every bot's code store with some codes in it, i.e. everything
+a bot holds before it connects to Telegram.
+
+    python bench/bench_multibot.py --bots 1 2 5 10 --codes 2000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+CHILD = r"""
+import sys
+sys.path.insert(0, {root!r})
+import bot
+
+def load(instance, codes):
+    def seed():
+        bot.init_store()
+        if len(bot.codes) < codes:
+            for i in range(codes):
+                bot.codes[f"C{{i:06d}}"] = {{"text": "reward", "used_by": [], "limit": 100, "media": None, "created_by": 1}}
+        bot.load_user_lists()
+        list(bot.codes.values())[:100]
+    bot.run_as(instance, seed)
+
+for instance in bot.BOTS.values():
+    bot.build_application(instance)
+    load(instance, {codes})
+with open("/proc/self/status") as f:
+    print(next(int(line.split()[1]) for line in f if line.startswith("VmRSS:")))
+"""
+
+
+def rss_kb(n_bots: int, codes: int, data_dir: str) -> int:
+    env = {**os.environ, "BOT_TOKEN": "1:BENCH", "ADMIN_IDS": "1", "DATA_DIR": data_dir}
+    if n_bots > 1:
+        bots_file = os.path.join(data_dir, "bots.json")
+        with open(bots_file, "w") as f:
+            json.dump([{"name": f"shop{i}", "token": f"{i}:BENCH", "admin_ids": [1]} for i in range(2, n_bots + 1)], f)
+        env["BOTS_FILE"] = bots_file
+    out = subprocess.run(
+        [sys.executable, "-c", CHILD.format(root=ROOT, codes=codes)],
+        env=env, capture_output=True, text=True, check=True,
+    )
+    return int(out.stdout.strip().splitlines()[-1])
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--bots", type=int, nargs="+", default=[1, 2, 5, 10])
+    parser.add_argument("--codes", type=int, default=2000, help="codes per bot")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        rss_kb(max(args.bots), args.codes, data_dir)  # seed every store once so runs only load
+        single = rss_kb(1, args.codes, data_dir)
+        print(f"one bot per process: {single / 1024:7.1f} MB")
+        for n in sorted(set(args.bots) - {1}):
+            shared = rss_kb(n, args.codes, data_dir)
+            per_extra = (shared - single) / (n - 1)
+            print(
+                f"{n:3d} bots: shared process {shared / 1024:7.1f} MB vs separate {n * single / 1024:7.1f} MB"
+                f"  -> {per_extra / 1024:5.2f} MB per extra bot ({100 * per_extra / single:4.1f}% of a process)"
+            )
+
+
+if __name__ == "__main__":
+    main()
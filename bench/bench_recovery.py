@@ -0,0 +1,103 @@
+"""
+Restart recovery benchmark: seed a code store with redemptions and owed rewards,
+then time what a restarting process does before it can poll again
+(init_store + recover_pending_rewards).
+
+    python bench/bench_recovery.py --codes 100000 --redeemers 20 --pending 500
+"""
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+os.environ.setdefault("BOT_TOKEN", "123456:BENCH")
+os.environ.setdefault("ADMIN_IDS", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import bot  # noqa: E402
+
+
+class NullBot:
+    """Answers every send instantly so only our own recovery work is measured."""
+
+    class _Message:
+        message_id = 1
+
+    async def send_message(self, **kwargs):
+        return self._Message()
+
+
+class NullApplication:
+    bot = NullBot()
+
+
+def seed(n_codes: int, redeemers: int, n_pending: int) -> None:
+    bot.init_store()
+    with bot._store:
+        bot._store.execute("BEGIN")
+        for i in range(n_codes):
+            code = f"CODE{i:07d}"
+            bot.codes[code] = {
+                "text": "reward",
+                "used_by": random.sample(range(1, 10_000_000), redeemers),
+                "limit": redeemers * 2,
+                "media": None,
+                "created_by": 1,
+            }
+    for update_id in range(1, bot.UPDATE_DEDUP_WINDOW + 1):
+        bot.complete_update(update_id)
+    for i in range(n_pending):
+        code = f"CODE{i % n_codes:07d}"
+        bot.journal_redemption(code, bot.UPDATE_DEDUP_WINDOW + 1 + i, 1000 + i, 1000 + i)
+    bot._store.close()
+
+
+def reset() -> None:
+    bot.codes.reset()
+    bot._processed_ids.clear()
+    bot._processed_order.clear()
+    bot._rewards_in_flight.clear()
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--codes", type=int, default=20_000)
+    parser.add_argument("--redeemers", type=int, default=10, help="redeemers per code")
+    parser.add_argument("--pending", type=int, default=200, help="rewards owed at restart")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+    bot.logger.setLevel(logging.WARNING)
+
+    with tempfile.TemporaryDirectory() as data_dir:
+        bot.DATA_DIR = data_dir
+        seed(args.codes, args.redeemers, args.pending)
+        print(f"codes={args.codes} redeemers/code={args.redeemers} pending={args.pending}")
+        for run in range(args.runs):
+            reset()
+            start = time.perf_counter()
+            bot.init_store()
+            loaded = time.perf_counter()
+            asyncio.run(bot.recover_pending_rewards(NullApplication()))
+            done = time.perf_counter()
+            print(
+                f"run {run + 1}: load {1000 * (loaded - start):8.1f} ms  "
+                f"recover {1000 * (done - loaded):8.1f} ms  "
+                f"total {1000 * (done - start):8.1f} ms"
+            )
+            bot._store.close()
+            # recovery consumed the owed rewards: re-seed them for the next run
+            if run + 1 < args.runs:
+                reset()
+                bot.init_store()
+                for i in range(args.pending):
+                    code = f"CODE{i % args.codes:07d}"
+                    bot.journal_redemption(code, 10**9 + run * args.pending + i, 1000 + i, 1000 + i)
+                bot._store.close()
+
+
+if __name__ == "__main__":
+    main()
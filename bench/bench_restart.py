@@ -0,0 +1,174 @@
+"""
+Restart script: starts `python bot.py` against a local fake Bot API, restarts it through
+POST /restart a few times and measures the gap in which no updates are fetched.
+
+The gap is measured twice: by the bot itself (/metrics "restart_gap_ms": from the old
+process stopping polling to the new one polling) and from outside, as the longest pause
+between two getUpdates calls the fake API sees. It also checks that repeated restarts
+keep a single supervisor: the original PID stays alive with exactly one bot below it.
+Exits non-zero if a gap exceeds --max-gap.
+
+    python bench/bench_restart.py --codes 50000 --restarts 3 --max-gap 1000
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_startup import BOT_PY, ROOT, free_port, get_json, seed
+
+SECRET = "bench-secret"
+
+
+def fake_bot_api(latency: float, poll: float, polls: list) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            method = self.path.rsplit("/", 1)[-1]
+            time.sleep(latency)
+            if method == "getMe":
+                result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+            elif method == "getUpdates":
+                polls.append(time.monotonic())
+                time.sleep(poll)
+                result = []
+            else:
+                result = True
+            body = json.dumps({"ok": True, "result": result}).encode()
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):  # the old process stopped mid long-poll
+                pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def descendants(pid: int) -> list:
+    try:
+        with open(f"/proc/{pid}/task/{pid}/children") as f:
+            children = [int(child) for child in f.read().split()]
+    except OSError:
+        return []
+    return children + [grandchild for child in children for grandchild in descendants(child)]
+
+
+def serving_pid(root_pid: int) -> int:
+    """The bot process: the one started, or the newest below it once it became the supervisor."""
+    with open(f"/proc/{root_pid}/cmdline", "rb") as f:
+        supervisor = b"waitpid" in f.read()
+    children = descendants(root_pid)
+    return children[0] if supervisor and children else root_pid
+
+
+def post_restart(port: int) -> None:
+    request = urllib.request.Request(
+        f"http://127.0.0.1:{port}/restart", data=json.dumps({"secret": SECRET}).encode(),
+        headers={"Content-Type": "application/json"}, method="POST",
+    )
+    with urllib.request.urlopen(request, timeout=5) as resp:
+        resp.read()
+
+
+def wait_ready(port: int, timeout: float = 60) -> dict:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if get_json(f"http://127.0.0.1:{port}/health")["ready"]:
+                return get_json(f"http://127.0.0.1:{port}/metrics")
+        except OSError:
+            pass
+        time.sleep(0.02)
+    raise RuntimeError("bot did not become ready")
+
+
+def restart(port: int, root_pid: int, polls: list, poll: float) -> dict:
+    bot_pid = serving_pid(root_pid)
+    first_poll = len(polls)
+    post_restart(port)
+    # done once the old bot has exited, so the status server that answers is the new one
+    deadline = time.monotonic() + 120
+    while serving_pid(root_pid) == bot_pid:
+        if time.monotonic() > deadline:
+            raise RuntimeError("restart did not complete")
+        time.sleep(0.02)
+    metrics = wait_ready(port)
+    time.sleep(5 * poll)  # a few polls by the new process
+    pauses = [b - a for a, b in zip(polls[first_poll:], polls[first_poll + 1:])]
+    return {
+        "gap_ms": metrics["restart_gap_ms"],
+        "external_gap_ms": (max(pauses) - poll) * 1000 if pauses else float("inf"),
+        "timeline": metrics["startup_ms"],
+        "processes": 1 + len(descendants(root_pid)),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--codes", type=int, default=50_000)
+    parser.add_argument("--restarts", type=int, default=3)
+    parser.add_argument("--latency", type=float, default=0.05, help="seconds added to every Bot API call")
+    parser.add_argument("--poll", type=float, default=0.05, help="seconds each getUpdates call is held")
+    parser.add_argument("--max-gap", type=float, default=1000, help="fail if a gap exceeds this (ms)")
+    args = parser.parse_args()
+
+    polls: list = []
+    api = fake_bot_api(args.latency, args.poll, polls)
+    failed = False
+    with tempfile.TemporaryDirectory() as data_dir:
+        seed(data_dir, args.codes)
+        port = free_port()
+        env = {
+            **os.environ,
+            "BOT_TOKEN": "1:BENCH",
+            "ADMIN_IDS": "1",
+            "DATA_DIR": data_dir,
+            "PORT": str(port),
+            "WEB_SECRET": SECRET,
+            "BOT_API_URL": f"http://127.0.0.1:{api.server_port}",
+        }
+        for name in ("BOT_HANDOFF", "BOT_SUPERVISOR_PID"):
+            env.pop(name, None)
+        log = open(os.path.join(data_dir, "bot.log"), "w")
+        proc = subprocess.Popen([sys.executable, BOT_PY], cwd=ROOT, env=env,
+                                stdout=subprocess.DEVNULL, stderr=log)
+        try:
+            wait_ready(port)
+            print(f"{args.restarts} restarts, {args.codes} codes, {args.latency * 1000:.0f} ms per Bot API call:")
+            for i in range(args.restarts):
+                r = restart(port, proc.pid, polls, args.poll)
+                phases = ", ".join(f"{phase} {ms:.0f}" for phase, ms in sorted(r["timeline"].items(), key=lambda x: x[1]))
+                print(f"  restart {i + 1}: gap {r['gap_ms']:6.1f} ms (seen by the API: {r['external_gap_ms']:6.1f} ms), "
+                      f"{r['processes']} processes under PID {proc.pid}")
+                print(f"    new process timeline (ms): {phases}")
+                if max(r["gap_ms"], r["external_gap_ms"]) > args.max_gap:
+                    print(f"    FAIL: gap above {args.max_gap:.0f} ms")
+                    failed = True
+                if r["processes"] != 2:
+                    print("    FAIL: expected the supervisor and one bot process")
+                    failed = True
+        finally:
+            proc.terminate()  # forwarded to the current bot by the supervisor
+            proc.wait(timeout=30)
+            log.close()
+    api.shutdown()
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
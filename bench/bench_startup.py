@@ -0,0 +1,167 @@
+"""
+Cold start benchmark: how long a freshly started `python bot.py` takes to answer the
+health check and to start polling, against a local fake Bot API that adds a fixed
+latency to every call (a host waking up talks to a far away api.telegram.org).
+
+Reports import time per phase (from `python -X importtime`) and the startup timeline
+the bot records itself (/metrics "startup_ms").
+
+    python bench/bench_startup.py --codes 50000 --latency 0.3 --runs 3
+"""
+import argparse
+import json
+import os
+import re
+import socket
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+BOT_PY = os.path.join(ROOT, "bot.py")
+
+
+def fake_bot_api(latency: float) -> ThreadingHTTPServer:
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            method = self.path.rsplit("/", 1)[-1]
+            time.sleep(latency)
+            if method == "getMe":
+                result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+            elif method == "getUpdates":
+                time.sleep(1)
+                result = []
+            else:
+                result = True
+            body = json.dumps({"ok": True, "result": result}).encode()
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except BrokenPipeError:  # the bot was stopped mid long-poll
+                pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def seed(data_dir: str, n_codes: int) -> None:
+    db = sqlite3.connect(os.path.join(data_dir, "bot.db"))
+    db.execute("CREATE TABLE IF NOT EXISTS codes (code TEXT PRIMARY KEY, data TEXT NOT NULL)")
+    record = json.dumps({"text": "reward", "used_by": list(range(20)), "limit": 40, "media": None, "created_by": 1})
+    db.executemany("INSERT OR REPLACE INTO codes VALUES (?, ?)", ((f"C{i:07d}", record) for i in range(n_codes)))
+    db.commit()
+    db.close()
+
+
+def import_phases(env: dict) -> dict:
+    """Cumulative import time (ms) of the top-level modules `import bot` pulls in."""
+    out = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import bot"],
+        cwd=ROOT, env=env, capture_output=True, text=True, check=True,
+    )
+    phases = {"flask": 0.0, "telegram (+httpx)": 0.0, "other libraries": 0.0, "bot.py body": 0.0}
+    children = []  # importtime prints a module's imports (indented) before the module itself
+    for line in out.stderr.splitlines():
+        m = re.match(r"import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)", line)
+        if not m:
+            continue
+        self_us, cumulative_us, depth, name = int(m.group(1)), int(m.group(2)), len(m.group(3)), m.group(4)
+        if depth == 3:
+            children.append((name.split(".")[0], cumulative_us / 1000))
+        elif depth == 1:
+            if name == "bot":
+                phases["bot.py body"] = self_us / 1000
+                for child, ms in children:
+                    key = {"flask": "flask", "telegram": "telegram (+httpx)"}.get(child, "other libraries")
+                    phases[key] += ms
+            children = []
+    return phases
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def get_json(url: str):
+    with urllib.request.urlopen(url, timeout=1) as resp:
+        return json.loads(resp.read())
+
+
+def cold_start(env: dict, port: int) -> dict:
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, BOT_PY], cwd=ROOT, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    health = ready = None
+    try:
+        while ready is None and time.perf_counter() - started < 60:
+            try:
+                body = get_json(f"http://127.0.0.1:{port}/health")
+            except OSError:
+                time.sleep(0.005)
+                continue
+            now = time.perf_counter() - started
+            health = health if health is not None else now
+            if body["ready"]:
+                ready = now
+            else:
+                time.sleep(0.005)
+        timeline = get_json(f"http://127.0.0.1:{port}/metrics")["startup_ms"]
+    finally:
+        proc.terminate()
+        proc.wait()
+    return {"health_ms": health * 1000, "ready_ms": ready * 1000, "timeline": timeline}
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--codes", type=int, default=50_000)
+    parser.add_argument("--latency", type=float, default=0.3, help="seconds added to every Bot API call")
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    api = fake_bot_api(args.latency)
+    with tempfile.TemporaryDirectory() as data_dir:
+        seed(data_dir, args.codes)
+        port = free_port()
+        env = {
+            **os.environ,
+            "BOT_TOKEN": "1:BENCH",
+            "ADMIN_IDS": "1",
+            "DATA_DIR": data_dir,
+            "PORT": str(port),
+            "BOT_API_URL": f"http://127.0.0.1:{api.server_port}",
+        }
+        env.pop("BOT_HANDOFF", None)
+
+        print("import time per phase (import bot):")
+        for phase, ms in import_phases(env).items():
+            print(f"  {phase:<20} {ms:7.1f} ms")
+
+        runs = [cold_start(env, port) for _ in range(args.runs)]
+        best = min(runs, key=lambda r: r["ready_ms"])
+        print(f"\ncold start, {args.codes} codes, {args.latency * 1000:.0f} ms per Bot API call (best of {args.runs}):")
+        print(f"  health check answered  {best['health_ms']:7.0f} ms after spawn")
+        print(f"  polling                {best['ready_ms']:7.0f} ms after spawn")
+        print("  timeline inside the process (ms since bot.py started loading):")
+        for phase, ms in sorted(best["timeline"].items(), key=lambda item: item[1]):
+            print(f"    {phase:<20} {ms:7.1f}")
+    api.shutdown()
+
+
+if __name__ == "__main__":
+    main()
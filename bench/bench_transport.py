@@ -0,0 +1,179 @@
+"""
+Transport benchmark: run a broadcast while users redeem a code and measure the /redeem
+latency (full update dispatch, three Bot API calls each) against a fake Bot API that
+answers every call after a fixed latency. Compares broadcasts sharing the handlers'
+connection pool ("shared", the old behaviour) with broadcasts on their own pool
+("split", BotInstance.bulk_bot).
+
+    python bench/bench_transport.py --workers 32 --recipients 3000 --redeems 300
+"""
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def serve_fake_api(port: int, latency: float) -> None:
+    """Bot API stand-in (run in its own process so it does not share the bot's GIL)."""
+    message = {"message_id": 1, "date": 0, "chat": {"id": 1, "type": "private"}}
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = "HTTP/1.1"  # keep-alive, like api.telegram.org
+
+        def log_message(self, *args):
+            pass
+
+        def do_POST(self):
+            self.rfile.read(int(self.headers.get("Content-Length", 0)))
+            time.sleep(latency)
+            if self.path.endswith("/getMe"):
+                result = {"id": 1, "is_bot": True, "first_name": "bench", "username": "bench_bot"}
+            else:
+                result = message
+            body = json.dumps({"ok": True, "result": result}).encode()
+            try:
+                self.send_response(200)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+            except BrokenPipeError:  # the broadcast was cancelled mid-request
+                pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", port), Handler)
+    server.daemon_threads = True
+    server.serve_forever()
+
+
+def redeem_update(update_id: int, user_id: int, code: str) -> dict:
+    text = f"/redeem {code}"
+    return {
+        "update_id": update_id,
+        "message": {
+            "message_id": update_id,
+            "date": int(time.time()),
+            "chat": {"id": user_id, "type": "private"},
+            "from": {"id": user_id, "is_bot": False, "first_name": "user"},
+            "text": text,
+            "entities": [{"type": "bot_command", "offset": 0, "length": len("/redeem")}],
+        },
+    }
+
+
+def pct(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] * 1000
+
+
+async def scenario(bot, shared: bool, args, first_update_id: int) -> dict:
+    from telegram import Update
+
+    instance = bot.BOTS["main"]
+    app = bot.build_application(instance)
+    if shared:
+        instance.bulk_bot = app.bot
+    await asyncio.gather(app.initialize(), instance.bulk_bot.initialize())
+
+    job = {
+        "code": "CROWD", "from_chat_id": 1, "message_id": 1, "status_chat_id": 1, "status_message_id": 1,
+        "started_at": time.time(), "cursor": 0, "sent": 0, "blocked": 0, "failed": 0, "skipped": 0,
+    }
+    bot.save_json_state(bot.BROADCAST_RECIPIENTS_FILE, list(bot.iter_redeemers("CROWD")))
+    broadcast = asyncio.create_task(bot.run_broadcast(bot.bulk_bot(app.bot), job))
+    await asyncio.sleep(0.5)  # let the broadcast reach full speed
+
+    latencies = []
+
+    async def one(i: int) -> None:
+        update = Update.de_json(redeem_update(first_update_id + i, 10_000_000 + first_update_id + i, "REWARD"), app.bot)
+        started = time.perf_counter()
+        await app.process_update(update)
+        latencies.append(time.perf_counter() - started)
+
+    tasks = []
+    for i in range(args.redeems):
+        tasks.append(asyncio.create_task(one(i)))
+        await asyncio.sleep(1 / args.redeem_rate)
+    await asyncio.gather(*tasks)
+    broadcast_done = broadcast.done()
+    broadcast.cancel()
+    try:
+        await broadcast
+    except asyncio.CancelledError:
+        pass
+    bot.delete_json_state(bot.BROADCAST_CHECKPOINT_FILE)
+    metrics = instance.metrics()["transport"]
+    await asyncio.gather(app.shutdown(), instance.bulk_bot.shutdown() if not shared else asyncio.sleep(0))
+    return {
+        "p50": pct(latencies, 0.5),
+        "p99": pct(latencies, 0.99),
+        "sent": job["sent"],
+        "broadcast_finished": broadcast_done,
+        "interactive_wait_p99": metrics["interactive"]["pool_wait_ms"]["p99"],
+        "bulk_wait_p99": metrics["bulk"]["pool_wait_ms"]["p99"],
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--workers", type=int, default=32, help="BROADCAST_WORKERS")
+    parser.add_argument("--pool", type=int, default=32, help="interactive pool size (bulk gets workers + 2)")
+    parser.add_argument("--recipients", type=int, default=3000)
+    parser.add_argument("--redeems", type=int, default=300)
+    parser.add_argument("--redeem-rate", type=float, default=50, help="redeems started per second")
+    parser.add_argument("--latency", type=float, default=0.02, help="seconds per Bot API call")
+    parser.add_argument("--port", type=int, default=8998)
+    args = parser.parse_args()
+
+    api = subprocess.Popen([sys.executable, __file__, "--serve", str(args.port), str(args.latency)])
+    data_dir = tempfile.mkdtemp()
+    os.environ.update({
+        "BOT_TOKEN": "1:BENCH",
+        "ADMIN_IDS": "1",
+        "DATA_DIR": data_dir,
+        "BOT_API_URL": f"http://127.0.0.1:{args.port}",
+        "BROADCAST_WORKERS": str(args.workers),
+        "BROADCAST_RATE": "100000",  # a local Bot API server, or a burst within Telegram's allowance
+        "BOT_API_POOLS": json.dumps({"interactive": {"pool_size": args.pool}}),
+    })
+    sys.path.insert(0, ROOT)
+    import logging
+
+    import bot
+
+    logging.getLogger().setLevel(logging.WARNING)
+    bot.init_store()
+    bot.codes["CROWD"] = {"text": "x", "used_by": list(range(1, args.recipients + 1)), "limit": args.recipients,
+                          "media": None, "created_by": None}
+    bot.codes["REWARD"] = {"text": "reward", "used_by": [], "limit": 10**9, "media": None, "created_by": 1}
+    time.sleep(0.5)  # fake API starting
+
+    try:
+        results = {}
+        for offset, name in enumerate(("shared", "split")):
+            results[name] = asyncio.run(scenario(bot, name == "shared", args, (offset + 1) * 1_000_000))
+        print(f"{args.redeems} redeems at {args.redeem_rate:.0f}/s during a {args.workers}-worker broadcast, "
+              f"{args.latency * 1000:.0f} ms per Bot API call, interactive pool {args.pool}:")
+        for name, r in results.items():
+            print(
+                f"  {name:<6} /redeem p50 {r['p50']:6.1f} ms  p99 {r['p99']:6.1f} ms | "
+                f"pool wait p99: interactive {r['interactive_wait_p99']:6.1f} ms, bulk {r['bulk_wait_p99']:6.1f} ms | "
+                f"broadcast sent {r['sent']}"
+            )
+    finally:
+        api.terminate()
+        bot._store.close()
+
+
+if __name__ == "__main__":
+    if len(sys.argv) == 4 and sys.argv[1] == "--serve":
+        serve_fake_api(int(sys.argv[2]), float(sys.argv[3]))
+    else:
+        main()
@@ -1,24 +1,63 @@
 # bot_with_termux_status_and_styled_ping.py
+from __future__ import annotations  # handler annotations name Telegram types bound by load_telegram()
+
 import os
+import html
+import json
+import asyncio
 import random
+import re
 import string
 import logging
 import time
-from threading import Thread
-from typing import Set, Dict, Any, List
-
+import signal
+import sqlite3
+import subprocess
+import sys
+from contextlib import contextmanager
+from contextvars import ContextVar
+from collections import OrderedDict, deque
+from collections.abc import MutableMapping
+from threading import Lock, Thread, current_thread, main_thread
+from types import MappingProxyType
+from typing import Set, Dict, Any, List, Optional, Iterator, Tuple, FrozenSet, Mapping, NamedTuple
+
+# Flask is imported up front: it answers the health check while the rest of startup runs
 from flask import Flask, render_template_string, jsonify, request, Response
-from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup
-from telegram.ext import (
-    ApplicationBuilder,
-    CommandHandler,
-    CallbackQueryHandler,
-    ContextTypes,
-    MessageHandler,
-    filters,
-)
-from telegram.error import Forbidden, BadRequest
-from telegram.constants import ParseMode  # For HTML parse mode
+
+# python-telegram-bot (and httpx under it) is the slowest import by far. main() binds it
+# with load_telegram() once the status server is listening; importing bot.py as a module
+# (tests, benchmarks) binds it straight away, see the end of this file.
+def load_telegram() -> None:
+    global Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile, InputMediaPhoto, InputMediaDocument
+    global Application, ApplicationBuilder, CommandHandler, CallbackQueryHandler, ContextTypes, MessageHandler
+    global TypeHandler, CallbackContext, ApplicationHandlerStop, filters, Forbidden, BadRequest, RetryAfter
+    global ParseMode, ExtBot, TimedOut, GuardedApplication, MeteredRequest
+    if "GuardedApplication" in globals():
+        return
+    from telegram import Update, InlineKeyboardButton, InlineKeyboardMarkup, InputFile, InputMediaPhoto, InputMediaDocument
+    from telegram.ext import (
+        Application,
+        ApplicationBuilder,
+        CommandHandler,
+        CallbackQueryHandler,
+        ContextTypes,
+        MessageHandler,
+        TypeHandler,
+        CallbackContext,
+        ApplicationHandlerStop,
+        ExtBot,
+        filters,
+    )
+    from telegram.error import Forbidden, BadRequest, RetryAfter, TimedOut
+    from telegram.constants import ParseMode  # For HTML parse mode
+    from telegram.request import HTTPXRequest
+
+    class GuardedApplication(GuardedDispatch, Application):
+        """Application whose update dispatch goes through dispatch_limiter."""
+
+    class MeteredRequest(PoolMetering, HTTPXRequest):
+        """HTTPXRequest with its own tuned connection pool and pool-wait metrics."""
 
 # ---------- Configuration ----------
 BOT_TOKEN = os.getenv("BOT_TOKEN")
@@ -27,6 +66,30 @@ ADMIN_IDS = [int(x) for x in os.getenv("ADMIN_IDS", "").split(",") if x.strip().
 FORCE_JOIN_CHANNEL_ENV = os.getenv("FORCE_JOIN_CHANNEL", "")
 WEB_SECRET = os.getenv("WEB_SECRET", "")  # secret token for protected HTTP endpoints (restart/open)
 BOT_VERSION = os.getenv("BOT_VERSION", "v1.0")
+DATA_DIR = os.getenv("DATA_DIR", "data")  # where small JSON state files (checkpoints, blocked users) are kept
+BOTS_FILE = os.getenv("BOTS_FILE", "")  # optional JSON list of extra bots served by this process
+BOT_API_URL = os.getenv("BOT_API_URL", "https://api.telegram.org").rstrip("/")  # or a local Bot API server
+BOT_API_HTTP2 = os.getenv("BOT_API_HTTP2", "").lower() in ("1", "true", "yes")  # needs python-telegram-bot[http2]
+BOT_API_POOLS = os.getenv("BOT_API_POOLS", "")  # JSON overrides per traffic class, see load_transport_config()
+# Broadcast tuning: Telegram allows roughly 30 messages/second to different users
+BROADCAST_WORKERS = int(os.getenv("BROADCAST_WORKERS", "8"))
+BROADCAST_RATE = float(os.getenv("BROADCAST_RATE", "25"))  # messages per second
+BROADCAST_PROGRESS_INTERVAL = float(os.getenv("BROADCAST_PROGRESS_INTERVAL", "3"))  # seconds between status edits
+NOTIFY_RATE = float(os.getenv("NOTIFY_RATE", "10"))  # background notifications per second
+CHANNEL_CHECK_INTERVAL = float(os.getenv("CHANNEL_CHECK_INTERVAL", "300"))  # seconds between force-join channel health checks
+REWARD_RETRY_INTERVAL = float(os.getenv("REWARD_RETRY_INTERVAL", "60"))  # seconds between retries of undelivered rewards
+UPDATE_DEDUP_WINDOW = int(os.getenv("UPDATE_DEDUP_WINDOW", "10000"))  # recently handled update IDs remembered across restarts
+PROOF_BATCH_WINDOW = float(os.getenv("PROOF_BATCH_WINDOW", "5"))  # seconds to collect screenshots per creator
+CODE_CACHE_MAX_MB = float(os.getenv("CODE_CACHE_MAX_MB", "64"))  # memory ceiling for codes kept resident
+STORE_IDLE_READERS = 4  # SQLite read connections kept open for other threads between their reads
+MIN_CONCURRENT_UPDATES = int(os.getenv("MIN_CONCURRENT_UPDATES", "4"))  # floor of the adaptive handler limit
+MAX_CONCURRENT_UPDATES = int(os.getenv("MAX_CONCURRENT_UPDATES", "64"))  # ceiling of the adaptive handler limit
+STATUS_STREAM_INTERVAL = float(os.getenv("STATUS_STREAM_INTERVAL", "2"))  # seconds between live status updates
+ACTIVE_USERS_REFRESH = 60  # seconds between recounts of active users for the status page
+HANDLER_TARGET_LATENCY = float(os.getenv("HANDLER_TARGET_LATENCY", "2"))  # seconds; slower handlers shrink the limit
+LIMIT_BACKOFF = 0.7  # multiplicative decrease applied to the limit on a slow handler
+HIGH_PRIORITY_BURST = int(os.getenv("HIGH_PRIORITY_BURST", "16"))  # /redeem handlers admitted above the limit
+UPDATE_BACKLOG = 4096  # updates dispatched at once, including those waiting on the adaptive limit
 
 if not BOT_TOKEN or not ADMIN_IDS:
     # Relaxed check: FORCE_JOIN_CHANNEL is now optional
@@ -39,26 +102,591 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
+# ---------- Bots served by this process ----------
+# One process can serve several storefront bots. Each BotInstance owns its token, admins,
+# force-join channels and all runtime state (codes, bans, proofs, broadcast, dedup window),
+# kept under its own directory in DATA_DIR. Handlers run with the update's bot as the
+# "current bot" (a context variable), and the module-level state names below are
+# stand-ins that resolve to the current bot's object, so handlers read as before.
+# The status server, the outbound notifier and the dispatch limiter are shared.
+BOT_NAME_RE = re.compile(r"^[A-Za-z0-9_-]+$")
+PRIMARY_BOT_NAME = "main"
+
+# The status server reads a bot's state from its own thread while handlers change it on
+# the event loop thread. Other threads never walk the live sets and dicts: the writer
+# publishes an immutable StateView of the read-mostly state after each change (or batch
+# of changes) by swapping one reference, which is atomic, so a reader that takes
+# `instance.view` once sees one consistent version without any lock.
+class StateView(NamedTuple):
+    version: int = 0
+    published_at: float = 0.0
+    force_channels: FrozenSet[str] = frozenset()
+    banned_users: FrozenSet[int] = frozenset()
+    codes_count: int = 0
+    creator_counts: Mapping[int, int] = MappingProxyType({})  # creator_id -> codes made
+
+class BotInstance:
+    def __init__(self, name: str, token: str, admin_ids: List[int], force_channels: List[str], primary: bool = False):
+        self.name = name
+        self.token = token
+        self.primary = primary
+        self.admin_ids = list(admin_ids)
+        # force-join channels (a Set for uniqueness and O(1) checks)
+        self.force_channels: Set[str] = set(f"@{c.strip().lstrip('@')}" for c in force_channels if c.strip())
+        # channel -> {"chat_id": resolved numeric id, "healthy": bool, "error": str, "checked_at": timestamp}
+        self.channel_health: Dict[str, Dict[str, Any]] = {}
+        # pending screenshot requests: maps user_id -> {"code": code, "creator_id": id, "requested_at": timestamp}
+        self.pending_screenshots: Dict[int, Dict[str, Any]] = {}
+        self.blocked_users: Set[int] = set()
+        self.banned_users: Set[int] = set()
+        self.store: Optional[sqlite3.Connection] = None
+        self.view = StateView(force_channels=frozenset(self.force_channels))
+        self.codes = TieredCodeStore(on_change=self.publish_codes)
+        self.processed_ids: Set[int] = set()
+        self.processed_order: deque = deque()
+        self.last_update_id = 0
+        self.rewards_in_flight: Set[int] = set()  # journalled update_ids whose handler is still delivering
+        self.proof_batches: Dict[int, List[Dict[str, Any]]] = {}  # creator_id -> queued proofs
+        self.proof_flush_tasks: Dict[int, asyncio.Task] = {}
+        self.proof_last_sent: Dict[int, float] = {}  # creator_id -> time of last immediate forward
+        self.broadcast_task: Optional[asyncio.Task] = None
+        self.application: Optional["Application"] = None
+        self.bulk_bot: Optional["ExtBot"] = None  # broadcasts and notifications, on their own pool
+        self.transport: Dict[str, "MeteredRequest"] = {}  # traffic class -> request object
+        self.status_hub = StatusHub(STATUS_STREAM_INTERVAL, owner=self)
+        self.redemptions_total = 0  # redemptions journalled since start, for the live status rate
+        self.updates_total = 0
+        self.trace_baseline = None  # tracemalloc snapshot taken by this bot's "/memstats trace start"
+
+    @property
+    def data_dir(self) -> str:
+        # the primary bot keeps the original layout so existing deployments keep their state
+        return DATA_DIR if self.primary else os.path.join(DATA_DIR, self.name)
+
+    def publish(self, **changes: Any) -> None:
+        """Swap in the next StateView with `changes` applied (writers only, on the loop thread)."""
+        self.view = self.view._replace(version=self.view.version + 1, published_at=time.time(), **changes)
+
+    def publish_codes(self) -> None:
+        self.publish(codes_count=len(self.codes), creator_counts=MappingProxyType(self.codes.creator_counts()))
+
+    def metrics(self) -> Dict[str, Any]:
+        view = self.view
+        return {
+            "updates": self.updates_total,
+            "redemptions": self.redemptions_total,
+            "codes": view.codes_count,
+            "code_cache": self.codes.metrics(),
+            "pending_screenshots": len(self.pending_screenshots),
+            "queued_proofs": sum(len(batch) for batch in list(self.proof_batches.values())),
+            "broadcast_running": self.broadcast_task is not None and not self.broadcast_task.done(),
+            "force_channel_count": len(view.force_channels),
+            "banned_users": len(view.banned_users),
+            "state_version": view.version,
+            "transport": {traffic: req.metrics() for traffic, req in self.transport.items()},
+        }
+
+_current_bot: ContextVar[BotInstance] = ContextVar("current_bot")
+BOTS: Dict[str, BotInstance] = {}  # filled by load_bots() once every class is defined
+
+def current_bot() -> BotInstance:
+    """The bot whose update (or background job) is being handled; the primary bot otherwise."""
+    return _current_bot.get(BOTS[PRIMARY_BOT_NAME])
+
+def run_as(instance: BotInstance, fn, *args):
+    """Call fn with `instance` as the current bot (for the status server thread and setup)."""
+    token = _current_bot.set(instance)
+    try:
+        return fn(*args)
+    finally:
+        _current_bot.reset(token)
+
+async def run_as_async(instance: BotInstance, fn, *args):
+    """Await fn with `instance` as the current bot; tasks it starts stay bound to that bot."""
+    token = _current_bot.set(instance)
+    try:
+        return await fn(*args)
+    finally:
+        _current_bot.reset(token)
+
+class _PerBot:
+    """Module-level stand-in for one attribute of the current bot."""
+    __slots__ = ("_attr",)
+
+    def __init__(self, attr: str):
+        self._attr = attr
+
+    def _target(self):
+        return getattr(current_bot(), self._attr)
+
+    def __getattr__(self, name):
+        return getattr(self._target(), name)
+
+    def __contains__(self, item):
+        return item in self._target()
+
+    def __iter__(self):
+        return iter(self._target())
+
+    def __len__(self):
+        return len(self._target())
+
+    def __bool__(self):
+        return bool(self._target())
+
+    def __getitem__(self, key):
+        return self._target()[key]
+
+    def __setitem__(self, key, value):
+        self._target()[key] = value
+
+    def __delitem__(self, key):
+        del self._target()[key]
+
+    def __enter__(self):
+        return self._target().__enter__()
+
+    def __exit__(self, *exc):
+        return self._target().__exit__(*exc)
+
+    def __repr__(self):
+        return f"<current bot's {self._attr}: {self._target()!r}>"
+
+def load_bots() -> Dict[str, BotInstance]:
+    """The primary bot from BOT_TOKEN/ADMIN_IDS/FORCE_JOIN_CHANNEL, plus any listed in BOTS_FILE."""
+    bots = {PRIMARY_BOT_NAME: BotInstance(
+        PRIMARY_BOT_NAME, BOT_TOKEN, ADMIN_IDS, FORCE_JOIN_CHANNEL_ENV.split(","), primary=True
+    )}
+    if BOTS_FILE:
+        with open(BOTS_FILE, "r", encoding="utf-8") as f:
+            extra = json.load(f)
+        for entry in extra:
+            name = str(entry.get("name", ""))
+            if not BOT_NAME_RE.match(name) or name in bots:
+                raise ValueError(f"Invalid or duplicate bot name in {BOTS_FILE}: {name!r}")
+            if not entry.get("token") or not entry.get("admin_ids"):
+                raise ValueError(f"Bot {name!r} in {BOTS_FILE} needs a token and admin_ids")
+            bots[name] = BotInstance(
+                name, entry["token"], [int(x) for x in entry["admin_ids"]], entry.get("force_channels", [])
+            )
+    return bots
+
 # ---------- Runtime state ----------
-codes: Dict[str, Dict[str, Any]] = {}  # in-memory codes store
 _start_time = time.time()
-# pending screenshot requests: maps user_id -> {"code": code, "creator_id": id, "requested_at": timestamp}
-pending_screenshots: Dict[int, Dict[str, Any]] = {}
-
-# New global state for multiple force join channels (using a Set for uniqueness and O(1) checks)
-# Initialize from environment variable
-FORCE_CHANNELS: Set[str] = set(
-    f"@{x.lstrip('@')}"
-    for x in FORCE_JOIN_CHANNEL_ENV.split(",")
-    if x.strip()
-)
+startup_phases: Dict[str, float] = {}  # phase -> ms since this module started loading, see mark_startup()
+pending_screenshots = _PerBot("pending_screenshots")
+FORCE_CHANNELS = _PerBot("force_channels")
+
 
-# NEW: Set to store IDs of banned users (in-memory, non-persistent)
-BANNED_USERS: Set[int] = set()
+# ---------- Persistence helpers (small JSON state files in DATA_DIR) ----------
+def _state_path(name: str) -> str:
+    return os.path.join(current_bot().data_dir, name)
+
+def load_json_state(name: str, default: Any) -> Any:
+    """Load a JSON state file from DATA_DIR, returning `default` if it is missing or unreadable."""
+    try:
+        with open(_state_path(name), "r", encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return default
+    except Exception as e:
+        logger.error(f"Failed to load state file {name}: {e}")
+        return default
+
+def save_json_state(name: str, data: Any) -> None:
+    """Atomically write a JSON state file (write to temp file, then rename over the old one)."""
+    path = _state_path(name)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def delete_json_state(name: str) -> None:
+    try:
+        os.remove(_state_path(name))
+    except FileNotFoundError:
+        pass
+
+# Users who blocked the bot (send failed with Forbidden); broadcasts skip them
+BLOCKED_USERS_FILE = "blocked_users.json"
+BLOCKED_USERS = _PerBot("blocked_users")
+
+def save_blocked_users() -> None:
+    try:
+        save_json_state(BLOCKED_USERS_FILE, sorted(BLOCKED_USERS))
+    except Exception as e:
+        logger.error(f"Failed to save blocked users: {e}")
+
+def unblock_user(user_id: int) -> None:
+    """The user reached us (or a send succeeded), so they no longer block the bot."""
+    if user_id in BLOCKED_USERS:
+        BLOCKED_USERS.discard(user_id)
+        save_blocked_users()
+
+# Set to store IDs of banned users (persisted to DATA_DIR)
+BANNED_USERS_FILE = "banned_users.json"
+BANNED_USERS = _PerBot("banned_users")
+
+def load_user_lists() -> None:
+    """(Re)load the ban and blocked lists in place; done at startup, after any restart hand-off."""
+    BLOCKED_USERS.clear()
+    BLOCKED_USERS.update(load_json_state(BLOCKED_USERS_FILE, []))
+    BANNED_USERS.clear()
+    BANNED_USERS.update(load_json_state(BANNED_USERS_FILE, []))
+    current_bot().publish(banned_users=frozenset(BANNED_USERS))
+
+# ---------- Code store (SQLite in DATA_DIR) ----------
+# SQLite is the cold tier holding every code; recently touched codes stay resident in a
+# bounded LRU (the hot tier, see TieredCodeStore) and every change is written through.
+# A redemption is journalled together with the reward it owes (pending_rewards), and every
+# handled update_id is recorded in a bounded dedup window, so a restart that re-delivers
+# updates neither redeems twice nor loses a reward.
+STORE_FILE = "bot.db"
+_store = _PerBot("store")
+_processed_ids = _PerBot("processed_ids")
+_processed_order = _PerBot("processed_order")
+_rewards_in_flight = _PerBot("rewards_in_flight")
+_recovery_seconds = 0.0
+
+def init_store() -> None:
+    instance = current_bot()
+    os.makedirs(instance.data_dir, exist_ok=True)
+    instance.store = sqlite3.connect(_state_path(STORE_FILE), check_same_thread=False, isolation_level=None)
+    _store.execute("PRAGMA journal_mode=WAL")
+    _store.execute("PRAGMA synchronous=NORMAL")
+    _store.execute("CREATE TABLE IF NOT EXISTS codes (code TEXT PRIMARY KEY, data TEXT NOT NULL)")
+    _store.execute(f"CREATE INDEX IF NOT EXISTS codes_created_by ON codes ({CREATED_BY_SQL})")
+    _store.execute("CREATE TABLE IF NOT EXISTS processed_updates (update_id INTEGER PRIMARY KEY)")
+    _store.execute(
+        "CREATE TABLE IF NOT EXISTS pending_rewards "
+        "(update_id INTEGER PRIMARY KEY, code TEXT NOT NULL, user_id INTEGER NOT NULL, chat_id INTEGER NOT NULL)"
+    )
+    _store.execute("CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+
+    codes.attach(_store)
+    for (update_id,) in _store.execute("SELECT update_id FROM processed_updates ORDER BY update_id"):
+        _processed_ids.add(update_id)
+        _processed_order.append(update_id)
+    row = _store.execute("SELECT value FROM meta WHERE key = 'last_update_id'").fetchone()
+    instance.last_update_id = int(row[0]) if row else 0
+
+# ON CONFLICT keeps the row (and its rowid), so codes load back in creation order
+UPSERT_CODE_SQL = "INSERT INTO codes (code, data) VALUES (?, ?) ON CONFLICT(code) DO UPDATE SET data = excluded.data"
+# queries must spell the expression exactly like this to use the codes_created_by index
+CREATED_BY_SQL = "json_extract(data, '$.created_by')"
+
+def _estimate_size(record: Dict[str, Any]) -> int:
+    """Approximate resident bytes of a code record (dict, its values and used_by ints)."""
+    size = sys.getsizeof(record)
+    for key, value in record.items():
+        size += sys.getsizeof(key) + sys.getsizeof(value)
+        if isinstance(value, list):
+            size += 28 * len(value)
+        elif isinstance(value, dict):
+            size += sum(sys.getsizeof(v) for v in value.values())
+    return size
+
+class TieredCodeStore(MutableMapping):
+    """
+    Mapping of code -> record backed by the SQLite `codes` table.
+    Reads page cold codes into an LRU bounded by CODE_CACHE_MAX_MB (estimated bytes);
+    assignments and deletions are written through, so evicting never loses data.
+    In-place changes to a record must be persisted with save_code().
+    Iteration walks SQLite in creation order without filling the cache.
+    "Which codes did this admin make" is answered by the codes_created_by expression
+    index; only the number of codes per creator (one int per admin) stays resident.
+    Threads other than the event loop's never see resident records, which handlers
+    change in place: their reads come from SQLite, i.e. the last committed state,
+    over read connections borrowed from a small pool (status requests each get a thread).
+    `on_change` is called when the number of codes or the per-creator counts changed.
+    """
+
+    def __init__(self, on_change=None):
+        self.on_change = None
+        self._db: Optional[sqlite3.Connection] = None
+        self._hot: "OrderedDict[str, Dict[str, Any]]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._idle_readers: List[sqlite3.Connection] = []
+        self._readers_lock = Lock()
+        self.reset()
+        self.on_change = on_change
+
+    def reset(self) -> None:
+        """Forget everything resident and detach from the database."""
+        self._db = None
+        self.close_readers()
+        self._hot.clear()
+        self._sizes.clear()
+        self.resident_bytes = 0
+        self.hits = self.misses = self.evictions = 0
+        self._count = 0
+        self._creator_counts: Dict[int, int] = {}
+        self._changed()
+
+    def attach(self, db: sqlite3.Connection) -> None:
+        self.reset()
+        self._db = db
+        self._path = db.execute("PRAGMA database_list").fetchone()[2]
+        self._count = db.execute("SELECT COUNT(*) FROM codes").fetchone()[0]
+        # walks the index, not the rows
+        self._creator_counts = dict(db.execute(
+            f"SELECT {CREATED_BY_SQL} AS creator_id, COUNT(*) FROM codes WHERE creator_id IS NOT NULL GROUP BY creator_id"
+        ))
+        self._changed()
+
+    def _changed(self) -> None:
+        if self.on_change is not None:
+            self.on_change()
+
+    def _recount(self, old: Optional[int], new: Optional[int]) -> bool:
+        """Move one code from creator `old` to `new`; returns whether the counts changed."""
+        old = old if isinstance(old, int) else None
+        new = new if isinstance(new, int) else None
+        if old == new:
+            return False
+        if old is not None:
+            self._creator_counts[old] -= 1
+            if not self._creator_counts[old]:
+                del self._creator_counts[old]
+        if new is not None:
+            self._creator_counts[new] = self._creator_counts.get(new, 0) + 1
+        return True
+
+    def creator_of(self, code: str) -> Optional[int]:
+        record = self._resident().get(code)
+        if record is not None:
+            creator_id = record.get("created_by")
+        else:
+            with self._reader() as db:
+                row = db.execute(f"SELECT {CREATED_BY_SQL} FROM codes WHERE code = ?", (code,)).fetchone()
+            creator_id = row[0] if row else None
+        return creator_id if isinstance(creator_id, int) else None
+
+    def codes_by(self, creator_id: int, limit: int = -1, offset: int = 0) -> List[str]:
+        """Codes created by `creator_id`, oldest first (index order, no records are read)."""
+        with self._reader() as db:
+            return [code for (code,) in db.execute(
+                f"SELECT code FROM codes WHERE {CREATED_BY_SQL} = ? ORDER BY rowid LIMIT ? OFFSET ?",
+                (creator_id, limit, offset),
+            )]
+
+    def count_by(self, creator_id: int) -> int:
+        return self._creator_counts.get(creator_id, 0)
+
+    def creator_counts(self) -> Dict[int, int]:
+        return dict(self._creator_counts)
+
+    def creator_totals(self, creator_id: int) -> Tuple[int, int]:
+        """(exhausted codes, redemptions) over one creator's codes, added up inside SQLite."""
+        used_by = "COALESCE(json_type(data, '$.used_by'), 'null')"
+        used = f"CASE {used_by} WHEN 'array' THEN json_array_length(data, '$.used_by') WHEN 'null' THEN 0 ELSE 1 END"
+        with self._reader() as db:
+            row = db.execute(
+                f"SELECT SUM(CASE {used_by} WHEN 'array' THEN {used} >= COALESCE(json_extract(data, '$.limit'), 0) "
+                f"ELSE {used} END), SUM({used}) FROM codes WHERE {CREATED_BY_SQL} = ?",
+                (creator_id,),
+            ).fetchone()
+        return row[0] or 0, row[1] or 0
+
+    @contextmanager
+    def _reader(self) -> Iterator[sqlite3.Connection]:
+        """A read connection: the writer on the loop thread, a pooled one elsewhere."""
+        if on_loop_thread():
+            yield self._db
+            return
+        with self._readers_lock:
+            conn = self._idle_readers.pop() if self._idle_readers else None
+        if conn is None:
+            conn = sqlite3.connect(self._path, check_same_thread=False)
+        try:
+            yield conn
+        finally:
+            with self._readers_lock:
+                keep = len(self._idle_readers) < STORE_IDLE_READERS and self._db is not None
+                if keep:
+                    self._idle_readers.append(conn)
+            if not keep:
+                conn.close()
+
+    def close_readers(self) -> None:
+        with self._readers_lock:
+            idle, self._idle_readers = self._idle_readers, []
+        for conn in idle:
+            conn.close()
+
+    def _admit(self, code: str, record: Dict[str, Any]) -> None:
+        self._hot[code] = record
+        self._hot.move_to_end(code)
+        self.resize(code)
+        ceiling = self.max_bytes()
+        while self.resident_bytes > ceiling and len(self._hot) > 1:
+            old_code, _ = self._hot.popitem(last=False)
+            self.resident_bytes -= self._sizes.pop(old_code, 0)
+            self.evictions += 1
+
+    def max_bytes(self) -> float:
+        """CODE_CACHE_MAX_MB is one budget shared by every bot in the process."""
+        return CODE_CACHE_MAX_MB * 1024 * 1024 / max(len(BOTS), 1)
+
+    def resize(self, code: str) -> None:
+        """Re-estimate a resident record's size after it changed in place."""
+        if code in self._hot:
+            size = _estimate_size(self._hot[code])
+            self.resident_bytes += size - self._sizes.get(code, 0)
+            self._sizes[code] = size
+
+    def __getitem__(self, code: str) -> Dict[str, Any]:
+        record = self._hot.get(code)
+        if record is not None:
+            self.hits += 1
+            self._hot.move_to_end(code)
+            return record
+        self.misses += 1
+        row = self._db.execute("SELECT data FROM codes WHERE code = ?", (code,)).fetchone()
+        if row is None:
+            raise KeyError(code)
+        record = json.loads(row[0])
+        self._admit(code, record)
+        return record
+
+    def __contains__(self, code: object) -> bool:
+        """Key existence only: nothing is paged in and the hit/miss counters are left alone."""
+        if code in self._resident():
+            return True
+        with self._reader() as db:
+            return db.execute("SELECT 1 FROM codes WHERE code = ?", (code,)).fetchone() is not None
+
+    def __setitem__(self, code: str, record: Dict[str, Any]) -> None:
+        stored = self._db.execute(f"SELECT {CREATED_BY_SQL} FROM codes WHERE code = ?", (code,)).fetchone()
+        if stored is None:
+            self._count += 1
+        self._db.execute(UPSERT_CODE_SQL, (code, json.dumps(record)))
+        recounted = self._recount(stored[0] if stored else None, record.get("created_by"))
+        self._admit(code, record)
+        if stored is None or recounted:
+            self._changed()
+
+    def __delitem__(self, code: str) -> None:
+        # fetchall() steps the statement to the end, which commits the delete
+        deleted = self._db.execute(f"DELETE FROM codes WHERE code = ? RETURNING {CREATED_BY_SQL}", (code,)).fetchall()
+        if not deleted and code not in self._hot:
+            raise KeyError(code)
+        self._count -= 1
+        self._recount(deleted[0][0] if deleted else None, None)
+        if code in self._hot:
+            del self._hot[code]
+            self.resident_bytes -= self._sizes.pop(code, 0)
+        self._changed()
+
+    def __len__(self) -> int:
+        return self._count
+
+    def __iter__(self) -> Iterator[str]:
+        with self._reader() as db:
+            for (code,) in db.execute("SELECT code FROM codes ORDER BY rowid"):
+                yield code
+
+    def _resident(self) -> Mapping[str, Dict[str, Any]]:
+        """Resident records this thread may read: none outside the event loop thread."""
+        return self._hot if on_loop_thread() else {}
+
+    def peek(self, code: str) -> Optional[Dict[str, Any]]:
+        """Look a code up without touching the LRU or its counters (safe from other threads)."""
+        record = self._resident().get(code)
+        if record is not None:
+            return record
+        with self._reader() as db:
+            row = db.execute("SELECT data FROM codes WHERE code = ?", (code,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def scan(self, limit: int = -1, offset: int = 0) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        """(code, record) pairs in creation order; resident records win, cold ones are not cached."""
+        resident = self._resident()
+        with self._reader() as db:
+            for code, data in db.execute(
+                "SELECT code, data FROM codes ORDER BY rowid LIMIT ? OFFSET ?", (limit, offset)
+            ):
+                record = resident.get(code)
+                yield code, (record if record is not None else json.loads(data))
+
+    def items(self):
+        return self.scan()
+
+    def values(self):
+        return (record for _, record in self.scan())
+
+    def metrics(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "codes": self._count,
+            "resident": len(self._hot),
+            "resident_bytes": self.resident_bytes,
+            "max_bytes": self.max_bytes(),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else None,
+        }
+
+codes = _PerBot("codes")
+
+def save_code(code: str) -> None:
+    """Persist an in-place change to a code record."""
+    _store.execute(UPSERT_CODE_SQL, (code, json.dumps(codes[code])))
+    codes.resize(code)
+
+def journal_redemption(code: str, update_id: int, user_id: int, chat_id: int) -> None:
+    """Atomically persist the redeemed code state and the reward still owed for this update."""
+    _rewards_in_flight.add(update_id)
+    with _store:
+        _store.execute("BEGIN")
+        _store.execute(UPSERT_CODE_SQL, (code, json.dumps(codes[code])))
+        _store.execute(
+            "INSERT OR REPLACE INTO pending_rewards (update_id, code, user_id, chat_id) VALUES (?, ?, ?, ?)",
+            (update_id, code, user_id, chat_id)
+        )
+    codes.resize(code)
+
+def get_pending_reward(update_id: int) -> Optional[Dict[str, Any]]:
+    row = _store.execute("SELECT code, user_id, chat_id FROM pending_rewards WHERE update_id = ?", (update_id,)).fetchone()
+    if row is None:
+        return None
+    return {"code": row[0], "user_id": row[1], "chat_id": row[2]}
+
+def list_pending_rewards() -> List[Dict[str, Any]]:
+    rows = _store.execute("SELECT update_id, code, user_id, chat_id FROM pending_rewards ORDER BY update_id").fetchall()
+    return [{"update_id": r[0], "code": r[1], "user_id": r[2], "chat_id": r[3]} for r in rows]
+
+def is_update_processed(update_id: int) -> bool:
+    return update_id in _processed_ids or update_id <= current_bot().last_update_id - UPDATE_DEDUP_WINDOW
+
+def complete_update(update_id: int) -> None:
+    """Record an update as fully handled (and drop its owed reward, if any) in one transaction."""
+    instance = current_bot()
+    if update_id in _processed_ids:
+        return
+    _processed_ids.add(update_id)
+    _processed_order.append(update_id)
+    instance.last_update_id = max(instance.last_update_id, update_id)
+    expired = []
+    while len(_processed_order) > UPDATE_DEDUP_WINDOW:
+        old = _processed_order.popleft()
+        _processed_ids.discard(old)
+        expired.append(old)
+    with _store:
+        _store.execute("BEGIN")
+        _store.execute("DELETE FROM pending_rewards WHERE update_id = ?", (update_id,))
+        _store.execute("INSERT OR IGNORE INTO processed_updates (update_id) VALUES (?)", (update_id,))
+        _store.execute(
+            "INSERT OR REPLACE INTO meta (key, value) VALUES ('last_update_id', ?)", (str(instance.last_update_id),)
+        )
+        if expired:
+            _store.execute("DELETE FROM processed_updates WHERE update_id <= ?", (max(expired),))
 
 # ---------- Helpers ----------
 def is_admin(user_id: int) -> bool:
-    return user_id in ADMIN_IDS
+    return user_id in current_bot().admin_ids
 
 # NEW: Check if a user is banned
 def is_banned(user_id: int) -> bool:
@@ -89,30 +717,323 @@ def compute_active_users() -> int:
             users.add(used_by)
     return len(users)
 
+def iter_redeemers(code: Optional[str] = None) -> Iterator[int]:
+    """
+    Yield the IDs of users who redeemed `code` (or any code when None), each once.
+    Order is stable (code insertion order, then redemption order) so a broadcast
+    can resume from a saved position.
+    """
+    if code is not None:
+        record = codes.peek(code)
+        infos = [record] if record is not None else []
+    else:
+        infos = codes.values()
+    seen: Set[int] = set()
+    for info in infos:
+        used_by = info.get("used_by")
+        if isinstance(used_by, int):
+            used_by = [used_by]
+        elif not isinstance(used_by, list):
+            continue
+        for user_id in used_by:
+            if user_id in seen:
+                continue
+            seen.add(user_id)
+            yield user_id
+
+# --- Per-code redemption time series ---
+# Each code record carries a "stats" dict with two fixed-size rings of counters
+# (per minute for the last hour, per hour for the last two days), so it stays the
+# same size no matter how often the code is redeemed and is journalled with it.
+STATS_RINGS = {"minute": (60, 60), "hour": (3600, 48)}  # name -> (bucket seconds, buckets kept)
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+def _ring_add(ring: Dict[str, Any], bucket: int, size: int) -> None:
+    counts = ring["c"]
+    gap = bucket - ring["t"]
+    if gap <= -size:
+        return  # older than the ring covers (clock stepped back)
+    if gap >= size:
+        counts[:] = [0] * size
+    else:
+        for b in range(ring["t"] + 1, bucket + 1):
+            counts[b % size] = 0
+    counts[bucket % size] += 1
+    ring["t"] = max(ring["t"], bucket)
+
+def _ring_window(ring: Optional[Dict[str, Any]], now_bucket: int, size: int) -> List[int]:
+    """Counts for the last `size` buckets, oldest first, ending at now_bucket."""
+    if not ring:
+        return [0] * size
+    window = []
+    for b in range(now_bucket - size + 1, now_bucket + 1):
+        fresh = ring["t"] - size < b <= ring["t"]
+        window.append(ring["c"][b % size] if fresh else 0)
+    return window
+
+def record_redemption(info: Dict[str, Any], now: Optional[float] = None) -> None:
+    """O(1) update of the code's time series; call before journalling the redemption."""
+    now = time.time() if now is None else now
+    stats = info.setdefault("stats", {"first": now})
+    stats["last"] = now
+    for name, (seconds, size) in STATS_RINGS.items():
+        bucket = int(now // seconds)
+        ring = stats.setdefault(name, {"t": bucket, "c": [0] * size})
+        _ring_add(ring, bucket, size)
+
+def _redemption_count(info: Dict[str, Any]) -> int:
+    used_by = info.get("used_by")
+    if isinstance(used_by, list):
+        return len(used_by)
+    return 0 if used_by is None else 1
+
+def code_stats(info: Dict[str, Any], now: Optional[float] = None) -> Dict[str, Any]:
+    """Rate, peaks, time to exhaustion and hourly sparkline for one code record."""
+    now = time.time() if now is None else now
+    stats = info.get("stats") or {}
+    minute_secs, minute_size = STATS_RINGS["minute"]
+    hour_secs, hour_size = STATS_RINGS["hour"]
+    minutes = _ring_window(stats.get("minute"), int(now // minute_secs), minute_size)
+    hours = _ring_window(stats.get("hour"), int(now // hour_secs), hour_size)
+    used = _redemption_count(info)
+    limit = info.get("limit", 1) if isinstance(info.get("used_by"), list) else 1
+    remaining = max(limit - used, 0)
+
+    last_hour = sum(minutes)
+    last_day = sum(hours[-24:])
+    rate_per_hour = last_hour if last_hour else last_day / 24
+    if remaining == 0:
+        eta_seconds = 0.0
+    elif rate_per_hour:
+        eta_seconds = remaining / rate_per_hour * 3600
+    else:
+        eta_seconds = None
+    last_day_hours = hours[-24:]
+    peak = max(last_day_hours)
+    sparkline = "".join(
+        SPARK_CHARS[min(len(SPARK_CHARS) - 1, count * len(SPARK_CHARS) // (peak + 1))] if peak else SPARK_CHARS[0]
+        for count in last_day_hours
+    )
+    return {
+        "used": used,
+        "limit": limit,
+        "remaining": remaining,
+        "last_hour": last_hour,
+        "last_24h": last_day,
+        "rate_per_hour": round(rate_per_hour, 2),
+        "peak_per_minute": max(minutes),
+        "peak_per_hour": max(hours),
+        "eta_seconds": None if eta_seconds is None else round(eta_seconds),
+        "first_redeemed_at": stats.get("first"),
+        "last_redeemed_at": stats.get("last"),
+        "hourly_24h": last_day_hours,
+        "sparkline": sparkline,
+    }
+
+_background_tasks: Set[asyncio.Task] = set()
+
+def start_background_task(coro) -> asyncio.Task:
+    """Start a long-running task and keep a reference so it is not garbage collected."""
+    task = asyncio.create_task(coro)
+    _background_tasks.add(task)
+    task.add_done_callback(_background_tasks.discard)
+    return task
+
+class RateLimiter:
+    """Simple async token bucket: `await acquire()` blocks until a send is allowed."""
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = max(rate, 0.001)
+        self.burst = max(burst, 1)
+        self._tokens = float(self.burst)
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                await asyncio.sleep((1 - self._tokens) / self.rate)
+
+    async def pause(self, seconds: float) -> None:
+        """Called on RetryAfter: drain the bucket so every sender backs off together."""
+        async with self._lock:
+            self._tokens = 0
+            self._updated = time.monotonic() + seconds
+        await asyncio.sleep(seconds)
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limit for update dispatch, driven by handler latency.
+    The limit grows by about one per window of fast completions and is cut by
+    LIMIT_BACKOFF when a handler exceeds HANDLER_TARGET_LATENCY (at most once per
+    target period, so one slow burst does not collapse it).
+    Priorities: "high" may run `burst` handlers above the limit and beyond that waits
+    ahead of everyone else, "normal" waits for a slot, "low" is shed when full.
+    """
+
+    def __init__(self, initial: int, minimum: int, maximum: int, target: float, burst: Optional[int] = None):
+        self.minimum = max(minimum, 1)
+        self.maximum = max(maximum, self.minimum)
+        self.target = target
+        self.burst = max(HIGH_PRIORITY_BURST if burst is None else burst, 0)
+        self.limit = float(min(max(initial, self.minimum), self.maximum))
+        self.in_flight = 0
+        self.shed: Dict[str, int] = {}
+        self.latency_ewma = 0.0
+        self._waiters: deque = deque()
+        self._high_waiters: deque = deque()
+        self._last_decrease = 0.0
+
+    def _ceiling(self, priority: str) -> int:
+        return int(self.limit) + (self.burst if priority == "high" else 0)
+
+    async def acquire(self, priority: str = "normal") -> bool:
+        """Take a slot; returns False when the update should be shed instead."""
+        if self.in_flight >= self._ceiling(priority):
+            if priority == "low":
+                self.shed[priority] = self.shed.get(priority, 0) + 1
+                return False
+            waiters = self._high_waiters if priority == "high" else self._waiters
+            waiter = asyncio.get_running_loop().create_future()
+            waiters.append(waiter)
+            try:
+                await waiter  # _wake() counts the slot for us
+            except asyncio.CancelledError:
+                if waiter.done() and not waiter.cancelled():
+                    self.in_flight -= 1  # hand the slot we were given to the next waiter
+                    self._wake()
+                elif waiter in waiters:
+                    waiters.remove(waiter)
+                raise
+            return True
+        self.in_flight += 1
+        return True
+
+    def release(self, latency: float) -> None:
+        self.in_flight -= 1
+        self.latency_ewma = latency if not self.latency_ewma else 0.8 * self.latency_ewma + 0.2 * latency
+        now = time.monotonic()
+        if latency > self.target:
+            if now - self._last_decrease >= self.target:
+                self.limit = max(self.minimum, self.limit * LIMIT_BACKOFF)
+                self._last_decrease = now
+        elif self.in_flight + 1 >= int(self.limit):
+            # only grow while the limit is what bounds us
+            self.limit = min(self.maximum, self.limit + 1 / self.limit)
+        self._wake()
+
+    def _wake(self) -> None:
+        for waiters, priority in ((self._high_waiters, "high"), (self._waiters, "normal")):
+            while waiters and self.in_flight < self._ceiling(priority):
+                waiter = waiters.popleft()
+                if not waiter.done():
+                    self.in_flight += 1
+                    waiter.set_result(None)
+
+    def metrics(self) -> Dict[str, Any]:
+        return {
+            "limit": int(self.limit),
+            "burst": self.burst,
+            "in_flight": self.in_flight,
+            "waiting": len(self._waiters) + len(self._high_waiters),
+            "shed": dict(self.shed),
+            "shed_total": sum(self.shed.values()),
+            "latency_ms": round(self.latency_ewma * 1000, 1),
+        }
+
+# ---------- Force-join channel health monitor ----------
+CHANNEL_HEALTH = _PerBot("channel_health")
+
+async def check_channel_health(bot, channel: str) -> Dict[str, Any]:
+    """
+    Resolve the channel and verify the bot is an admin there (needed to read memberships).
+    Only Telegram's answers (BadRequest/Forbidden) make a channel unhealthy; network
+    errors are raised so callers keep the last known state.
+    """
+    previous = CHANNEL_HEALTH.get(channel, {})
+    health = {"chat_id": previous.get("chat_id"), "healthy": False, "error": "", "checked_at": time.time()}
+    try:
+        chat = await bot.get_chat(channel)
+        health["chat_id"] = chat.id
+        me = await bot.get_chat_member(chat.id, bot.id)
+        if me.status in ["administrator", "creator"]:
+            health["healthy"] = True
+        else:
+            health["error"] = "bot is not an admin"
+    except (BadRequest, Forbidden) as e:
+        health["error"] = str(e)
+    return health
+
+def _set_channel_health(channel: str, health: Dict[str, Any]) -> None:
+    """Store a health result and alert admins once when a channel changes state."""
+    was_healthy = CHANNEL_HEALTH.get(channel, {}).get("healthy", True)
+    CHANNEL_HEALTH[channel] = health
+    if channel not in FORCE_CHANNELS or was_healthy == health["healthy"]:
+        return
+    if health["healthy"]:
+        text = f"✅ Force-join channel {channel} is healthy again and enforced."
+    else:
+        text = (
+            f"⚠️ Force-join channel {channel} is unhealthy ({health['error']}). "
+            "It is skipped for /redeem until the bot is an admin there again."
+        )
+        logger.warning(f"Channel {channel} unhealthy: {health['error']}")
+    for admin_id in current_bot().admin_ids:
+        queue_notification(admin_id, text)
+
+async def refresh_channel_health(bot) -> None:
+    """Validate every force-join channel concurrently."""
+    channels = list(FORCE_CHANNELS)
+    results = await asyncio.gather(*(check_channel_health(bot, c) for c in channels), return_exceptions=True)
+    for channel, health in zip(channels, results):
+        if isinstance(health, Exception):
+            # network trouble: keep the last known state (or leave it unchecked, i.e. enforced)
+            logger.warning(f"Health check for {channel} failed: {health}")
+            continue
+        _set_channel_health(channel, health)
+    for channel in list(CHANNEL_HEALTH):
+        if channel not in FORCE_CHANNELS:
+            del CHANNEL_HEALTH[channel]
+
+async def channel_monitor(bot) -> None:
+    """Check all channels right away (startup), then every CHANNEL_CHECK_INTERVAL seconds."""
+    while True:
+        try:
+            await refresh_channel_health(bot)
+        except Exception as e:
+            logger.error(f"Channel health refresh failed: {e}")
+        await asyncio.sleep(CHANNEL_CHECK_INTERVAL)
+
 # ---------- Force Join Check (async) - Updated for multiple channels ----------
+async def _is_member(bot, channel: str, user_id: int) -> Optional[bool]:
+    """True/False for membership, None if the channel turned out to be unhealthy."""
+    health = CHANNEL_HEALTH.get(channel, {})
+    try:
+        member = await bot.get_chat_member(health.get("chat_id") or channel, user_id)
+        return member.status in ["member", "administrator", "creator"]
+    except BadRequest:
+        # Assume not joined if BadRequest occurs (e.g., user blocked bot in channel, or invalid channel)
+        return False
+    except Forbidden as e:
+        # Bot lost admin since the last health check: mark it now so later users skip it
+        _set_channel_health(channel, {**health, "healthy": False, "error": str(e), "checked_at": time.time()})
+        return None
+
 async def check_force_join(update: Update, context: ContextTypes.DEFAULT_TYPE) -> bool:
-    if not FORCE_CHANNELS:
+    # Unhealthy channels are skipped (admins were alerted) instead of failing every user
+    channels = [c for c in FORCE_CHANNELS if CHANNEL_HEALTH.get(c, {}).get("healthy", True)]
+    if not channels:
         return True # No channels required
     
     user_id = update.effective_user.id
-    missing_channels: List[str] = []
-
-    for channel in FORCE_CHANNELS:
-        try:
-            member = await context.bot.get_chat_member(channel, user_id)
-            if member.status not in ["member", "administrator", "creator"]:
-                missing_channels.append(channel)
-        except BadRequest:
-            # Assume not joined if BadRequest occurs (e.g., user blocked bot in channel, or invalid channel)
-            missing_channels.append(channel)
-        except Forbidden:
-            # Bot is not an admin in the channel, cannot check membership
-            if update.message:
-                await update.message.reply_text(
-                    f"⚠️ Bot cannot check membership for {channel}. Make sure the bot is an admin in the channel.", 
-                    parse_mode=ParseMode.HTML
-                )
-            return False
+    results = await asyncio.gather(*(_is_member(context.bot, c, user_id) for c in channels))
+    missing_channels: List[str] = [c for c, joined in zip(channels, results) if joined is False]
 
     if not missing_channels:
         return True
@@ -172,8 +1093,11 @@ async def show_commands_callback(update: Update, context: ContextTypes.DEFAULT_T
         "<code>/generate_multi &lt;code&gt; &lt;limit&gt; &lt;optional message&gt;</code> — Multi-use code\n"
         "<code>/generate_random &lt;optional message&gt;</code> — Random one-time (reply required)\n"
         "<code>/redeem &lt;code&gt;</code> — Redeem a code\n"
-        "<code>/listcodes</code> — List all codes\n"
-        "<code>/deletecode &lt;code&gt;</code> — Delete a code\n\n"
+        "<code>/listcodes [page]</code> — List all codes\n"
+        "<code>/codestats &lt;code&gt;</code> — Redemption rate, peak and time to exhaustion\n"
+        "<code>/deletecode &lt;code&gt;</code> — Delete a code\n"
+        "<code>/mycodes</code> — Codes you created, with totals\n"
+        "<code>/deletecodes mine [--exhausted]</code> — Delete your (exhausted) codes\n\n"
         "<u>Channel Management:</u>\n"
         "<code>/addchannel &lt;@channel&gt;</code> — Add force-join channel\n"
         "<code>/delchannel &lt;@channel&gt;</code> — Delete force-join channel\n"
@@ -181,9 +1105,14 @@ async def show_commands_callback(update: Update, context: ContextTypes.DEFAULT_T
         "<u>Ban Management:</u>\n" # NEW: Ban Management section
         "<code>/ban &lt;user_id&gt;</code> — Ban a user from using the bot\n"
         "<code>/unban &lt;user_id&gt;</code> — Unban a user\n"
-        "<code>/listbanned</code> — List all banned users\n\n"
+        "<code>/banbulk</code> — Ban every ID in the replied file\n"
+        "<code>/unbanbulk</code> — Unban every ID in the replied file\n"
+        "<code>/listbanned [page]</code> — List banned users\n\n"
+        "<u>Broadcast:</u>\n"
+        "<code>/broadcast [code]</code> — Send the replied message to redeemers of a code (or everyone)\n\n"
         "<u>System:</u>\n"
-        "<code>/ping</code> — System ping (latency + uptime)"
+        "<code>/ping</code> — System ping (latency + uptime)\n"
+        "<code>/memstats [trace start|diff [N]|stop]</code> — Memory usage and allocation tracing"
     )
     keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("⬅️ Back", callback_data="back_to_start")]])
     await query.edit_message_text(text=commands_text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
@@ -208,23 +1137,24 @@ async def add_channel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not channel.startswith('@'):
         channel = f"@{channel}"
     
-    global FORCE_CHANNELS
     if channel in FORCE_CHANNELS:
         await update.message.reply_text(f"⚠️ Channel <code>{channel}</code> is already in the list.", parse_mode=ParseMode.HTML)
         return
 
-    # Optional: Check if the bot can actually access the channel (requires bot to be an admin)
+    # Check if the bot can actually access the channel (requires bot to be an admin)
     try:
-        await context.bot.get_chat(channel)
-    except BadRequest:
-        await update.message.reply_text(f"❌ Invalid Channel Username <code>{channel}</code> or bot is not a member/admin.", parse_mode=ParseMode.HTML)
-        return
+        health = await check_channel_health(context.bot, channel)
     except Exception as e:
         logger.error(f"Error checking channel {channel}: {e}")
         await update.message.reply_text(f"⚠️ An error occurred while checking channel <code>{channel}</code>.", parse_mode=ParseMode.HTML)
         return
+    if not health["healthy"]:
+        await update.message.reply_text(f"❌ Invalid Channel Username <code>{channel}</code> or bot is not a member/admin.", parse_mode=ParseMode.HTML)
+        return
 
+    CHANNEL_HEALTH[channel] = health
     FORCE_CHANNELS.add(channel)
+    current_bot().publish(force_channels=frozenset(FORCE_CHANNELS))
     await update.message.reply_text(f"✅ Channel <code>{channel}</code> added to force-join list.", parse_mode=ParseMode.HTML)
 
 async def del_channel(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -239,12 +1169,13 @@ async def del_channel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not channel.startswith('@'):
         channel = f"@{channel}"
     
-    global FORCE_CHANNELS
     if channel not in FORCE_CHANNELS:
         await update.message.reply_text(f"⚠️ Channel <code>{channel}</code> is not in the list.", parse_mode=ParseMode.HTML)
         return
 
     FORCE_CHANNELS.remove(channel)
+    CHANNEL_HEALTH.pop(channel, None)
+    current_bot().publish(force_channels=frozenset(FORCE_CHANNELS))
     await update.message.reply_text(f"🗑️ Channel <code>{channel}</code> removed from force-join list.", parse_mode=ParseMode.HTML)
 
 async def view_channels(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -258,7 +1189,14 @@ async def view_channels(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
     message = "📣 <b>Current Force-Join Channels:</b>\n\n"
     for channel in sorted(list(FORCE_CHANNELS)):
-        message += f"• <code>{channel}</code>\n"
+        health = CHANNEL_HEALTH.get(channel)
+        if health is None:
+            state = "⏳ not checked yet"
+        elif health["healthy"]:
+            state = "✅ healthy"
+        else:
+            state = f"⚠️ skipped ({html.escape(health['error'])})"
+        message += f"• <code>{channel}</code> — {state}\n"
 
     await update.message.reply_text(message, parse_mode=ParseMode.HTML)
 
@@ -389,10 +1327,84 @@ async def generate_random(update: Update, context: ContextTypes.DEFAULT_TYPE):
     }
     await update.message.reply_text(f"✅ Random Code Created!\n\nCode: <code>{code}</code>", parse_mode=ParseMode.HTML)
 
+async def deliver_reward(context: ContextTypes.DEFAULT_TYPE, chat_id: int, code: str):
+    """
+    Send the reward for `code` to `chat_id`; returns the sent message.
+    Raises if nothing was delivered (timeouts, flood limits, network errors), so the
+    journalled reward stays owed and is retried. Media Telegram refuses for good (a
+    stale file_id) is replaced by the reward text, which counts as delivered.
+    If the code was deleted since it was redeemed, the user is told and None is returned.
+    """
+    record = codes.get(code)  # read once: the sends below yield to other handlers
+    if record is None:
+        logger.warning(f"Code {code} was deleted before its reward was delivered to {chat_id}")
+        await context.bot.send_message(
+            chat_id=chat_id, text="⚠️ This code was removed before its reward could be sent.", parse_mode=ParseMode.HTML
+        )
+        return None
+    media = record.get("media")
+    text = record["text"]
+    if not media:
+        return await context.bot.send_message(chat_id=chat_id, text=f"🎉 Success!\n\n{text}", parse_mode=ParseMode.HTML)
+
+    media_type = media["type"]
+    file_id = media["file_id"]
+    send_kwargs = {"chat_id": chat_id}
+    if text:
+        send_kwargs["caption"] = text
+        send_kwargs["parse_mode"] = ParseMode.HTML
+    try:
+        if media_type == "photo":
+            return await context.bot.send_photo(photo=file_id, **send_kwargs)
+        elif media_type == "video":
+            return await context.bot.send_video(video=file_id, **send_kwargs)
+        elif media_type == "document":
+            return await context.bot.send_document(document=file_id, **send_kwargs)
+        elif media_type == "audio":
+            return await context.bot.send_audio(audio=file_id, **send_kwargs)
+        elif media_type == "voice":
+            return await context.bot.send_voice(voice=file_id, **send_kwargs)
+        elif media_type == "video_note":
+            return await context.bot.send_video_note(video_note=file_id, **send_kwargs)
+        elif media_type == "text":
+            msg = file_id
+            if text:
+                msg += f"\n\n{text}"
+            return await context.bot.send_message(chat_id=chat_id, text=msg, parse_mode=ParseMode.HTML)
+    except BadRequest as e:
+        logger.error(f"Reward media for {code} was refused, sending the text instead: {e}")
+    else:
+        logger.error(f"Unknown reward media type {media_type!r} for {code}, sending the text instead")
+    note = "⚠️ The reward media could not be delivered."
+    body = f"{text}\n\n{note}" if text else note
+    return await context.bot.send_message(chat_id=chat_id, text=f"🎉 Success!\n\n{body}", parse_mode=ParseMode.HTML)
+
+async def finish_redemption(context: ContextTypes.DEFAULT_TYPE, update_id: int, chat_id: int, code: str) -> None:
+    """Deliver the reward of a journalled redemption, then mark its update fully handled."""
+    sent_message = await deliver_reward(context, chat_id, code)
+    complete_update(update_id)
+    if sent_message is None:
+        return  # the code is gone, so there is nothing to send proof for
+
+    # After delivering reward, ask user to upload a screenshot/proof (button)
+    try:
+        # Reply to the reward message so the buttons appear under the reward.
+        reply_to = getattr(sent_message, 'message_id', None)
+        await send_screenshot_request(chat_id, code, context, reply_to_message_id=reply_to)
+    except Exception as e:
+        logger.error(f"Failed to send screenshot request button: {e}")
+
 # Redeem command
 async def redeem(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = update.effective_user
     user_id = user.id
+
+    # Re-delivered update whose redemption was already journalled: only the reward is still owed
+    pending = get_pending_reward(update.update_id)
+    if pending:
+        _rewards_in_flight.add(update.update_id)  # keeps recover_pending_rewards off it
+        await finish_redemption(context, update.update_id, pending["chat_id"], pending["code"])
+        return
     
     # NEW: Check if user is banned before proceeding
     if is_banned(user_id):
@@ -406,28 +1418,34 @@ async def redeem(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     code = context.args[0].upper()
     
-    if code not in codes:
+    info = codes.get(code)
+    if info is None:
         await update.message.reply_text("❌ Invalid Code", parse_mode=ParseMode.HTML)
         return
     
     # Single-use code
-    if codes[code].get("used_by") is None or isinstance(codes[code]["used_by"], int):
-        if codes[code]["used_by"] is not None:
+    if info.get("used_by") is None or isinstance(info["used_by"], int):
+        if info["used_by"] is not None:
             await update.message.reply_text("❌ Already Redeemed", parse_mode=ParseMode.HTML)
             return
-        codes[code]["used_by"] = user_id
+        info["used_by"] = user_id
     # Multi-use code
     else:
-        if user_id in codes[code]["used_by"]:
+        if user_id in info["used_by"]:
             await update.message.reply_text("❌ You already redeemed this code!", parse_mode=ParseMode.HTML)
             return
-        if len(codes[code]["used_by"]) >= codes[code]["limit"]:
+        if len(info["used_by"]) >= info["limit"]:
             await update.message.reply_text("❌ Code redemption limit reached!", parse_mode=ParseMode.HTML)
             return
-        codes[code]["used_by"].append(user_id)
+        info["used_by"].append(user_id)
+
+    record_redemption(info)
+    # Journal the state change together with the owed reward before any side effects
+    journal_redemption(code, update.update_id, user_id, update.effective_chat.id)
+    current_bot().redemptions_total += 1
     
     # Notify creator
-    creator_id = codes[code].get("created_by")
+    creator_id = codes.creator_of(code)
     if creator_id:
         try:
             keyboard = InlineKeyboardMarkup([[InlineKeyboardButton("💬 Chat with User", url=f"tg://user?id={user_id}")]])
@@ -446,62 +1464,37 @@ async def redeem(update: Update, context: ContextTypes.DEFAULT_TYPE):
             logger.error(f"Failed to notify creator {creator_id}: {e}")
     
     # Deliver reward
-    media = codes[code].get("media")
-    text = codes[code]["text"]
-    if media:
-        media_type = media["type"]
-        file_id = media["file_id"]
-        send_kwargs = {"chat_id": update.effective_chat.id}
-        if text:
-            send_kwargs["caption"] = text
-            send_kwargs["parse_mode"] = ParseMode.HTML
-        sent_message = None
-        try:
-            if media_type == "photo":
-                sent_message = await context.bot.send_photo(photo=file_id, **send_kwargs)
-            elif media_type == "video":
-                sent_message = await context.bot.send_video(video=file_id, **send_kwargs)
-            elif media_type == "document":
-                sent_message = await context.bot.send_document(document=file_id, **send_kwargs)
-            elif media_type == "audio":
-                sent_message = await context.bot.send_audio(audio=file_id, **send_kwargs)
-            elif media_type == "voice":
-                sent_message = await context.bot.send_voice(voice=file_id, **send_kwargs)
-            elif media_type == "video_note":
-                sent_message = await context.bot.send_video_note(video_note=file_id, **send_kwargs)
-            elif media_type == "text":
-                msg = file_id
-                if text:
-                    msg += f"\n\n{text}"
-                sent_message = await update.message.reply_text(msg, parse_mode=ParseMode.HTML)
-        except Exception as e:
-            logger.error(f"Failed to send reward media: {e}")
-            await update.message.reply_text("⚠️ Failed to deliver the reward media.")
-
-        # store message id so we can attach the screenshot button to that message
-        try:
-            if sent_message and hasattr(context, 'user_data'):
-                context.user_data['last_reward_message_id'] = getattr(sent_message, 'message_id', None)
-        except Exception:
-            pass
+    await finish_redemption(context, update.update_id, update.effective_chat.id, code)
+
+def _codes_page(kind: str, page: int, user_id: int):
+    """Render one page of /listcodes (every code) or /mycodes (the admin's own) with Prev/Next buttons."""
+    total = len(codes) if kind == "listcodes" else codes.count_by(user_id)
+    pages = max(1, (total + CODES_PAGE_SIZE - 1) // CODES_PAGE_SIZE)
+    page = min(max(page, 1), pages)
+    offset = (page - 1) * CODES_PAGE_SIZE
+    if kind == "listcodes":
+        rows = list(codes.scan(CODES_PAGE_SIZE, offset))
+        message = f"📋 <b>Redeem Codes List</b> ({total} total, page {page}/{pages}):\n\n"
+        message += "".join(_code_line(code, info) for code, info in rows)
+        per_creator = codes.creator_counts()
+        if per_creator:
+            message += "\n👥 <b>By creator:</b> " + ", ".join(
+                f"<code>{creator_id}</code>: {count}" for creator_id, count in per_creator.items()
+            )
     else:
-        sent_text_msg = await update.message.reply_text(f"🎉 Success!\n\n{text}", parse_mode=ParseMode.HTML)
-        try:
-            if sent_text_msg and hasattr(context, 'user_data'):
-                context.user_data['last_reward_message_id'] = getattr(sent_text_msg, 'message_id', None)
-        except Exception:
-            pass
-
-    # After delivering reward, ask user to upload a screenshot/proof (button)
-    try:
-        # If the reward was sent as a message and we have its message id, reply to that message so the buttons appear under the reward.
-        reply_to = None
-        if hasattr(context, 'user_data') and isinstance(context.user_data, dict):
-            reply_to = context.user_data.pop('last_reward_message_id', None)
-        # Calling the send_screenshot_request function:
-        await send_screenshot_request(update.effective_chat.id, code, context, reply_to_message_id=reply_to)
-    except Exception as e:
-        logger.error(f"Failed to send screenshot request button: {e}")
+        rows = [(code, codes.peek(code)) for code in codes.codes_by(user_id, CODES_PAGE_SIZE, offset)]
+        exhausted, redemptions = codes.creator_totals(user_id)
+        message = (
+            f"🗂 <b>Your Codes</b> — {total} total, {total - exhausted} active, "
+            f"{exhausted} exhausted, {redemptions} redemptions (page {page}/{pages})\n\n"
+        )
+        message += "".join(_code_line(code, info) for code, info in rows if info is not None)
+    nav = []
+    if page > 1:
+        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"{kind}:{page - 1}"))
+    if page < pages:
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"{kind}:{page + 1}"))
+    return message, (InlineKeyboardMarkup([nav]) if nav else None)
 
 # List codes
 async def listcodes(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -510,16 +1503,98 @@ async def listcodes(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not codes:
         await update.message.reply_text("ℹ️ No codes created yet.", parse_mode=ParseMode.HTML)
         return
-    message = "📋 <b>Redeem Codes List:</b>\n\n"
-    for code, info in codes.items():
-        if isinstance(info["used_by"], list):  # multi-use
-            used = len(info["used_by"])
-            limit = info["limit"]
-            message += f"• <code>{code}</code> — {used}/{limit} used\n"
-        else:  # single-use
-            status = "✅ Available" if info["used_by"] is None else f"❌ Redeemed by <code>{info['used_by']}</code>"
-            message += f"• <code>{code}</code> — {status}\n"
-    await update.message.reply_text(message, parse_mode=ParseMode.HTML)
+    page = int(context.args[0]) if context.args and context.args[0].isdigit() else 1
+    text, keyboard = _codes_page("listcodes", page, update.effective_user.id)
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+
+async def codes_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    if not is_admin(query.from_user.id):
+        return
+    try:
+        kind, page = query.data.split(':', 1)
+        page = int(page)
+    except ValueError:
+        return
+    text, keyboard = _codes_page(kind, page, query.from_user.id)
+    await query.edit_message_text(text=text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+
+def _code_line(code: str, info: Dict[str, Any]) -> str:
+    if isinstance(info["used_by"], list):  # multi-use
+        used = len(info["used_by"])
+        limit = info["limit"]
+        return f"• <code>{code}</code> — {used}/{limit} used\n"
+    # single-use
+    status = "✅ Available" if info["used_by"] is None else f"❌ Redeemed by <code>{info['used_by']}</code>"
+    return f"• <code>{code}</code> — {status}\n"
+
+def is_exhausted(info: Dict[str, Any]) -> bool:
+    if isinstance(info.get("used_by"), list):
+        return len(info["used_by"]) >= info.get("limit", 0)
+    return info.get("used_by") is not None
+
+# Codes created by the calling admin (served from the codes_created_by index)
+async def mycodes(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        return
+    if not codes.count_by(update.effective_user.id):
+        await update.message.reply_text("ℹ️ You haven't created any codes yet.", parse_mode=ParseMode.HTML)
+        return
+    page = int(context.args[0]) if context.args and context.args[0].isdigit() else 1
+    text, keyboard = _codes_page("mycodes", page, update.effective_user.id)
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+
+# Bulk delete of the calling admin's codes
+async def deletecodes(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        return
+    args = [a.lower() for a in context.args]
+    if not args or args[0] != "mine" or any(a != "--exhausted" for a in args[1:]):
+        await update.message.reply_text(
+            "⚠️ Usage:\n<code>/deletecodes mine [--exhausted]</code>", parse_mode=ParseMode.HTML
+        )
+        return
+    only_exhausted = "--exhausted" in args
+    deleted = [
+        code for code in codes.codes_by(update.effective_user.id)
+        if not only_exhausted or is_exhausted(codes.peek(code))
+    ]
+    for code in deleted:
+        del codes[code]
+    what = "exhausted codes" if only_exhausted else "codes"
+    await update.message.reply_text(f"🗑️ Deleted {len(deleted)} of your {what}.", parse_mode=ParseMode.HTML)
+
+# Per-code analytics
+async def codestats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        return
+    if len(context.args) != 1:
+        await update.message.reply_text("⚠️ Usage:\n<code>/codestats &lt;code&gt;</code>", parse_mode=ParseMode.HTML)
+        return
+    code = context.args[0].upper()
+    info = codes.get(code)
+    if info is None:
+        await update.message.reply_text("❌ Code Not Found", parse_mode=ParseMode.HTML)
+        return
+    stats = code_stats(info)
+    if stats["remaining"] == 0:
+        eta = "exhausted"
+    elif stats["eta_seconds"] is None:
+        eta = "no recent redemptions"
+    else:
+        eta = f"~{format_uptime(stats['eta_seconds'])}"
+    await update.message.reply_text(
+        f"📈 <b>Stats for</b> <code>{code}</code>\n\n"
+        f"• Used: {stats['used']}/{stats['limit']}\n"
+        f"• Last hour: {stats['last_hour']} · Last 24h: {stats['last_24h']}\n"
+        f"• Rate: {stats['rate_per_hour']}/h\n"
+        f"• Peak: {stats['peak_per_minute']}/min · {stats['peak_per_hour']}/h\n"
+        f"• Runs out in: {eta}\n\n"
+        f"<code>{stats['sparkline']}</code>\n"
+        f"<i>redemptions per hour, last 24h</i>",
+        parse_mode=ParseMode.HTML
+    )
 
 # Delete code
 async def deletecode(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -529,10 +1604,11 @@ async def deletecode(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("⚠️ Usage:\n<code>/deletecode &lt;code&gt;</code>", parse_mode=ParseMode.HTML)
         return
     code = context.args[0].upper()
-    if code not in codes:
+    try:
+        del codes[code]
+    except KeyError:
         await update.message.reply_text("❌ Code Not Found", parse_mode=ParseMode.HTML)
         return
-    del codes[code]
     await update.message.reply_text(f"🗑️ Code <code>{code}</code> deleted.", parse_mode=ParseMode.HTML)
 
 # Styled Ping command
@@ -556,6 +1632,7 @@ async def ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
             status = "Poor ❌"
 
         uptime = format_uptime(time.time() - _start_time)
+        load = dispatch_limiter.metrics()
 
         # build nicely aligned mono block using fixed-width characters and spacing
         # note: HTML <code> preserves spacing in Telegram
@@ -565,7 +1642,9 @@ async def ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "<code>[ SYSTEM PING ]</code>\n\n"
             f"<code>≡ Response : {response_ms}</code>\n"
             f"<code>≡ Status   : {status}</code>\n"
-            f"<code>≡ Uptime   : {uptime}</code>"
+            f"<code>≡ Uptime   : {uptime}</code>\n"
+            f"<code>≡ Limit    : {load['limit']} handlers ({load['in_flight']} busy, {load['waiting']} waiting)</code>\n"
+            f"<code>≡ Shed     : {load['shed_total']}</code>"
         )
 
         await sent.edit_text(text, parse_mode=ParseMode.HTML)
@@ -575,6 +1654,18 @@ async def ping(update: Update, context: ContextTypes.DEFAULT_TYPE):
         
 # --- Ban Management Handlers (NEW) ---
 
+BANNED_PAGE_SIZE = 50
+CODES_PAGE_SIZE = 30  # /listcodes and /mycodes
+BAN_FILE_MAX_BYTES = 5 * 1024 * 1024
+
+def save_banned_users() -> None:
+    """Publish and persist the ban list; every change to BANNED_USERS ends with this call."""
+    current_bot().publish(banned_users=frozenset(BANNED_USERS))
+    try:
+        save_json_state(BANNED_USERS_FILE, sorted(BANNED_USERS))
+    except Exception as e:
+        logger.error(f"Failed to save ban list: {e}")
+
 async def ban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
         await update.message.reply_text("❌ Unauthorized", parse_mode=ParseMode.HTML)
@@ -593,25 +1684,16 @@ async def ban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Cannot ban an admin.", parse_mode=ParseMode.HTML)
         return
     
-    global BANNED_USERS
     if user_id in BANNED_USERS:
         await update.message.reply_text(f"⚠️ User ID <code>{user_id}</code> is already banned.", parse_mode=ParseMode.HTML)
         return
 
     BANNED_USERS.add(user_id)
+    save_banned_users()
     await update.message.reply_text(f"🔨 User ID <code>{user_id}</code> has been **banned**.", parse_mode=ParseMode.HTML)
     
-    # Optional: Notify the user they were banned
-    try:
-        await context.bot.send_message(
-            chat_id=user_id,
-            text="🚨 **Notification**: You have been banned from using this bot by an administrator. You will no longer be able to redeem codes."
-        )
-    except Forbidden:
-        # User has blocked the bot
-        pass
-    except Exception as e:
-        logger.warning(f"Failed to notify banned user {user_id}: {e}")
+    # Optional: Notify the user they were banned (sent in the background by the notifier)
+    queue_notification(user_id, BAN_NOTIFICATION)
 
 async def unban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
@@ -627,22 +1709,126 @@ async def unban_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("❌ Invalid User ID. Must be a number.", parse_mode=ParseMode.HTML)
         return
 
-    global BANNED_USERS
     if user_id not in BANNED_USERS:
         await update.message.reply_text(f"⚠️ User ID <code>{user_id}</code> is not currently banned.", parse_mode=ParseMode.HTML)
         return
 
     BANNED_USERS.remove(user_id)
+    save_banned_users()
     await update.message.reply_text(f"🔓 User ID <code>{user_id}</code> has been **unbanned**.", parse_mode=ParseMode.HTML)
     
     # Optional: Notify the user they were unbanned
+    queue_notification(user_id, UNBAN_NOTIFICATION)
+
+def parse_user_ids(tokens: List[str]) -> Tuple[Set[int], int]:
+    """Keep tokens that are entirely a positive integer; returns (ids, number of rejected tokens)."""
+    ids: Set[int] = set()
+    rejected = 0
+    for token in tokens:
+        if re.fullmatch(r"[0-9]+", token) and int(token) > 0:
+            ids.add(int(token))
+        else:
+            rejected += 1
+    return ids, rejected
+
+async def _read_bulk_ids(update: Update, context: ContextTypes.DEFAULT_TYPE) -> Optional[Tuple[Set[int], int]]:
+    """Collect user IDs from command arguments plus the replied-to document (split on whitespace/commas)."""
+    tokens = list(context.args)
+    replied = update.message.reply_to_message
+    document = replied.document if replied else None
+    if document:
+        if document.file_size and document.file_size > BAN_FILE_MAX_BYTES:
+            await update.message.reply_text("❌ File is too large (max 5 MB).", parse_mode=ParseMode.HTML)
+            return None
+        tg_file = await context.bot.get_file(document.file_id)
+        content = bytes(await tg_file.download_as_bytearray()).decode("utf-8", errors="ignore")
+        tokens.extend(t for t in re.split(r"[\s,]+", content) if t)
+    return parse_user_ids(tokens)
+
+async def ban_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("❌ Unauthorized", parse_mode=ParseMode.HTML)
+        return
     try:
-        await context.bot.send_message(
-            chat_id=user_id,
-            text="✅ **Notification**: You have been unbanned and can now use the bot again. Please follow all rules."
+        result = await _read_bulk_ids(update, context)
+    except Exception as e:
+        logger.error(f"Failed to read ban file: {e}")
+        await update.message.reply_text("⚠️ Could not read the uploaded file.", parse_mode=ParseMode.HTML)
+        return
+    if result is None:
+        return
+    ids, rejected = result
+    if not ids:
+        await update.message.reply_text(
+            f"⚠️ No valid user IDs found ({rejected} rejected).\n\n"
+            "Usage:\nReply to a file of user IDs with <code>/banbulk</code>\n(or <code>/banbulk &lt;id&gt; &lt;id&gt; ...</code>)",
+            parse_mode=ParseMode.HTML
         )
-    except Exception:
-        pass # Ignore if the user has blocked the bot
+        return
+
+    new_bans = {uid for uid in ids if uid not in BANNED_USERS and not is_admin(uid)}
+    BANNED_USERS.update(new_bans)
+    save_banned_users()
+    for user_id in new_bans:
+        queue_notification(user_id, BAN_NOTIFICATION)
+    await update.message.reply_text(
+        f"🔨 <b>Bulk ban applied</b>\n\n"
+        f"• Newly banned: {len(new_bans)}\n"
+        f"• Already banned / admins skipped: {len(ids) - len(new_bans)}\n"
+        f"• Rejected (not a user ID): {rejected}\n"
+        f"• Total banned: {len(BANNED_USERS)}",
+        parse_mode=ParseMode.HTML
+    )
+
+async def unban_bulk(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("❌ Unauthorized", parse_mode=ParseMode.HTML)
+        return
+    try:
+        result = await _read_bulk_ids(update, context)
+    except Exception as e:
+        logger.error(f"Failed to read unban file: {e}")
+        await update.message.reply_text("⚠️ Could not read the uploaded file.", parse_mode=ParseMode.HTML)
+        return
+    if result is None:
+        return
+    ids, rejected = result
+    if not ids:
+        await update.message.reply_text(
+            f"⚠️ No valid user IDs found ({rejected} rejected).\n\n"
+            "Usage:\nReply to a file of user IDs with <code>/unbanbulk</code>\n(or <code>/unbanbulk &lt;id&gt; &lt;id&gt; ...</code>)",
+            parse_mode=ParseMode.HTML
+        )
+        return
+
+    removed = ids.intersection(BANNED_USERS)
+    BANNED_USERS.difference_update(removed)
+    save_banned_users()
+    for user_id in removed:
+        queue_notification(user_id, UNBAN_NOTIFICATION)
+    await update.message.reply_text(
+        f"🔓 <b>Bulk unban applied</b>\n\n"
+        f"• Unbanned: {len(removed)}\n"
+        f"• Not banned: {len(ids) - len(removed)}\n"
+        f"• Rejected (not a user ID): {rejected}\n"
+        f"• Total banned: {len(BANNED_USERS)}",
+        parse_mode=ParseMode.HTML
+    )
+
+def _banned_page(page: int):
+    """Render one page of the ban list with Prev/Next buttons."""
+    banned = sorted(BANNED_USERS)
+    pages = max(1, (len(banned) + BANNED_PAGE_SIZE - 1) // BANNED_PAGE_SIZE)
+    page = min(max(page, 1), pages)
+    chunk = banned[(page - 1) * BANNED_PAGE_SIZE:page * BANNED_PAGE_SIZE]
+    lines = [f"🔨 <b>Banned Users List</b> ({len(banned)} total, page {page}/{pages}):\n"]
+    lines.extend(f"• <code>{user_id}</code>" for user_id in chunk)
+    nav = []
+    if page > 1:
+        nav.append(InlineKeyboardButton("⬅️ Prev", callback_data=f"listbanned:{page - 1}"))
+    if page < pages:
+        nav.append(InlineKeyboardButton("Next ➡️", callback_data=f"listbanned:{page + 1}"))
+    return "\n".join(lines), (InlineKeyboardMarkup([nav]) if nav else None)
 
 async def list_banned(update: Update, context: ContextTypes.DEFAULT_TYPE):
     if not is_admin(update.effective_user.id):
@@ -652,11 +1838,63 @@ async def list_banned(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await update.message.reply_text("ℹ️ No users are currently banned.", parse_mode=ParseMode.HTML)
         return
     
-    message = "🔨 <b>Banned Users List:</b>\n\n"
-    for user_id in sorted(list(BANNED_USERS)):
-        message += f"• <code>{user_id}</code>\n"
+    page = int(context.args[0]) if context.args and context.args[0].isdigit() else 1
+    text, keyboard = _banned_page(page)
+    await update.message.reply_text(text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
+
+async def list_banned_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    query = update.callback_query
+    await query.answer()
+    if not is_admin(query.from_user.id):
+        return
+    try:
+        page = int(query.data.split(':', 1)[1])
+    except (IndexError, ValueError):
+        return
+    text, keyboard = _banned_page(page)
+    await query.edit_message_text(text=text, parse_mode=ParseMode.HTML, reply_markup=keyboard)
 
-    await update.message.reply_text(message, parse_mode=ParseMode.HTML)
+
+# --- Background notification sender ---
+
+BAN_NOTIFICATION = "🚨 **Notification**: You have been banned from using this bot by an administrator. You will no longer be able to redeem codes."
+UNBAN_NOTIFICATION = "✅ **Notification**: You have been unbanned and can now use the bot again. Please follow all rules."
+# One queue and worker for every bot in the process; items name the bot that sends them.
+notification_queue: asyncio.Queue = asyncio.Queue()
+notification_limiter = RateLimiter(NOTIFY_RATE, burst=5)
+
+def queue_notification(chat_id: int, text: str, bot_name: Optional[str] = None) -> None:
+    """Hand a message to the background notifier instead of awaiting it in the handler."""
+    notification_queue.put_nowait((bot_name or current_bot().name, chat_id, text))
+
+async def notification_worker() -> None:
+    while True:
+        bot_name, chat_id, text = await notification_queue.get()
+        try:
+            instance = BOTS.get(bot_name)
+            if instance is not None and instance.application is not None:
+                _current_bot.set(instance)
+                await _send_notification(instance.bulk_bot or instance.application.bot, chat_id, text)
+        finally:
+            notification_queue.task_done()
+
+async def _send_notification(bot, chat_id: int, text: str) -> None:
+    for _ in range(3):
+        await notification_limiter.acquire()
+        try:
+            await bot.send_message(chat_id=chat_id, text=text)
+            unblock_user(chat_id)
+            return
+        except RetryAfter as e:
+            await notification_limiter.pause(float(e.retry_after))
+        except Forbidden:
+            # User has blocked the bot
+            BLOCKED_USERS.add(chat_id)
+            save_blocked_users()
+            return
+        except Exception as e:
+            logger.warning(f"Failed to notify user {chat_id}: {e}")
+            return
 
 
 # --- Screenshot / Proof handling ---
@@ -689,7 +1927,7 @@ async def request_screenshot_callback(update: Update, context: ContextTypes.DEFA
     if code not in codes:
         await query.message.reply_text("⚠️ This code is unknown or expired.")
         return
-    creator_id = codes.get(code, {}).get("created_by")
+    creator_id = codes.creator_of(code)
     pending_screenshots[user.id] = {"code": code, "creator_id": creator_id, "requested_at": time.time()}
     await query.message.reply_text("📸 Please send a photo (screenshot) in this chat now. I'll forward it to the code creator.")
 
@@ -703,6 +1941,90 @@ async def cancel_screenshot_callback(update: Update, context: ContextTypes.DEFAU
     else:
         await query.message.reply_text("ℹ️ No pending screenshot request to cancel.")
 
+# Proof batching: when proofs for one creator arrive faster than PROOF_BATCH_WINDOW,
+# they are collected and forwarded as media-group albums instead of one message each.
+PROOF_ALBUM_SIZE = 10  # Telegram's sendMediaGroup maximum
+PROOF_CAPTION_LIMIT = 1024
+_proof_batches = _PerBot("proof_batches")
+_proof_flush_tasks = _PerBot("proof_flush_tasks")
+_proof_last_sent = _PerBot("proof_last_sent")
+
+def _proof_caption(proof: Dict[str, Any]) -> str:
+    return (
+        f"📸 <b>Screenshot / Proof Received</b>\n\n"
+        f"• Code: <code>{proof['code']}</code>\n"
+        f"• From: <code>{proof['user_id']}</code> — {html.escape(proof['name'])}\n"
+        f"• Chat: <code>{proof['chat_id']}</code>"
+    )
+
+def _album_caption(proofs: List[Dict[str, Any]]) -> str:
+    """Combined index caption for an album: one line per proof, cut to Telegram's caption limit."""
+    caption = f"📸 <b>{len(proofs)} Screenshots / Proofs Received</b>\n\n"
+    for i, proof in enumerate(proofs, 1):
+        line = f"{i}. <code>{proof['code']}</code> — <code>{proof['user_id']}</code> — {html.escape(proof['name'])}\n"
+        if len(caption) + len(line) > PROOF_CAPTION_LIMIT - 20:
+            caption += f"…and {len(proofs) - i + 1} more"
+            break
+        caption += line
+    return caption
+
+async def _send_proof_single(bot, creator_id: int, proof: Dict[str, Any]) -> None:
+    if proof["kind"] == "photo":
+        await bot.send_photo(chat_id=creator_id, photo=proof["file_id"], caption=_proof_caption(proof), parse_mode=ParseMode.HTML)
+    else:
+        await bot.send_document(chat_id=creator_id, document=proof["file_id"], caption=_proof_caption(proof), parse_mode=ParseMode.HTML)
+
+async def _send_proof_batch(bot, creator_id: int, proofs: List[Dict[str, Any]]) -> None:
+    # photos and documents cannot share an album, so group by kind first
+    for kind, media_cls in (("photo", InputMediaPhoto), ("document", InputMediaDocument)):
+        of_kind = [p for p in proofs if p["kind"] == kind]
+        for i in range(0, len(of_kind), PROOF_ALBUM_SIZE):
+            chunk = of_kind[i:i + PROOF_ALBUM_SIZE]
+            try:
+                if len(chunk) == 1:
+                    await _send_proof_single(bot, creator_id, chunk[0])
+                    continue
+                media = [media_cls(media=p["file_id"]) for p in chunk]
+                media[0] = media_cls(media=chunk[0]["file_id"], caption=_album_caption(chunk), parse_mode=ParseMode.HTML)
+                await bot.send_media_group(chat_id=creator_id, media=media)
+            except Exception as e:
+                logger.error(f"Failed to forward {len(chunk)} proof(s) to creator {creator_id}: {e}")
+
+async def _flush_proofs_later(bot, creator_id: int) -> None:
+    try:
+        await asyncio.sleep(PROOF_BATCH_WINDOW)
+    finally:
+        proofs = _proof_batches.pop(creator_id, [])
+        _proof_flush_tasks.pop(creator_id, None)
+        _proof_last_sent[creator_id] = time.time()
+    if proofs:
+        await _send_proof_batch(bot, creator_id, proofs)
+
+async def flush_all_proofs(bot) -> None:
+    """Send every queued proof now (used when draining before a restart)."""
+    batches = dict(_proof_batches)
+    _proof_batches.clear()
+    for task in list(_proof_flush_tasks.values()):
+        task.cancel()
+    for creator_id, proofs in batches.items():
+        await _send_proof_batch(bot, creator_id, proofs)
+
+async def forward_proof(bot, creator_id: int, proof: Dict[str, Any]) -> bool:
+    """
+    Forward a proof to its creator. At low volume it is sent right away; if another
+    proof for the same creator went out within PROOF_BATCH_WINDOW, it is queued and
+    the whole window is flushed as albums. Returns True if it was sent right away.
+    """
+    now = time.time()
+    if creator_id not in _proof_batches and now - _proof_last_sent.get(creator_id, 0) > PROOF_BATCH_WINDOW:
+        _proof_last_sent[creator_id] = now
+        await _send_proof_single(bot, creator_id, proof)
+        return True
+    _proof_batches.setdefault(creator_id, []).append(proof)
+    if creator_id not in _proof_flush_tasks:
+        _proof_flush_tasks[creator_id] = asyncio.create_task(_flush_proofs_later(bot, creator_id))
+    return False
+
 async def handle_incoming_image(update: Update, context: ContextTypes.DEFAULT_TYPE):
     message = update.message
     user = update.effective_user
@@ -714,40 +2036,393 @@ async def handle_incoming_image(update: Update, context: ContextTypes.DEFAULT_TY
     code = info.get('code')
     creator_id = info.get('creator_id')
 
-    caption = (
-        f"📸 <b>Screenshot / Proof Received</b>\n\n"
-        f"• Code: <code>{code}</code>\n"
-        f"• From: <code>{user.id}</code> — {user.full_name}\n"
-        f"• Chat: <code>{message.chat.id}</code>"
+    # prefer sending original photo file
+    if message.photo:
+        kind, file_id = "photo", message.photo[-1].file_id
+    elif message.document and (message.document.mime_type or '').startswith('image'):
+        kind, file_id = "document", message.document.file_id
+    else:
+        # unsupported type
+        await message.reply_text("⚠️ Unsupported file type. Please send a photo or image file.")
+        return
+    if not creator_id:
+        # if creator is unknown, inform the sender (do not broadcast to all admins)
+        await message.reply_text("⚠️ Unable to forward: the code creator is unknown. Please contact support/admin.")
+        return
+
+    proof = {
+        "kind": kind,
+        "file_id": file_id,
+        "code": code,
+        "user_id": user.id,
+        "name": user.full_name,
+        "chat_id": message.chat.id,
+    }
+    try:
+        if await forward_proof(context.bot, creator_id, proof):
+            await message.reply_text("✅ Screenshot received and forwarded to the code creator. Thank you!")
+        else:
+            await message.reply_text("✅ Screenshot received and queued for the code creator. Thank you!")
+    except Exception as e:
+        logger.error(f"Failed to process incoming screenshot: {e}")
+        await message.reply_text("⚠️ Failed to forward screenshot. Please try again later.")
+
+
+# --- Broadcast to past redeemers ---
+
+BROADCAST_CHECKPOINT_FILE = "broadcast_checkpoint.json"
+# Recipient list frozen when the job starts: checkpoint positions index into this snapshot,
+# so redemptions or deletions made while the job runs cannot shift them.
+BROADCAST_RECIPIENTS_FILE = "broadcast_recipients.json"
+broadcast_limiter = RateLimiter(BROADCAST_RATE, burst=BROADCAST_WORKERS)
+
+def _broadcast_progress_text(job: Dict[str, Any], done: bool = False) -> str:
+    target = f"code <code>{job['code']}</code>" if job.get("code") else "all redeemers"
+    elapsed = format_uptime(time.time() - job["started_at"])
+    header = "✅ <b>Broadcast finished</b>" if done else "📣 <b>Broadcasting...</b>"
+    return (
+        f"{header}\n\n"
+        f"• Target: {target}\n"
+        f"• Sent: {job['sent']}\n"
+        f"• Blocked: {job['blocked']}\n"
+        f"• Failed: {job['failed']}\n"
+        f"• Skipped: {job['skipped']}\n"
+        f"• Elapsed: {elapsed}"
     )
 
+def _save_broadcast_checkpoint(job: Dict[str, Any], done_ahead: Set[int]) -> None:
+    """Persist the job with its contiguous cursor plus the few positions finished out of order."""
     try:
-        # prefer sending original photo file
-        if message.photo:
-            file_id = message.photo[-1].file_id
-            # forward to creator if exists
-            if creator_id:
-                await context.bot.send_photo(chat_id=creator_id, photo=file_id, caption=caption, parse_mode=ParseMode.HTML)
-            else:
-                # if creator is unknown, inform the sender (do not broadcast to all admins)
-                await message.reply_text("⚠️ Unable to forward: the code creator is unknown. Please contact support/admin.")
+        save_json_state(BROADCAST_CHECKPOINT_FILE, {**job, "done_ahead": sorted(done_ahead)})
+    except Exception as e:
+        logger.error(f"Failed to save broadcast checkpoint: {e}")
+
+async def _broadcast_send(bot, user_id: int, job: Dict[str, Any]) -> str:
+    """Copy the broadcast message to one user. Returns 'sent', 'blocked' or 'failed'."""
+    for _ in range(3):
+        await broadcast_limiter.acquire()
+        try:
+            await bot.copy_message(
+                chat_id=user_id,
+                from_chat_id=job["from_chat_id"],
+                message_id=job["message_id"]
+            )
+            BLOCKED_USERS.discard(user_id)  # saved with the next checkpoint
+            return "sent"
+        except RetryAfter as e:
+            logger.warning(f"Broadcast hit flood limit, pausing {e.retry_after}s")
+            await broadcast_limiter.pause(float(e.retry_after))
+        except Forbidden:
+            BLOCKED_USERS.add(user_id)
+            return "blocked"
+        except Exception as e:
+            logger.warning(f"Broadcast to {user_id} failed: {e}")
+            return "failed"
+    return "failed"
+
+async def run_broadcast(bot, job: Dict[str, Any]) -> None:
+    """
+    Feed the job's frozen recipient list into a bounded queue consumed by
+    BROADCAST_WORKERS workers. Progress is shown by editing a single status message
+    and checkpointed to disk, so a restart resumes from the last confirmed position.
+    """
+    recipients = load_json_state(BROADCAST_RECIPIENTS_FILE, None)
+    if recipients is None:
+        # without a code this walks every record: keep it off the event loop
+        recipients = await asyncio.to_thread(_freeze_recipients, job.get("code"))
+    queue: asyncio.Queue = asyncio.Queue(maxsize=BROADCAST_WORKERS * 2)
+    done_ahead: Set[int] = set(job.pop("done_ahead", []))
+    finished = asyncio.Event()
+
+    def mark_done(position: int) -> None:
+        # advance the contiguous cursor; out-of-order completions wait in done_ahead
+        done_ahead.add(position)
+        while job["cursor"] in done_ahead:
+            done_ahead.discard(job["cursor"])
+            job["cursor"] += 1
+
+    async def producer() -> None:
+        for position, user_id in enumerate(recipients):
+            if position < job["cursor"] or position in done_ahead:
+                continue
+            if user_id in BLOCKED_USERS or is_banned(user_id):
+                job["skipped"] += 1
+                mark_done(position)
+                continue
+            await queue.put((position, user_id))
+        for _ in range(BROADCAST_WORKERS):
+            await queue.put(None)
+
+    async def worker() -> None:
+        while True:
+            item = await queue.get()
+            if item is None:
                 return
-        elif message.document and (message.document.mime_type or '').startswith('image'):
-            file_id = message.document.file_id
-            if creator_id:
-                await context.bot.send_document(chat_id=creator_id, document=file_id, caption=caption, parse_mode=ParseMode.HTML)
-            else:
-                await message.reply_text("⚠️ Unable to forward: the code creator is unknown. Please contact support/admin.")
+            position, user_id = item
+            result = await _broadcast_send(bot, user_id, job)
+            job[result] += 1
+            mark_done(position)
+
+    async def reporter() -> None:
+        last_text = None
+        while not finished.is_set():
+            try:
+                await asyncio.wait_for(finished.wait(), timeout=BROADCAST_PROGRESS_INTERVAL)
+            except asyncio.TimeoutError:
+                pass
+            _save_broadcast_checkpoint(job, done_ahead)
+            save_blocked_users()
+            text = _broadcast_progress_text(job, done=finished.is_set())
+            if text == last_text:
+                continue
+            last_text = text
+            try:
+                await bot.edit_message_text(
+                    text=text,
+                    chat_id=job["status_chat_id"],
+                    message_id=job["status_message_id"],
+                    parse_mode=ParseMode.HTML
+                )
+            except BadRequest:
+                pass  # "message is not modified" or status message deleted
+            except Exception as e:
+                logger.warning(f"Failed to update broadcast status: {e}")
+
+    report_task = asyncio.create_task(reporter())
+    try:
+        await asyncio.gather(producer(), *(worker() for _ in range(BROADCAST_WORKERS)))
+    except asyncio.CancelledError:
+        # stopping for a restart: checkpoint right away, skip the final status edit
+        report_task.cancel()
+        _save_broadcast_checkpoint(job, done_ahead)
+        raise
+    finally:
+        finished.set()
+        if not report_task.cancelled():
+            await report_task
+    delete_json_state(BROADCAST_CHECKPOINT_FILE)
+    delete_json_state(BROADCAST_RECIPIENTS_FILE)
+    logger.info(f"Broadcast finished: {job['sent']} sent, {job['blocked']} blocked, {job['failed']} failed")
+
+def _freeze_recipients(code: Optional[str]) -> List[int]:
+    """Snapshot the recipients to BROADCAST_RECIPIENTS_FILE (runs in a worker thread)."""
+    recipients = list(iter_redeemers(code))
+    save_json_state(BROADCAST_RECIPIENTS_FILE, recipients)
+    return recipients
+
+def _claim_broadcast(coro) -> None:
+    async def runner() -> None:
+        try:
+            await coro
+        except Exception as e:
+            logger.error(f"Broadcast crashed (checkpoint kept for resume): {e}")
+
+    current_bot().broadcast_task = asyncio.create_task(runner())
+
+def start_broadcast_task(bot, job: Dict[str, Any]) -> None:
+    _claim_broadcast(run_broadcast(bot, job))
+
+async def _start_new_broadcast(bot, message, code: Optional[str]) -> None:
+    """Body of a /broadcast task: post the status message, checkpoint the job, run it."""
+    status_msg = await message.reply_text("📣 Starting broadcast...", parse_mode=ParseMode.HTML)
+    job = {
+        "code": code,
+        "from_chat_id": message.chat_id,
+        "message_id": message.reply_to_message.message_id,
+        "status_chat_id": status_msg.chat_id,
+        "status_message_id": status_msg.message_id,
+        "started_at": time.time(),
+        "cursor": 0,
+        "sent": 0,
+        "blocked": 0,
+        "failed": 0,
+        "skipped": 0,
+    }
+    _save_broadcast_checkpoint(job, set())
+    await run_broadcast(bot, job)
+
+async def broadcast(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("❌ Unauthorized", parse_mode=ParseMode.HTML)
+        return
+    if not update.message.reply_to_message:
+        await update.message.reply_text(
+            "⚠️ Usage:\nReply to the message to send with <code>/broadcast [code]</code>\n\n"
+            "Without a code, everyone who ever redeemed a code receives it.",
+            parse_mode=ParseMode.HTML
+        )
+        return
+    running = current_bot().broadcast_task
+    if running is not None and not running.done():
+        await update.message.reply_text("⚠️ A broadcast is already running.", parse_mode=ParseMode.HTML)
+        return
+    code = context.args[0].upper() if context.args else None
+    if code is not None and code not in codes:
+        await update.message.reply_text("❌ Code Not Found", parse_mode=ParseMode.HTML)
+        return
+
+    # claimed before the first await: updates run concurrently, and a second /broadcast
+    # arriving while the status message is sent must see this one running
+    delete_json_state(BROADCAST_RECIPIENTS_FILE)  # left over from a job that never started
+    _claim_broadcast(_start_new_broadcast(bulk_bot(context.bot), update.message, code))
+
+async def resume_broadcast(application) -> None:
+    """post_init hook: continue a broadcast that was interrupted by a restart."""
+    job = load_json_state(BROADCAST_CHECKPOINT_FILE, None)
+    if not job:
+        return
+    logger.info(f"Resuming broadcast from position {job.get('cursor', 0)}")
+    start_broadcast_task(bulk_bot(application.bot), job)
+
+# ---------- Memory introspection ----------
+# /memstats (and GET /memstats) report the sizes of the structures that can grow.
+# Allocation tracing is opt-in: "/memstats trace start" starts tracemalloc and takes a
+# baseline, "/memstats trace diff [N]" sends the top-N growth since then as a document,
+# "/memstats trace stop" switches it off again. Nothing is traced until started.
+# Every bot keeps its own baseline; tracemalloc runs while any bot is tracing.
+# The report walks the heap and scans the store, so it is built off the event loop,
+# and the heap walk is reused for MEMSTATS_GC_TTL seconds.
+MEMSTATS_TOP_N = 25
+MEMSTATS_GC_TTL = 60
+TRACE_FRAMES = 5
+_gc_objects = (0.0, 0)  # (monotonic time counted, object count)
+
+def _rss_bytes() -> Optional[int]:
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    try:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024  # peak, not current
+    except ImportError:
+        return None
+
+def _gc_object_count() -> int:
+    global _gc_objects
+    import gc
+    counted_at, count = _gc_objects
+    if not counted_at or time.monotonic() - counted_at > MEMSTATS_GC_TTL:
+        _gc_objects = (time.monotonic(), len(gc.get_objects()))
+    return _gc_objects[1]
+
+def memory_report() -> Dict[str, Any]:
+    """Sizes of the structures that can grow (blocking: call it off the event loop)."""
+    import tracemalloc
+    instance = current_bot()
+    application = instance.application
+    used_by_total = 0
+    if instance.store is not None:
+        with codes._reader() as db:
+            row = db.execute(
+                "SELECT COALESCE(SUM(CASE json_type(data, '$.used_by') WHEN 'array' "
+                "THEN json_array_length(data, '$.used_by') ELSE 0 END), 0) FROM codes"
+            ).fetchone()
+        used_by_total = row[0]
+    report = {
+        "rss_bytes": _rss_bytes(),
+        "gc_objects": _gc_object_count(),
+        "structures": {
+            "pending_screenshots": len(pending_screenshots),
+            "user_data": len(application.user_data) if application else 0,
+            "chat_data": len(application.chat_data) if application else 0,
+            "used_by_entries": used_by_total,
+            "processed_update_ids": len(_processed_ids),
+            "rewards_in_flight": len(_rewards_in_flight),
+            "notification_queue": notification_queue.qsize(),
+            "proof_batches": sum(len(batch) for batch in list(_proof_batches.values())),
+            "background_tasks": len(_background_tasks),
+            "banned_users": len(BANNED_USERS),
+            "blocked_users": len(BLOCKED_USERS),
+        },
+        "code_cache": codes.metrics(),
+        "bot": instance.name,
+        "bots_in_process": len(BOTS),
+        "tracing": tracemalloc.is_tracing(),
+    }
+    if tracemalloc.is_tracing():
+        current, peak = tracemalloc.get_traced_memory()
+        report["traced_bytes"] = current
+        report["traced_peak_bytes"] = peak
+    return report
+
+def start_trace() -> None:
+    import tracemalloc
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(TRACE_FRAMES)
+    current_bot().trace_baseline = tracemalloc.take_snapshot()
+
+def stop_trace() -> None:
+    import tracemalloc
+    current_bot().trace_baseline = None
+    if all(instance.trace_baseline is None for instance in BOTS.values()):
+        tracemalloc.stop()
+
+def trace_diff(top_n: int = MEMSTATS_TOP_N) -> Optional[str]:
+    """Top-N allocation growth since this bot's baseline as text, or None when it is not tracing."""
+    import tracemalloc
+    baseline = current_bot().trace_baseline
+    if baseline is None or not tracemalloc.is_tracing():
+        return None
+    ignore = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, "<frozen importlib._bootstrap*>")]
+    snapshot = tracemalloc.take_snapshot().filter_traces(ignore)
+    stats = snapshot.compare_to(baseline.filter_traces(ignore), "lineno")
+    lines = [f"Top {top_n} allocation changes since baseline of bot {current_bot().name} "
+             f"({time.strftime('%Y-%m-%d %H:%M:%S')})", ""]
+    for stat in stats[:top_n]:
+        lines.append(str(stat))
+        for frame in stat.traceback.format()[1:]:
+            lines.append(f"    {frame.strip()}")
+    return "\n".join(lines) + "\n"
+
+def _format_bytes(n: Optional[int]) -> str:
+    if n is None:
+        return "n/a"
+    size = float(n)
+    for unit in ("B", "KB", "MB"):
+        if size < 1024:
+            return f"{size:.0f} {unit}" if unit == "B" else f"{size:.1f} {unit}"
+        size /= 1024
+    return f"{size:.1f} GB"
+
+async def memstats(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    if not is_admin(update.effective_user.id):
+        return
+    args = [a.lower() for a in context.args]
+    if args[:1] == ["trace"]:
+        action = args[1] if len(args) > 1 else ""
+        if action == "start":
+            start_trace()
+            await update.message.reply_text("🧪 Allocation tracing started; baseline taken.", parse_mode=ParseMode.HTML)
+        elif action == "stop":
+            stop_trace()
+            await update.message.reply_text("🧪 Allocation tracing stopped.", parse_mode=ParseMode.HTML)
+        elif action == "diff":
+            top_n = int(args[2]) if len(args) > 2 and args[2].isdigit() else MEMSTATS_TOP_N
+            report = await asyncio.to_thread(trace_diff, top_n)
+            if report is None:
+                await update.message.reply_text("⚠️ Tracing is off. Start it with <code>/memstats trace start</code>.", parse_mode=ParseMode.HTML)
                 return
+            document = InputFile(report.encode("utf-8"), filename=f"memdiff-{int(time.time())}.txt")
+            await update.message.reply_document(document, caption=f"🧪 Top {top_n} allocation changes since baseline")
         else:
-            # unsupported type
-            await message.reply_text("⚠️ Unsupported file type. Please send a photo or image file.")
-            return
+            await update.message.reply_text("⚠️ Usage:\n<code>/memstats [trace start|diff [N]|stop]</code>", parse_mode=ParseMode.HTML)
+        return
 
-        await message.reply_text("✅ Screenshot received and forwarded to the code creator. Thank you!")
-    except Exception as e:
-        logger.error(f"Failed to process incoming screenshot: {e}")
-        await message.reply_text("⚠️ Failed to forward screenshot. Please try again later.")
+    report = await asyncio.to_thread(memory_report)  # the context, and so the current bot, goes along
+    message = (
+        "🧠 <b>Memory</b>\n\n"
+        f"• RSS: {_format_bytes(report['rss_bytes'])}\n"
+        f"• GC objects: {report['gc_objects']}\n"
+        f"• Code cache: {report['code_cache']['resident']} codes, {_format_bytes(report['code_cache']['resident_bytes'])}\n"
+    )
+    message += "".join(f"• {name.replace('_', ' ')}: {value}\n" for name, value in report["structures"].items())
+    if report["tracing"]:
+        message += f"\n🧪 Tracing: {_format_bytes(report['traced_bytes'])} (peak {_format_bytes(report['traced_peak_bytes'])})"
+    await update.message.reply_text(message, parse_mode=ParseMode.HTML)
 
 
 # ---------- Flask status page & endpoints - Updated for direct Open Bot link ----------
@@ -827,7 +2502,7 @@ STATUS_HTML = r"""
       <div class="info">
         <div>
           <div class="title">Terminal</div>
-          <div class="sub">Simulated Termux boot animation. Page auto-fills live status from /status.</div>
+          <div class="sub">Simulated Termux boot animation. Stats stay live via /status/stream.</div>
         </div>
 
         <div class="terminal" role="img" aria-label="Termux terminal simulation">
@@ -850,6 +2525,8 @@ STATUS_HTML = r"""
           <div class="stat"><b id="version">—</b>Version</div>
           <div class="stat"><b id="users">—</b>Active Users</div>
           <div class="stat"><b id="chan">—</b>Channels Required</div>
+          <div class="stat"><b id="rate">—</b>Redemptions / s</div>
+          <div class="stat"><b id="queue">—</b>Queued Messages</div>
         </div>
       </div>
     </div>
@@ -884,12 +2561,7 @@ STATUS_HTML = r"""
     const pct = document.getElementById('percent');
     const ptext = document.getElementById('progressText');
 
-    if (status) {
-      document.getElementById('uptime').innerText = status.uptime;
-      document.getElementById('version').innerText = status.version;
-      document.getElementById('users').innerText = status.active_users;
-      document.getElementById('chan').innerText = status.force_channel_count;
-    }
+    if (status) showStats(status);
 
     let li = 0;
     let totalChars = lines.join('').length;
@@ -923,6 +2595,26 @@ STATUS_HTML = r"""
     typeNextLine();
   }
 
+  function showStats(status) {
+    document.getElementById('uptime').innerText = status.uptime;
+    document.getElementById('version').innerText = status.version;
+    document.getElementById('users').innerText = status.active_users;
+    document.getElementById('chan').innerText = status.force_channel_count;
+    document.getElementById('rate').innerText = status.redemptions_per_sec;
+    document.getElementById('queue').innerText = status.queues.notifications + status.queues.proofs;
+  }
+
+  // Each event carries only the fields that changed; merge them into the last full snapshot
+  function startLiveStats() {
+    let live = {};
+    const source = new EventSource('/status/stream');
+    source.onmessage = (e) => {
+      live = Object.assign({}, live, JSON.parse(e.data));
+      if (live.queues) showStats(live);
+    };
+    source.onerror = () => { live = {}; };  // the browser reconnects; the first event is a full snapshot again
+  }
+
   document.getElementById('restartBtn').addEventListener('click', async () => {
     if (!confirm('Restart Bot? (this will call a protected endpoint)')) return;
     const resp = await fetch('/restart', {
@@ -936,27 +2628,163 @@ STATUS_HTML = r"""
   // The 'Open Bot' JavaScript handler has been removed as it's now a direct HTML link.
 
   fetchAndStart();
+  startLiveStats();
 </script>
 </body>
 </html>
 """
 
+_home_page: Optional[str] = None  # STATUS_HTML rendered on first visit, not at startup
+
 @flask_app.route("/")
 def home():
-    rendered = render_template_string(STATUS_HTML, WEB_SECRET=WEB_SECRET)
-    return Response(rendered, mimetype="text/html")
+    global _home_page
+    if _home_page is None:
+        _home_page = render_template_string(STATUS_HTML, WEB_SECRET=WEB_SECRET)
+    return Response(_home_page, mimetype="text/html")
+
+@flask_app.route("/health")
+def health():
+    """Cheap liveness check: answers as soon as the status server is up, before the bots are."""
+    return jsonify({"ok": True, "ready": "polling" in startup_phases, "uptime_s": int(time.time() - _start_time)})
+
+# --- Shared status snapshot ---
+# /status and every /status/stream viewer read the same snapshot, rebuilt at most once
+# per STATUS_STREAM_INTERVAL (active users, which scans every code, at most once per
+# ACTIVE_USERS_REFRESH), so the cost does not grow with the number of open dashboards.
+class StatusHub:
+    def __init__(self, interval: float, owner: Optional[BotInstance] = None):
+        self.interval = interval
+        self.owner = owner  # the bot reported on (None: the current bot)
+        self.seq = 0
+        self._snapshot: Dict[str, Any] = {}
+        self._built_at = 0.0
+        self._redemptions_seen = 0
+        self._active_users: Optional[int] = None
+        self._active_users_at = 0.0
+        self._lock = Lock()
+
+    def get(self) -> Tuple[int, Dict[str, Any]]:
+        with self._lock:
+            now = time.monotonic()
+            if not self.seq or now - self._built_at >= self.interval:
+                if self.owner is None:
+                    self._rebuild(now)
+                else:
+                    run_as(self.owner, self._rebuild, now)
+            return self.seq, self._snapshot
+
+    def next_tick_in(self) -> float:
+        return max(0.0, self._built_at + self.interval - time.monotonic())
+
+    def _rebuild(self, now: float) -> None:
+        if self._active_users is None or now - self._active_users_at >= ACTIVE_USERS_REFRESH:
+            self._active_users = compute_active_users()
+            self._active_users_at = now
+        elapsed = now - self._built_at if self.seq else 0
+        instance = current_bot()
+        view = instance.view
+        per_sec = (instance.redemptions_total - self._redemptions_seen) / elapsed if elapsed else 0.0
+        self._redemptions_seen = instance.redemptions_total
+        self._built_at = now
+        self.seq += 1
+        self._snapshot = {
+            "uptime": format_uptime(time.time() - _start_time),
+            "uptime_s": int(time.time() - _start_time),
+            "version": BOT_VERSION,
+            "active_users": self._active_users,
+            "force_channel_count": len(view.force_channels), # Changed to count
+            "bot_name": "Redeem Code Bot",
+            "bot": instance.name,
+            "codes_count": view.codes_count,
+            "state_version": view.version,
+            "redemptions_total": instance.redemptions_total,
+            "redemptions_per_sec": round(per_sec, 2),
+            "queues": {
+                "notifications": notification_queue.qsize(),
+                "proofs": sum(len(batch) for batch in list(_proof_batches.values())),
+                "screenshot_prompts": len(pending_screenshots),
+            },
+            "dispatch": dispatch_limiter.metrics(),
+            "broadcast_running": instance.broadcast_task is not None and not instance.broadcast_task.done(),
+            "recovery_ms": round(_recovery_seconds * 1000, 1),
+            "restart_gap_ms": round(_last_restart_gap * 1000, 1) if _last_restart_gap is not None else None,
+            "code_cache": codes.metrics()
+        }
+
+status_hub = _PerBot("status_hub")
+
+def _requested_bot() -> Optional[BotInstance]:
+    """The bot named by ?bot=<name> (the primary bot when absent), or None if unknown."""
+    return BOTS.get(request.args.get("bot") or PRIMARY_BOT_NAME)
 
 @flask_app.route("/status")
 def status():
-    uptime = format_uptime(time.time() - _start_time)
-    active_users = compute_active_users()
+    instance = _requested_bot()
+    if instance is None:
+        return jsonify({"ok": False, "message": "unknown bot"}), 404
+    snapshot = dict(instance.status_hub.get()[1])
+    if len(BOTS) > 1:
+        snapshot["bots"] = sorted(BOTS)
+    return jsonify(snapshot)
+
+@flask_app.route("/status/stream")
+def status_stream():
+    """Server-sent events: the full snapshot first, then only the fields that changed."""
+    instance = _requested_bot()
+    if instance is None:
+        return jsonify({"ok": False, "message": "unknown bot"}), 404
+    hub = instance.status_hub
+
+    def events():
+        sent: Dict[str, Any] = {}
+        seq = 0
+        while True:
+            new_seq, snapshot = hub.get()
+            if new_seq != seq:
+                seq = new_seq
+                delta = {k: v for k, v in snapshot.items() if sent.get(k) != v}
+                sent = snapshot
+                yield f"id: {seq}\ndata: {json.dumps(delta, separators=(',', ':'))}\n\n"
+            time.sleep(hub.next_tick_in() or hub.interval)
+    return Response(events(), mimetype="text/event-stream", headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"})
+
+@flask_app.route("/codestats/<code>")
+def http_codestats(code):
+    if not _check_secret({"secret": request.args.get("secret")}):
+        return jsonify({"ok": False, "message": "unauthorized"}), 401
+    instance = _requested_bot()
+    if instance is None:
+        return jsonify({"ok": False, "message": "unknown bot"}), 404
+    code = code.upper()
+    info = instance.codes.peek(code)
+    if info is None:
+        return jsonify({"ok": False, "message": "code not found"}), 404
+    return jsonify({"ok": True, "code": code, **code_stats(info)})
+
+@flask_app.route("/memstats")
+def http_memstats():
+    if not _check_secret({"secret": request.args.get("secret")}):
+        return jsonify({"ok": False, "message": "unauthorized"}), 401
+    instance = _requested_bot()
+    if instance is None:
+        return jsonify({"ok": False, "message": "unknown bot"}), 404
+    if request.args.get("diff"):
+        top_n = int(request.args["diff"]) if request.args["diff"].isdigit() else MEMSTATS_TOP_N
+        report = run_as(instance, trace_diff, top_n)
+        if report is None:
+            return jsonify({"ok": False, "message": "tracing is off"}), 409
+        return Response(report, mimetype="text/plain")
+    return jsonify({"ok": True, **run_as(instance, memory_report)})
+
+@flask_app.route("/metrics")
+def metrics():
     return jsonify({
-        "uptime": uptime,
-        "version": BOT_VERSION,
-        "active_users": active_users,
-        "force_channel_count": len(FORCE_CHANNELS), # Changed to count
-        "bot_name": "Redeem Code Bot",
-        "codes_count": len(codes)
+        "startup_ms": startup_phases,
+        "restart_gap_ms": round(_last_restart_gap * 1000, 1) if _last_restart_gap is not None else None,
+        "code_cache": codes.metrics(),
+        "dispatch": dispatch_limiter.metrics(),
+        "bots": {name: instance.metrics() for name, instance in BOTS.items()},
     })
 
 def _check_secret(req_json):
@@ -969,8 +2797,13 @@ def http_restart():
     data = request.get_json(silent=True) or {}
     if not _check_secret(data):
         return jsonify({"ok": False, "message": "unauthorized"}), 401
-    logger.info("Received /restart via HTTP - secret validated (no restart performed, placeholder).")
-    return jsonify({"ok": True, "message": "restart endpoint received (placeholder)."}), 200
+    if _loop is None:
+        return jsonify({"ok": False, "message": "bot is not running yet"}), 503
+    if _restart_in_progress:
+        return jsonify({"ok": False, "message": "restart already in progress"}), 409
+    logger.info("Received /restart via HTTP - secret validated, starting hand-off.")
+    asyncio.run_coroutine_threadsafe(perform_restart(), _loop)
+    return jsonify({"ok": True, "message": "restart started: a new process takes over once it is ready."}), 200
 
 # The /open Flask route is no longer strictly necessary if the button is a direct link, 
 # but we leave it as a placeholder just in case:
@@ -984,22 +2817,478 @@ def http_open():
 
 def run_flask():
     port = int(os.getenv("PORT", "5000"))
-    flask_app.run(host="0.0.0.0", port=port, threaded=True)
+    # After a hand-off the old process may still hold the port for a moment: retry binding
+    for _ in range(100):
+        try:
+            flask_app.run(host="0.0.0.0", port=port, threaded=True)
+            return
+        except (OSError, SystemExit):
+            time.sleep(0.1)
+    logger.error(f"Could not bind status server to port {port}")
+
+async def skip_processed_update(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Runs before all handlers: drop updates that were already fully handled before a restart."""
+    if is_update_processed(update.update_id):
+        logger.info(f"Skipping already processed update {update.update_id}")
+        raise ApplicationHandlerStop
+    if update.update_id in _rewards_in_flight:
+        logger.info(f"Skipping update {update.update_id}: its reward is being delivered by recovery")
+        raise ApplicationHandlerStop
+    if update.effective_user:
+        unblock_user(update.effective_user.id)
+
+async def mark_update_processed(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Runs after all handlers: remember the update as handled."""
+    _rewards_in_flight.discard(update.update_id)
+    if get_pending_reward(update.update_id) is not None:
+        # a handler failed after journalling a redemption: keep the owed reward for a retry
+        logger.warning(f"Reward for update {update.update_id} not delivered, will retry")
+        return
+    complete_update(update.update_id)
+
+async def recover_pending_rewards(application) -> None:
+    """Deliver rewards whose redemption was journalled but whose update will not come back."""
+    context = CallbackContext(application)
+    for pending in list_pending_rewards():
+        update_id = pending["update_id"]
+        if update_id in _rewards_in_flight:
+            continue
+        if pending["code"] not in codes:
+            complete_update(update_id)
+            continue
+        logger.info(f"Recovering reward for update {update_id} (code {pending['code']})")
+        _rewards_in_flight.add(update_id)
+        try:
+            await finish_redemption(context, update_id, pending["chat_id"], pending["code"])
+        except Exception as e:
+            logger.error(f"Failed to recover reward for update {update_id}: {e}")
+        finally:
+            _rewards_in_flight.discard(update_id)
 
-def main():
-    app = ApplicationBuilder().token(BOT_TOKEN).build()
+async def reward_retrier(application) -> None:
+    """Periodically retry rewards whose delivery failed after the redemption was journalled."""
+    while True:
+        await asyncio.sleep(REWARD_RETRY_INTERVAL)
+        try:
+            await recover_pending_rewards(application)
+        except Exception as e:
+            logger.error(f"Reward retry failed: {e}")
+
+def mark_startup(phase: str) -> None:
+    startup_phases[phase] = round((time.time() - _start_time) * 1000, 1)
+
+def restore_state() -> None:
+    """Load the current bot's lists and code store from DATA_DIR (disk only, no Telegram calls)."""
+    load_user_lists()
+    init_store()
+    logger.info(f"[{current_bot().name}] Loaded {len(codes)} codes from store")
+
+async def post_init(application) -> None:
+    recovery_start = time.perf_counter()
+    await recover_pending_rewards(application)
+    global _recovery_seconds
+    elapsed = time.perf_counter() - recovery_start
+    _recovery_seconds += elapsed
+    logger.info(f"[{current_bot().name}] Restart recovery finished in {elapsed * 1000:.1f} ms")
+    start_background_task(reward_retrier(application))
+    start_background_task(channel_monitor(application.bot))
+    await resume_broadcast(application)
+
+
+# ---------- Overload protection (adaptive dispatch limit) ----------
+# Updates are dispatched concurrently, but only dispatch_limiter.limit handlers run at
+# once. When Telegram slows down the limit shrinks; cheap-to-drop updates are shed
+# first and /redeem is always admitted.
+LOW_PRIORITY_COMMANDS = {"listcodes", "ping"}
+LOW_PRIORITY_CALLBACKS = ("request_screenshot:", "listcodes:")
+HIGH_PRIORITY_COMMANDS = {"redeem"}
+
+dispatch_limiter = AdaptiveLimiter(
+    MAX_CONCURRENT_UPDATES // 4, MIN_CONCURRENT_UPDATES, MAX_CONCURRENT_UPDATES, HANDLER_TARGET_LATENCY
+)
+
+def update_priority(update: object) -> str:
+    if not isinstance(update, Update):
+        return "normal"
+    if update.callback_query and (update.callback_query.data or "").startswith(LOW_PRIORITY_CALLBACKS):
+        return "low"
+    text = update.message.text if update.message and update.message.text else ""
+    if text.startswith("/"):
+        command = text[1:].split(maxsplit=1)[0].split("@")[0].lower() if len(text) > 1 else ""
+        if command in HIGH_PRIORITY_COMMANDS:
+            return "high"
+        if command in LOW_PRIORITY_COMMANDS:
+            return "low"
+    return "normal"
+
+class GuardedDispatch:
+    """Mixed into telegram's Application by load_telegram() as GuardedApplication."""
+
+    bot_instance: Optional[BotInstance] = None
+
+    async def process_update(self, update: object) -> None:
+        if self.bot_instance is not None:
+            _current_bot.set(self.bot_instance)  # each update runs in its own task
+            self.bot_instance.updates_total += 1
+        priority = update_priority(update)
+        if not await dispatch_limiter.acquire(priority):
+            logger.debug(f"Shedding {priority}-priority update under load (limit {int(dispatch_limiter.limit)})")
+            if isinstance(update, Update) and update.callback_query:
+                # otherwise the button keeps its loading spinner until Telegram gives up
+                try:
+                    await update.callback_query.answer("⏳ The bot is busy, please try again in a moment.")
+                except Exception as e:
+                    logger.debug(f"Failed to answer shed callback query: {e}")
+            return
+        started = time.monotonic()
+        try:
+            await super().process_update(update)
+        finally:
+            dispatch_limiter.release(time.monotonic() - started)
+
+# ---------- Bot API transport (connection pools per traffic class) ----------
+# Each traffic class gets its own HTTP client and connection pool, so a broadcast cannot
+# take the connections a reward send needs:
+#   updates      long polling (getUpdates)
+#   interactive  everything handlers send: replies, rewards, proofs, admin commands
+#   bulk         broadcasts and background notifications (BotInstance.bulk_bot)
+# BOT_API_POOLS overrides any setting per class, e.g. '{"bulk": {"pool_size": 4}}'.
+TRANSPORT_SETTINGS = ("pool_size", "keepalive", "connect_timeout", "read_timeout", "write_timeout", "pool_timeout")
+TRANSPORT_DEFAULTS: Dict[str, Dict[str, float]] = {
+    "updates": {"pool_size": 1, "keepalive": 60, "connect_timeout": 5, "read_timeout": 5, "write_timeout": 5, "pool_timeout": 1},
+    "interactive": {"pool_size": 32, "keepalive": 60, "connect_timeout": 5, "read_timeout": 5, "write_timeout": 20, "pool_timeout": 10},
+    "bulk": {"pool_size": BROADCAST_WORKERS + 2, "keepalive": 30, "connect_timeout": 5, "read_timeout": 10, "write_timeout": 20, "pool_timeout": 60},
+}
+POOL_WAIT_SAMPLES = 1024  # recent pool waits kept per class for the percentiles in /metrics
+
+def load_transport_config() -> Dict[str, Dict[str, float]]:
+    config = {traffic: dict(settings) for traffic, settings in TRANSPORT_DEFAULTS.items()}
+    if not BOT_API_POOLS:
+        return config
+    overrides = json.loads(BOT_API_POOLS)
+    if not isinstance(overrides, dict):
+        raise ValueError("BOT_API_POOLS must be a JSON object")
+    for traffic, settings in overrides.items():
+        if traffic not in config:
+            raise ValueError(f"BOT_API_POOLS: unknown traffic class {traffic!r} (use {', '.join(config)})")
+        unknown = set(settings) - set(TRANSPORT_SETTINGS)
+        if unknown:
+            raise ValueError(f"BOT_API_POOLS[{traffic!r}]: unknown settings {', '.join(sorted(unknown))}")
+        config[traffic].update({key: float(value) for key, value in settings.items()})
+        if config[traffic]["pool_size"] < 1:
+            raise ValueError(f"BOT_API_POOLS[{traffic!r}]: pool_size must be at least 1")
+    return config
+
+TRANSPORT = load_transport_config()
+
+class PoolMetering:
+    """
+    Mixed into telegram's HTTPXRequest by load_telegram() as MeteredRequest.
+    A semaphore sized like the pool admits requests, so the time spent waiting for a
+    free connection is measured here (httpx does not report it).
+    """
+
+    def __init__(self, traffic: str, pool_size: float, keepalive: float, connect_timeout: float,
+                 read_timeout: float, write_timeout: float, pool_timeout: float, http_version: str = "1.1"):
+        self.traffic = traffic
+        self.pool_size = int(pool_size)
+        self.keepalive = keepalive
+        self.pool_timeout = pool_timeout
+        self._slots = asyncio.Semaphore(self.pool_size)
+        self._waits: deque = deque(maxlen=POOL_WAIT_SAMPLES)
+        self.requests = self.waited = self.pool_timeouts = self.in_flight = 0
+        super().__init__(
+            connection_pool_size=self.pool_size,
+            connect_timeout=connect_timeout,
+            read_timeout=read_timeout,
+            write_timeout=write_timeout,
+            pool_timeout=pool_timeout,
+            http_version=http_version,
+        )
+
+    def _build_client(self):
+        import httpx
+
+        limits = httpx.Limits(
+            max_connections=self.pool_size,
+            max_keepalive_connections=self.pool_size,
+            keepalive_expiry=self.keepalive,
+        )
+        return httpx.AsyncClient(**{**self._client_kwargs, "limits": limits})
+
+    async def do_request(self, *args, **kwargs):
+        queued = time.monotonic()
+        try:
+            # not wait_for: on 3.11 it can swallow a cancellation that races the acquire,
+            # leaving a stopped broadcast worker sending
+            async with asyncio.timeout(self.pool_timeout):
+                await self._slots.acquire()
+        except TimeoutError:
+            self.pool_timeouts += 1
+            raise TimedOut(f"Pool timeout: all {self.pool_size} {self.traffic} connections are busy") from None
+        waited = time.monotonic() - queued
+        self._waits.append(waited)
+        self.requests += 1
+        self.waited += waited > 0.001
+        self.in_flight += 1
+        try:
+            return await super().do_request(*args, **kwargs)
+        finally:
+            self.in_flight -= 1
+            self._slots.release()
+
+    def metrics(self) -> Dict[str, Any]:
+        waits = sorted(self._waits)
+
+        def pct(p: float) -> float:
+            return round(waits[min(len(waits) - 1, int(p * len(waits)))] * 1000, 2) if waits else 0.0
+
+        return {
+            "pool_size": self.pool_size,
+            "http_version": self.http_version,
+            "in_flight": self.in_flight,
+            "requests": self.requests,
+            "waited": self.waited,
+            "pool_timeouts": self.pool_timeouts,
+            "pool_wait_ms": {"p50": pct(0.5), "p99": pct(0.99), "max": round(waits[-1] * 1000, 2) if waits else 0.0},
+        }
+
+def make_request(traffic: str) -> "MeteredRequest":
+    http_version = "2" if BOT_API_HTTP2 and traffic != "updates" else "1.1"
+    try:
+        return MeteredRequest(traffic, http_version=http_version, **TRANSPORT[traffic])
+    except RuntimeError as e:  # HTTP/2 asked for but h2 is not installed
+        logger.warning(f"{traffic} pool: {e} Falling back to HTTP/1.1.")
+        return MeteredRequest(traffic, **TRANSPORT[traffic])
+
+def bulk_bot(default):
+    """The Bot for the current bot's background traffic (falls back to `default` before build)."""
+    return current_bot().bulk_bot or default
+
+# ---------- Zero-downtime restart (process hand-off) ----------
+# /restart spawns a replacement process. It imports everything and connects to Telegram
+# while this process keeps serving, then signals "ready". This process then stops polling,
+# finishes in-flight handlers (the only writers of the store), writes unsent notifications
+# and proofs to a hand-off file and signals "released" without waiting for any sends.
+# The replacement loads state, picks up the outbound items and starts polling; the time
+# between this process stopping polling and the replacement starting is the gap. Owed
+# rewards and an interrupted broadcast are resumed after polling, outside the gap.
+# The first process to restart replaces itself with a tiny supervisor that keeps the
+# original PID alive for the host's process manager and forwards signals to the bot.
+# Later restarts do not add supervisors: the outgoing process names its successor in
+# HANDOFF_SUCCESSOR_FILE and exits, and the supervisor (a child subreaper on Linux, so
+# it inherits the orphaned successor) follows it.
+HANDOFF_READY_FILE = "handoff_ready.json"
+HANDOFF_RELEASED_FILE = "handoff_released.json"
+HANDOFF_OUTBOUND_FILE = "handoff_outbound.json"
+HANDOFF_SUCCESSOR_FILE = "handoff_successor.json"
+RESTART_READY_TIMEOUT = 120  # seconds the replacement may take to become ready
+_SUPERVISOR_SRC = """
+import ctypes, json, os, signal, sys, time
+pid, successor_file = int(sys.argv[1]), sys.argv[2]
+try:
+    ctypes.CDLL(None).prctl(36, 1, 0, 0, 0)  # PR_SET_CHILD_SUBREAPER
+except Exception:
+    pass
+def forward(sig, frame):
+    try:
+        os.kill(pid, sig)
+    except ProcessLookupError:
+        pass
+for sig in (signal.SIGTERM, signal.SIGINT):
+    signal.signal(sig, forward)
+def alive(p):
+    try:
+        os.kill(p, 0)
+        return True
+    except OSError:
+        return False
+while True:
+    try:
+        _, status = os.waitpid(pid, 0)
+        code = os.waitstatus_to_exitcode(status)
+    except ChildProcessError:  # not re-parented to us (no subreaper support): poll instead
+        while alive(pid):
+            time.sleep(0.5)
+        code = 0
+    try:
+        with open(successor_file) as f:
+            successor = int(json.load(f)["pid"])
+        os.remove(successor_file)
+    except (OSError, ValueError, KeyError):
+        successor = None
+    if successor is None or successor == pid or not alive(successor):
+        sys.exit(code)
+    pid = successor
+"""
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_thread: Optional[Thread] = None  # runs every handler; resident code records belong to it
+_stop_event: Optional[asyncio.Event] = None
+_restart_in_progress = False
+_successor: Optional[subprocess.Popen] = None
+_last_restart_gap: Optional[float] = None
+
+def on_loop_thread() -> bool:
+    """Whether the caller runs on the event loop's thread (the main thread until serve() starts)."""
+    return current_thread() is (_loop_thread or main_thread())
+
+async def perform_restart() -> None:
+    """Start the replacement and, once it is ready, stop this process so it can take over."""
+    global _restart_in_progress, _successor
+    if _restart_in_progress:
+        return
+    _restart_in_progress = True
+    delete_json_state(HANDOFF_READY_FILE)
+    delete_json_state(HANDOFF_RELEASED_FILE)
+    # the process that exec's the supervisor keeps its PID, so the first one's is passed down
+    env = {**os.environ, "BOT_HANDOFF": "1", "BOT_SUPERVISOR_PID": os.getenv("BOT_SUPERVISOR_PID") or str(os.getpid())}
+    _successor = subprocess.Popen([sys.executable] + sys.argv, env=env)
+    logger.info(f"Restart: started replacement process {_successor.pid}, waiting until it is ready")
+
+    deadline = time.monotonic() + RESTART_READY_TIMEOUT
+    while load_json_state(HANDOFF_READY_FILE, None) is None:
+        if _successor.poll() is not None or time.monotonic() > deadline:
+            logger.error("Restart aborted: replacement process did not become ready")
+            if _successor.poll() is None:
+                _successor.kill()
+            _successor = None
+            _restart_in_progress = False
+            return
+        await asyncio.sleep(0.05)
+    _stop_event.set()
+
+async def stop_broadcast() -> None:
+    """Cancel a running broadcast; it is checkpointed and resumed on the next start."""
+    task = current_bot().broadcast_task
+    if task is not None and not task.done():
+        task.cancel()
+        await asyncio.gather(task, return_exceptions=True)
+
+async def drain_outbound() -> None:
+    """Normal shutdown: send queued proofs and notifications before exiting."""
+    for instance in BOTS.values():
+        await run_as_async(instance, stop_broadcast)
+        await run_as_async(instance, flush_all_proofs, instance.application.bot)
+    try:
+        await asyncio.wait_for(notification_queue.join(), timeout=10)
+    except asyncio.TimeoutError:
+        logger.warning(f"Shutdown: {notification_queue.qsize()} notifications left unsent")
+
+async def hand_off_outbound() -> None:
+    """Restart: write unsent notifications and proofs for the successor instead of sending them."""
+    notifications = []
+    while not notification_queue.empty():
+        notifications.append(notification_queue.get_nowait())
+        notification_queue.task_done()
+    proofs: Dict[str, Dict[str, List[Dict[str, Any]]]] = {}
+    for name, instance in BOTS.items():
+        await run_as_async(instance, stop_broadcast)
+        if instance.proof_batches:
+            proofs[name] = {str(creator_id): batch for creator_id, batch in instance.proof_batches.items()}
+        instance.proof_batches.clear()
+        for task in list(instance.proof_flush_tasks.values()):
+            task.cancel()
+    save_json_state(HANDOFF_OUTBOUND_FILE, {"notifications": notifications, "proofs": proofs})
+
+def take_over_outbound() -> None:
+    """In a replacement process: queue what the previous process left unsent."""
+    outbound = load_json_state(HANDOFF_OUTBOUND_FILE, None)
+    if not outbound:
+        return
+    delete_json_state(HANDOFF_OUTBOUND_FILE)
+    for item in outbound.get("notifications", []):
+        bot_name, chat_id, text = item if len(item) == 3 else [PRIMARY_BOT_NAME] + list(item)
+        queue_notification(chat_id, text, bot_name)
+    proofs_by_bot = outbound.get("proofs", {})
+    if proofs_by_bot and all(key.lstrip("-").isdigit() for key in proofs_by_bot):
+        proofs_by_bot = {PRIMARY_BOT_NAME: proofs_by_bot}  # written by a single-bot version
+    for bot_name, batches in proofs_by_bot.items():
+        instance = BOTS.get(bot_name)
+        if instance is None:
+            logger.warning(f"Hand-off: dropping proofs for unknown bot {bot_name}")
+            continue
+        for creator_id, proofs in batches.items():
+            run_as(instance, start_background_task, _send_proof_batch(instance.application.bot, int(creator_id), proofs))
+    logger.info(
+        f"Hand-off: took over {len(outbound.get('notifications', []))} notifications "
+        f"and proofs for {len(proofs_by_bot)} bots"
+    )
+
+async def wait_for_release() -> None:
+    """In a replacement process: block until the previous process has stopped polling and flushed."""
+    deadline = time.monotonic() + RESTART_READY_TIMEOUT
+    save_json_state(HANDOFF_READY_FILE, {"pid": os.getpid()})
+    while load_json_state(HANDOFF_RELEASED_FILE, None) is None:
+        if time.monotonic() > deadline:
+            logger.warning("Hand-off: previous process never released, taking over anyway")
+            return
+        await asyncio.sleep(0.01)
+
+def is_supervised() -> bool:
+    """True in a replacement process whose parent is the supervisor of an earlier restart."""
+    supervisor = os.getenv("BOT_SUPERVISOR_PID")
+    return bool(supervisor) and os.getppid() == int(supervisor)
+
+def hand_off_supervision() -> None:
+    """Restarting under a supervisor: have it follow the successor instead of adding another."""
+    save_json_state(HANDOFF_SUCCESSOR_FILE, {"pid": _successor.pid})
+    logging.shutdown()
+
+def exec_supervisor() -> None:
+    """Replace this process with a minimal waiter for the successor (keeps our PID alive)."""
+    successor_file = os.path.abspath(_state_path(HANDOFF_SUCCESSOR_FILE))
+    logging.shutdown()
+    # werkzeug marks its listening socket inheritable; close it so the successor can bind the port
+    os.closerange(3, os.sysconf("SC_OPEN_MAX") if hasattr(os, "sysconf") else 1024)
+    os.execv(sys.executable, [sys.executable, "-c", _SUPERVISOR_SRC, str(_successor.pid), successor_file])
+
+# every class a BotInstance is made of is defined by now
+BOTS.update(load_bots())
+
+def build_application(instance: Optional[BotInstance] = None):
+    instance = instance or BOTS[PRIMARY_BOT_NAME]
+    instance.transport = {traffic: make_request(traffic) for traffic in TRANSPORT}
+    app = (
+        ApplicationBuilder()
+        .token(instance.token)
+        .base_url(f"{BOT_API_URL}/bot")
+        .base_file_url(f"{BOT_API_URL}/file/bot")
+        .request(instance.transport["interactive"])
+        .get_updates_request(instance.transport["updates"])
+        .application_class(GuardedApplication)
+        .concurrent_updates(UPDATE_BACKLOG)
+        .build()
+    )
+    bulk = instance.transport["bulk"]
+    instance.bulk_bot = ExtBot(
+        instance.token,
+        base_url=f"{BOT_API_URL}/bot",
+        base_file_url=f"{BOT_API_URL}/file/bot",
+        request=bulk,
+        get_updates_request=bulk,  # never polls; avoids building an unused client
+    )
+    app.bot_instance = instance
+    instance.application = app
+
+    # Exactly-once processing: skip re-delivered updates first, record handled ones last
+    app.add_handler(TypeHandler(Update, skip_processed_update), group=-1)
+    app.add_handler(TypeHandler(Update, mark_update_processed), group=100)
 
     # Base commands
     app.add_handler(CommandHandler("start", start))
     app.add_handler(CommandHandler("redeem", redeem))
     app.add_handler(CommandHandler("ping", ping))
+    app.add_handler(CommandHandler("memstats", memstats))
 
     # Admin Code Management
     app.add_handler(CommandHandler("generate", generate))
     app.add_handler(CommandHandler("generate_multi", generate_multi))
     app.add_handler(CommandHandler("generate_random", generate_random))
     app.add_handler(CommandHandler("listcodes", listcodes))
+    app.add_handler(CommandHandler("codestats", codestats))
     app.add_handler(CommandHandler("deletecode", deletecode))
+    app.add_handler(CommandHandler("mycodes", mycodes))
+    app.add_handler(CommandHandler("deletecodes", deletecodes))
 
     # Admin Channel Management
     app.add_handler(CommandHandler("addchannel", add_channel))
@@ -1009,7 +3298,14 @@ def main():
     # NEW: Admin Ban Management
     app.add_handler(CommandHandler("ban", ban_user))
     app.add_handler(CommandHandler("unban", unban_user))
+    app.add_handler(CommandHandler("banbulk", ban_bulk))
+    app.add_handler(CommandHandler("unbanbulk", unban_bulk))
     app.add_handler(CommandHandler("listbanned", list_banned))
+    app.add_handler(CallbackQueryHandler(list_banned_page_callback, pattern=r"^listbanned:"))
+    app.add_handler(CallbackQueryHandler(codes_page_callback, pattern=r"^(listcodes|mycodes):"))
+
+    # Admin Broadcast
+    app.add_handler(CommandHandler("broadcast", broadcast))
 
     # Admin Button Callbacks
     app.add_handler(CallbackQueryHandler(show_commands_callback, pattern="show_commands"))
@@ -1019,11 +3315,105 @@ def main():
     app.add_handler(CallbackQueryHandler(request_screenshot_callback, pattern=r"^request_screenshot:"))
     app.add_handler(CallbackQueryHandler(cancel_screenshot_callback, pattern=r"^cancel_screenshot:"))
     app.add_handler(MessageHandler(filters.PHOTO | filters.Document.IMAGE, handle_incoming_image))
+    return app
+
+async def start_bot(instance: BotInstance) -> None:
+    """Recover one bot's owed rewards and start its background jobs (state is restored)."""
+    await post_init(instance.application)
+
+async def serve() -> None:
+    """Run every bot until SIGINT/SIGTERM or a restart hand-off (replaces run_polling)."""
+    global _loop, _loop_thread, _stop_event, _recovery_seconds, _last_restart_gap
+    _loop = asyncio.get_running_loop()
+    _loop_thread = current_thread()
+    _stop_event = asyncio.Event()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        _loop.add_signal_handler(sig, _stop_event.set)
+    apps = [instance.application for instance in BOTS.values()]
+    bulk_bots = [instance.bulk_bot for instance in BOTS.values()]
+
+    handoff = bool(os.getenv("BOT_HANDOFF"))
+    if handoff:
+        # the previous process writes state until it releases: restore only after that
+        await asyncio.gather(*(app.initialize() for app in apps), *(b.initialize() for b in bulk_bots))
+        mark_startup("connected")
+        await wait_for_release()
+        mark_startup("released")
+        for instance in BOTS.values():
+            run_as(instance, restore_state)
+    else:
+        # reading the stores from disk overlaps with connecting to Telegram (getMe)
+        restoring = asyncio.gather(*(asyncio.to_thread(run_as, instance, restore_state) for instance in BOTS.values()))
+        await asyncio.gather(*(app.initialize() for app in apps), *(b.initialize() for b in bulk_bots))
+        mark_startup("connected")
+        await restoring
+    mark_startup("state_restored")
+
+    start_background_task(notification_worker())
+    if handoff:
+        take_over_outbound()
+    for instance in BOTS.values():
+        # the update fetcher started here inherits the bot, and so does every update task
+        await run_as_async(instance, instance.application.start)
+        await instance.application.updater.start_polling()
+    mark_startup("polling")
+    if handoff:
+        released = load_json_state(HANDOFF_RELEASED_FILE, {}) or {}
+        if released.get("released_at"):
+            _last_restart_gap = time.time() - released["released_at"]
+            logger.info(f"Hand-off complete: no updates were processed for {_last_restart_gap * 1000:.0f} ms")
+        delete_json_state(HANDOFF_READY_FILE)
+        delete_json_state(HANDOFF_RELEASED_FILE)
+        Thread(target=run_flask, daemon=True).start()
+
+    # owed rewards are sent while polling: a re-delivered update for one of them is
+    # skipped while recovery holds it in _rewards_in_flight (and vice versa)
+    restore_start = time.perf_counter()
+    for instance in BOTS.values():
+        # tasks started here (retrier, channel monitor, broadcast) stay bound to this bot
+        await run_as_async(instance, start_bot, instance)
+    _recovery_seconds = time.perf_counter() - restore_start
+    mark_startup("recovered")
+    logger.info(f"Running {len(apps)} bot(s): {', '.join(BOTS)}")
+    logger.info("Startup: " + ", ".join(f"{phase} {ms:.0f} ms" for phase, ms in startup_phases.items()))
+
+    await _stop_event.wait()
+
+    logger.info("Stopping: finishing in-flight updates...")
+    await asyncio.gather(*(app.updater.stop() for app in apps))
+    stopped_polling_at = time.time()
+    await asyncio.gather(*(app.stop() for app in apps))
+    if _successor is not None:
+        await hand_off_outbound()
+        save_json_state(HANDOFF_RELEASED_FILE, {"released_at": stopped_polling_at, "pid": os.getpid()})
+        logger.info(f"Hand-off: released to process {_successor.pid} {(time.time() - stopped_polling_at) * 1000:.0f} ms after polling stopped")
+    else:
+        await drain_outbound()
+    for instance in BOTS.values():
+        instance.codes.close_readers()
+        instance.store.close()
+    await asyncio.gather(*(app.shutdown() for app in apps), *(b.shutdown() for b in bulk_bots))
 
-    Thread(target=run_flask, daemon=True).start()
-
+def main():
+    mark_startup("imports")
+    if not os.getenv("BOT_HANDOFF"):
+        # health checks are answered from here on, while Telegram is imported and connected
+        Thread(target=run_flask, daemon=True).start()
+        mark_startup("status_server")
+    load_telegram()
+    mark_startup("telegram_imported")
+    for instance in BOTS.values():
+        build_application(instance)
+    mark_startup("applications_built")
     logger.info("Bot is starting...")
-    app.run_polling()
+    asyncio.run(serve())
+    if _successor is not None:
+        if is_supervised():
+            hand_off_supervision()
+        else:
+            exec_supervisor()
 
 if __name__ == "__main__":
     main()
+else:
+    load_telegram()
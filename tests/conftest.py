@@ -0,0 +1,107 @@
+import os
+import sys
+
+# bot.py reads its configuration at import time
+os.environ.setdefault("BOT_TOKEN", "123456:TEST")
+os.environ.setdefault("ADMIN_IDS", "1")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import pytest
+
+import bot
+
+
+class FakeMessage:
+    def __init__(self, message_id=1, chat_id=1):
+        self.message_id = message_id
+        self.chat_id = chat_id
+        self.replies = []
+        self.documents = []
+
+    async def reply_text(self, text, **kwargs):
+        self.replies.append(text)
+        return FakeMessage()
+
+    async def reply_document(self, document, **kwargs):
+        self.documents.append(document)
+        return FakeMessage()
+
+
+class FakeBot:
+    """Records Bot API calls; set `fail_with` to make send_message raise."""
+
+    def __init__(self):
+        self.sent = []
+        self.fail_with = None
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.fail_with is not None:
+            raise self.fail_with
+        self.sent.append((chat_id, text))
+        return FakeMessage(message_id=len(self.sent), chat_id=chat_id)
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        if self.fail_with is not None:
+            raise self.fail_with
+        self.sent.append((chat_id, f"photo:{photo}"))
+        return FakeMessage(message_id=len(self.sent), chat_id=chat_id)
+
+
+class FakeUser:
+    def __init__(self, user_id):
+        self.id = user_id
+        self.full_name = f"User {user_id}"
+
+
+class FakeChat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+
+class FakeUpdate:
+    def __init__(self, update_id, user_id):
+        self.update_id = update_id
+        self.effective_user = FakeUser(user_id)
+        self.effective_chat = FakeChat(user_id)
+        self.message = FakeMessage(chat_id=user_id)
+
+
+class FakeContext:
+    def __init__(self, bot_, args=()):
+        self.bot = bot_
+        self.args = list(args)
+
+
+class FakeApplication:
+    def __init__(self, bot_):
+        self.bot = bot_
+
+
+@pytest.fixture
+def store(tmp_path, monkeypatch):
+    """A fresh on-disk code store in a temporary DATA_DIR."""
+    monkeypatch.setattr(bot, "DATA_DIR", str(tmp_path))
+    monkeypatch.setattr(bot.current_bot(), "force_channels", set())
+    reset_store()
+    bot.init_store()
+    yield tmp_path
+    bot._store.close()
+    reset_store()
+
+
+def reset_store():
+    bot.codes.reset()
+    bot._processed_ids.clear()
+    bot._processed_order.clear()
+    bot._rewards_in_flight.clear()
+    bot.BANNED_USERS.clear()
+    bot.BLOCKED_USERS.clear()
+    bot.current_bot().publish(banned_users=frozenset())
+    bot.current_bot().last_update_id = 0
+
+
+def restart_store():
+    """Simulate a process restart: drop in-memory state and load it back from disk."""
+    bot._store.close()
+    reset_store()
+    bot.init_store()
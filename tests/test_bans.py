@@ -0,0 +1,123 @@
+import asyncio
+
+import pytest
+
+import bot
+from conftest import FakeBot, FakeContext, FakeMessage, FakeUpdate, restart_store
+
+ADMIN = 1
+
+
+class Document:
+    def __init__(self, content, file_size=None):
+        self.file_id = "DOC"
+        self.content = content
+        self.file_size = len(content) if file_size is None else file_size
+
+
+class FileBot(FakeBot):
+    def __init__(self, document):
+        super().__init__()
+        self.document = document
+
+    async def get_file(self, file_id):
+        document = self.document
+
+        class File:
+            async def download_as_bytearray(self):
+                return bytearray(document.content)
+
+        return File()
+
+
+class ReplyWithFile(FakeMessage):
+    def __init__(self, document):
+        super().__init__()
+        self.reply_to_message = FakeMessage(message_id=5)
+        self.reply_to_message.document = document
+
+
+def bulk(handler, document=None, args=()):
+    update = FakeUpdate(1, ADMIN)
+    if document is not None:
+        update.message = ReplyWithFile(document)
+    else:
+        update.message.reply_to_message = None
+    asyncio.run(handler(update, FakeContext(FileBot(document), args)))
+    return update.message.replies
+
+
+@pytest.fixture
+def bans(store):
+    yield store
+    while not bot.notification_queue.empty():
+        bot.notification_queue.get_nowait()
+        bot.notification_queue.task_done()
+
+
+def queued_notifications():
+    items = []
+    while not bot.notification_queue.empty():
+        items.append(bot.notification_queue.get_nowait())
+        bot.notification_queue.task_done()
+    return items
+
+
+def test_parse_user_ids_rejects_non_ids():
+    assert bot.parse_user_ids(["12", "0", "-5", "abc", "7x", "12", "99"]) == ({12, 99}, 4)
+
+
+def test_bulk_ban_from_file_skips_admins_and_persists(bans):
+    bot.BANNED_USERS.add(200)
+    [reply] = bulk(bot.ban_bulk, Document(b"100, 200\n300 junk 1\n"), args=["400"])
+    assert "Newly banned: 3" in reply
+    assert "Already banned / admins skipped: 2" in reply
+    assert "Rejected (not a user ID): 1" in reply
+    assert set(bot.BANNED_USERS) == {100, 200, 300, 400}
+    assert sorted(chat_id for _, chat_id, _ in queued_notifications()) == [100, 300, 400]
+
+    restart_store()
+    bot.load_user_lists()
+    assert set(bot.BANNED_USERS) == {100, 200, 300, 400}
+
+
+def test_bulk_ban_refuses_large_files(bans):
+    [reply] = bulk(bot.ban_bulk, Document(b"100", file_size=bot.BAN_FILE_MAX_BYTES + 1))
+    assert "too large" in reply
+    assert not bot.BANNED_USERS
+
+
+def test_bulk_unban(bans):
+    bot.BANNED_USERS.update({100, 200, 300})
+    [reply] = bulk(bot.unban_bulk, args=["100", "300", "500"])
+    assert "Unbanned: 2" in reply and "Not banned: 1" in reply
+    assert set(bot.BANNED_USERS) == {200}
+    assert sorted(chat_id for _, chat_id, _ in queued_notifications()) == [100, 300]
+
+
+class PagedQuery:
+    def __init__(self, data):
+        self.data = data
+        self.from_user = FakeUpdate(1, ADMIN).effective_user
+        self.edits = []
+
+    async def answer(self):
+        pass
+
+    async def edit_message_text(self, text, reply_markup=None, **kwargs):
+        self.edits.append((text, reply_markup))
+
+
+def test_ban_list_is_paged(bans):
+    bot.BANNED_USERS.update(range(1000, 1120))
+    update = FakeUpdate(1, ADMIN)
+    asyncio.run(bot.list_banned(update, FakeContext(FakeBot())))
+    [reply] = update.message.replies
+    assert "120 total, page 1/3" in reply
+    assert "1049" in reply and "1050" not in reply
+
+    update.callback_query = PagedQuery("listbanned:3")
+    asyncio.run(bot.list_banned_page_callback(update, FakeContext(FakeBot())))
+    text, keyboard = update.callback_query.edits[0]
+    assert "page 3/3" in text and "1119" in text and "1099" not in text
+    assert [b.callback_data for b in keyboard.inline_keyboard[0]] == ["listbanned:2"]
@@ -0,0 +1,141 @@
+import asyncio
+import threading
+
+import pytest
+from telegram.error import Forbidden
+
+import bot
+from conftest import FakeApplication, FakeContext, FakeMessage, FakeUpdate
+
+
+class BroadcastBot:
+    """Records copies; `gate` (an asyncio.Event) holds every send until it is set."""
+
+    def __init__(self, blocked=(), gate=None):
+        self.copied = []
+        self.edits = []
+        self.blocked = set(blocked)
+        self.gate = gate
+
+    async def copy_message(self, chat_id, from_chat_id, message_id, **kwargs):
+        if self.gate is not None:
+            await self.gate.wait()
+        await asyncio.sleep(0)
+        if chat_id in self.blocked:
+            raise Forbidden("bot was blocked by the user")
+        self.copied.append(chat_id)
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append(text)
+
+
+@pytest.fixture
+def fast_broadcast(store, monkeypatch):
+    monkeypatch.setattr(bot, "broadcast_limiter", bot.RateLimiter(100_000, burst=1000))
+    monkeypatch.setattr(bot, "BROADCAST_PROGRESS_INTERVAL", 0.01)
+    monkeypatch.setattr(bot.current_bot(), "broadcast_task", None)
+    return store
+
+
+def add_redeemed(code, users):
+    bot.codes[code] = {"text": "x", "used_by": list(users), "limit": 10**6, "media": None, "created_by": 1}
+
+
+def new_job(code=None):
+    return {
+        "code": code, "from_chat_id": 1, "message_id": 1, "status_chat_id": 1, "status_message_id": 1,
+        "started_at": 0, "cursor": 0, "sent": 0, "blocked": 0, "failed": 0, "skipped": 0,
+    }
+
+
+def test_broadcast_reaches_every_redeemer_once(fast_broadcast):
+    add_redeemed("A", range(1, 51))
+    add_redeemed("B", range(40, 81))  # 40-50 redeemed both
+    bot.BANNED_USERS.add(7)
+    sender = BroadcastBot(blocked={9})
+    job = new_job()
+
+    asyncio.run(bot.run_broadcast(sender, job))
+    assert sorted(sender.copied) == [u for u in range(1, 81) if u not in (7, 9)]
+    assert (job["sent"], job["blocked"], job["skipped"], job["cursor"]) == (78, 1, 1, 80)
+    assert 9 in bot.BLOCKED_USERS
+    assert "Broadcast finished" in sender.edits[-1]
+    assert bot.load_json_state(bot.BROADCAST_CHECKPOINT_FILE, None) is None
+    assert bot.load_json_state(bot.BROADCAST_RECIPIENTS_FILE, None) is None
+
+
+def test_interrupted_broadcast_resumes_from_checkpoint(fast_broadcast):
+    add_redeemed("A", range(1, 201))
+
+    async def interrupted():
+        gate = asyncio.Event()
+        sender = BroadcastBot(gate=gate)
+        bot.start_broadcast_task(sender, new_job("A"))
+        gate.set()
+        while len(sender.copied) < 60:
+            await asyncio.sleep(0)
+        await bot.stop_broadcast()
+        return sender.copied
+
+    first = asyncio.run(interrupted())
+    checkpoint = bot.load_json_state(bot.BROADCAST_CHECKPOINT_FILE, None)
+    assert 60 <= checkpoint["cursor"] + len(checkpoint["done_ahead"]) <= len(first)
+    # redemptions after the start do not shift the frozen positions
+    add_redeemed("A", [999] + list(range(1, 201)))
+
+    async def resumed():
+        sender = BroadcastBot()
+        await bot.resume_broadcast(FakeApplication(sender))
+        await bot.current_bot().broadcast_task
+        return sender.copied
+
+    second = asyncio.run(resumed())
+    assert 999 not in second
+    assert set(first) | set(second) == set(range(1, 201))
+    # only sends that were in flight when it stopped may go out twice
+    assert len(set(first) & set(second)) <= bot.BROADCAST_WORKERS
+    assert bot.load_json_state(bot.BROADCAST_CHECKPOINT_FILE, None) is None
+
+
+class ReplyMessage(FakeMessage):
+    def __init__(self):
+        super().__init__(chat_id=1)
+        self.reply_to_message = FakeMessage(message_id=5)
+
+    async def reply_text(self, text, **kwargs):
+        await asyncio.sleep(0.01)  # the Bot API round trip other updates run during
+        return await super().reply_text(text, **kwargs)
+
+
+def test_concurrent_broadcast_commands_start_one_job(fast_broadcast):
+    add_redeemed("A", range(1, 11))
+    sender = BroadcastBot()
+    updates = [FakeUpdate(i, 1) for i in (1, 2)]
+    for update in updates:
+        update.message = ReplyMessage()
+
+    async def scenario():
+        context = FakeContext(sender)
+        await asyncio.gather(*(bot.broadcast(update, context) for update in updates))
+        await bot.current_bot().broadcast_task
+
+    asyncio.run(scenario())
+    replies = [text for update in updates for text in update.message.replies]
+    assert replies.count("⚠️ A broadcast is already running.") == 1
+    assert sorted(sender.copied) == list(range(1, 11))
+
+
+def test_recipient_snapshot_is_built_off_the_event_loop(fast_broadcast, monkeypatch):
+    add_redeemed("A", range(1, 6))
+    threads = []
+    original = bot.iter_redeemers
+
+    def recording(code=None):
+        threads.append(threading.current_thread())
+        return original(code)
+
+    monkeypatch.setattr(bot, "iter_redeemers", recording)
+    sender = BroadcastBot()
+    asyncio.run(bot.run_broadcast(sender, new_job()))
+    assert threads and threads[0] is not threading.main_thread()
+    assert sorted(sender.copied) == [1, 2, 3, 4, 5]
@@ -0,0 +1,142 @@
+import asyncio
+
+import pytest
+from telegram.error import BadRequest, Forbidden, NetworkError
+
+import bot
+from conftest import FakeContext, FakeUpdate
+
+
+class Member:
+    def __init__(self, status):
+        self.status = status
+
+
+class Chat:
+    def __init__(self, chat_id):
+        self.id = chat_id
+
+
+class ChannelBot:
+    """Channels map to (chat_id, bot status); `down` raises NetworkError for every call."""
+
+    id = 777
+
+    def __init__(self, channels):
+        self.channels = channels
+        self.members = {}  # (chat_id, user_id) -> status
+        self.calls = []
+        self.down = False
+
+    async def get_chat(self, channel):
+        self.calls.append(("get_chat", channel))
+        if self.down:
+            raise NetworkError("connection reset")
+        if channel not in self.channels:
+            raise BadRequest("Chat not found")
+        return Chat(self.channels[channel][0])
+
+    async def get_chat_member(self, chat_id, user_id):
+        self.calls.append(("get_chat_member", chat_id, user_id))
+        if self.down:
+            raise NetworkError("connection reset")
+        if user_id == self.id:
+            status = next(status for cid, status in self.channels.values() if cid == chat_id)
+            return Member(status)
+        if self.members.get((chat_id, user_id)) == "forbidden":
+            raise Forbidden("bot is not a member of the channel chat")
+        return Member(self.members.get((chat_id, user_id), "left"))
+
+
+@pytest.fixture
+def channels(store, monkeypatch):
+    monkeypatch.setattr(bot.current_bot(), "force_channels", {"@good", "@lost"})
+    monkeypatch.setattr(bot.current_bot(), "channel_health", {})
+    yield
+    while not bot.notification_queue.empty():
+        bot.notification_queue.get_nowait()
+        bot.notification_queue.task_done()
+
+
+def alerts():
+    items = []
+    while not bot.notification_queue.empty():
+        items.append(bot.notification_queue.get_nowait()[2])
+        bot.notification_queue.task_done()
+    return items
+
+
+def test_monitor_caches_health_and_alerts_once_per_change(channels):
+    api = ChannelBot({"@good": (-100, "administrator"), "@lost": (-200, "member")})
+    asyncio.run(bot.refresh_channel_health(api))
+    assert bot.CHANNEL_HEALTH["@good"]["healthy"] and bot.CHANNEL_HEALTH["@good"]["chat_id"] == -100
+    assert not bot.CHANNEL_HEALTH["@lost"]["healthy"]
+    assert bot.CHANNEL_HEALTH["@lost"]["error"] == "bot is not an admin"
+    [alert] = alerts()
+    assert "@lost" in alert and "unhealthy" in alert
+
+    asyncio.run(bot.refresh_channel_health(api))
+    assert alerts() == []  # still unhealthy: no repeat
+
+    api.channels["@lost"] = (-200, "administrator")
+    asyncio.run(bot.refresh_channel_health(api))
+    [alert] = alerts()
+    assert "healthy again" in alert
+
+
+def test_network_errors_keep_the_last_known_state(channels):
+    api = ChannelBot({"@good": (-100, "administrator"), "@lost": (-200, "member")})
+    asyncio.run(bot.refresh_channel_health(api))
+    alerts()
+    api.down = True
+    asyncio.run(bot.refresh_channel_health(api))
+    assert bot.CHANNEL_HEALTH["@good"]["healthy"]
+    assert not bot.CHANNEL_HEALTH["@lost"]["healthy"]
+    assert alerts() == []
+
+
+def test_removed_channels_are_forgotten(channels):
+    api = ChannelBot({"@good": (-100, "administrator"), "@lost": (-200, "administrator")})
+    asyncio.run(bot.refresh_channel_health(api))
+    bot.FORCE_CHANNELS.discard("@lost")
+    asyncio.run(bot.refresh_channel_health(api))
+    assert set(bot.CHANNEL_HEALTH) == {"@good"}
+
+
+def test_force_join_skips_unhealthy_channels_without_calls(channels):
+    api = ChannelBot({"@good": (-100, "administrator"), "@lost": (-200, "member")})
+    asyncio.run(bot.refresh_channel_health(api))
+    api.members[(-100, 42)] = "member"
+    api.calls.clear()
+
+    update = FakeUpdate(1, 42)
+    assert asyncio.run(bot.check_force_join(update, FakeContext(api)))
+    # one membership check, against the cached chat ID; nothing for the unhealthy channel
+    assert api.calls == [("get_chat_member", -100, 42)]
+
+
+def test_losing_admin_between_checks_marks_channel_unhealthy(channels):
+    api = ChannelBot({"@good": (-100, "administrator"), "@lost": (-200, "administrator")})
+    asyncio.run(bot.refresh_channel_health(api))
+    api.members[(-100, 42)] = "member"
+    api.members[(-200, 42)] = "forbidden"
+
+    update = FakeUpdate(1, 42)
+    # the user is not blocked by the channel the bot can no longer see
+    assert asyncio.run(bot.check_force_join(update, FakeContext(api)))
+    assert not bot.CHANNEL_HEALTH["@lost"]["healthy"]
+    [alert] = alerts()
+    assert "@lost" in alert
+
+    api.calls.clear()
+    assert asyncio.run(bot.check_force_join(update, FakeContext(api)))
+    assert api.calls == [("get_chat_member", -100, 42)]
+
+
+def test_missing_membership_is_reported(channels):
+    api = ChannelBot({"@good": (-100, "administrator"), "@lost": (-200, "administrator")})
+    asyncio.run(bot.refresh_channel_health(api))
+    api.members[(-100, 42)] = "member"
+    update = FakeUpdate(1, 42)
+    assert not asyncio.run(bot.check_force_join(update, FakeContext(api)))
+    assert "must join" in update.message.replies[0]
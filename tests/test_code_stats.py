@@ -0,0 +1,83 @@
+import asyncio
+
+import bot
+from conftest import FakeBot, FakeContext, FakeUpdate
+
+HOUR = 3600
+NOW = 1_000_000 * HOUR + 30 * 60  # half past some hour
+
+
+def multi_code(limit=100):
+    return {"text": "reward", "used_by": [], "limit": limit, "media": None, "created_by": 1}
+
+
+def test_rate_peak_and_eta():
+    info = multi_code(limit=100)
+    # 10 redemptions two hours ago, then 20 in the last hour: 5 within one minute, 15 spread out
+    for i in range(10):
+        info["used_by"].append(i)
+        bot.record_redemption(info, NOW - 2 * HOUR)
+    for i in range(5):
+        info["used_by"].append(100 + i)
+        bot.record_redemption(info, NOW - 50 * 60)
+    for i in range(15):
+        info["used_by"].append(200 + i)
+        bot.record_redemption(info, NOW - 600 + 30 * i)
+
+    stats = bot.code_stats(info, NOW)
+    assert stats["used"] == 30
+    assert stats["last_hour"] == 20
+    assert stats["last_24h"] == 30
+    assert stats["rate_per_hour"] == 20
+    assert stats["peak_per_minute"] == 5
+    assert stats["peak_per_hour"] == 15
+    assert stats["eta_seconds"] == round(70 / 20 * HOUR)
+    assert stats["hourly_24h"][-3:] == [10, 5, 15]
+    assert len(stats["sparkline"]) == 24
+    assert stats["sparkline"][-1] == max(stats["sparkline"])
+
+
+def test_series_size_is_bounded():
+    info = multi_code(limit=10**6)
+    bot.record_redemption(info, NOW)
+    size = len(bot.json.dumps(info["stats"]))
+    for i in range(5000):
+        bot.record_redemption(info, NOW + i * 37)
+    assert len(bot.json.dumps(info["stats"])) <= size + 400
+    assert len(info["stats"]["minute"]["c"]) == 60
+    assert len(info["stats"]["hour"]["c"]) == 48
+
+
+def test_old_activity_ages_out():
+    info = multi_code()
+    bot.record_redemption(info, NOW)
+    stats = bot.code_stats(info, NOW + 3 * 24 * HOUR)
+    assert stats["last_hour"] == 0
+    assert stats["last_24h"] == 0
+    assert stats["eta_seconds"] is None
+
+
+def test_redeem_records_and_persists_series(store):
+    bot.codes["CAMP"] = multi_code(limit=3)
+    fake_bot = FakeBot()
+    for user_id in (1, 2, 3):
+        asyncio.run(bot.redeem(FakeUpdate(user_id, user_id), FakeContext(fake_bot, ["CAMP"])))
+    bot.codes.reset()
+    bot.codes.attach(bot._store)
+    stats = bot.code_stats(bot.codes["CAMP"])
+    assert stats["last_hour"] == 3
+    assert stats["remaining"] == 0
+    assert stats["eta_seconds"] == 0
+
+
+def test_codestats_endpoint(store, monkeypatch):
+    monkeypatch.setattr(bot, "WEB_SECRET", "s3cret")
+    bot.codes["CAMP"] = multi_code()
+    bot.record_redemption(bot.codes["CAMP"])
+    bot.save_code("CAMP")
+    client = bot.flask_app.test_client()
+    assert client.get("/codestats/camp").status_code == 401
+    assert client.get("/codestats/NOPE?secret=s3cret").status_code == 404
+    body = client.get("/codestats/camp?secret=s3cret").get_json()
+    assert body["code"] == "CAMP"
+    assert body["last_hour"] == 1
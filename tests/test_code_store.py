@@ -0,0 +1,121 @@
+import asyncio
+import threading
+
+import bot
+from conftest import FakeBot, FakeContext, FakeUpdate, restart_store
+
+
+def make_record(text="reward"):
+    return {"text": text, "used_by": [], "limit": 1000, "media": None, "created_by": 1}
+
+
+def test_codes_survive_eviction_and_restart(store, monkeypatch):
+    monkeypatch.setattr(bot, "CODE_CACHE_MAX_MB", 0.002)  # ~2 KB, a handful of records
+    for i in range(50):
+        bot.codes[f"C{i}"] = make_record(f"reward {i}")
+
+    stats = bot.codes.metrics()
+    assert stats["codes"] == 50
+    assert stats["resident"] < 50
+    assert stats["evictions"] > 0
+    assert stats["resident_bytes"] <= stats["max_bytes"] or stats["resident"] == 1
+
+    # a cold code pages back in with its data intact
+    assert "C0" in bot.codes
+    assert bot.codes["C0"]["text"] == "reward 0"
+    assert bot.codes.metrics()["misses"] >= 1
+
+    restart_store()
+    assert len(bot.codes) == 50
+    assert bot.codes.metrics()["resident"] == 0
+    assert list(bot.codes)[:3] == ["C0", "C1", "C2"]
+
+
+def test_scan_does_not_fill_cache(store, monkeypatch):
+    for i in range(20):
+        bot.codes[f"C{i}"] = make_record()
+    restart_store()
+    assert len(list(bot.codes.values())) == 20
+    assert bot.codes.metrics()["resident"] == 0
+
+
+def test_membership_does_not_touch_cache_or_counters(store):
+    for i in range(20):
+        bot.codes[f"C{i}"] = make_record()
+    restart_store()
+    assert "C3" in bot.codes and "NOPE" not in bot.codes
+    stats = bot.codes.metrics()
+    assert (stats["resident"], stats["hits"], stats["misses"]) == (0, 0, 0)
+    assert stats["hit_rate"] is None
+
+    # generate's duplicate check followed by the insert is one write, not a miss and a write
+    update = FakeUpdate(1, 1)
+    asyncio.run(bot.generate(update, FakeContext(FakeBot(), ["NEW", "hello"])))
+    assert "NEW" in bot.codes
+    assert bot.codes.metrics()["misses"] == 0
+
+
+def test_in_place_change_persists_after_eviction(store, monkeypatch):
+    monkeypatch.setattr(bot, "CODE_CACHE_MAX_MB", 0.002)
+    bot.codes["MULTI"] = make_record()
+    fake_bot = FakeBot()
+    asyncio.run(bot.redeem(FakeUpdate(1, 42), FakeContext(fake_bot, ["MULTI"])))
+    for i in range(50):
+        bot.codes[f"C{i}"] = make_record()
+    assert 42 in bot.codes["MULTI"]["used_by"]
+
+
+def test_delete_removes_cold_code(store):
+    bot.codes["GONE"] = make_record()
+    restart_store()
+    del bot.codes["GONE"]
+    assert "GONE" not in bot.codes
+    assert len(bot.codes) == 0
+    restart_store()
+    assert "GONE" not in bot.codes
+
+
+def test_scan_from_another_thread(store):
+    for i in range(5):
+        bot.codes[f"C{i}"] = make_record()
+    seen = []
+    worker = threading.Thread(target=lambda: seen.extend(bot.codes))
+    worker.start()
+    worker.join()
+    assert seen == [f"C{i}" for i in range(5)]
+
+
+def test_request_threads_share_pooled_read_connections(store, monkeypatch):
+    bot.codes["C0"] = make_record()
+    opened = []
+    connect = bot.sqlite3.connect
+    monkeypatch.setattr(bot.sqlite3, "connect", lambda *a, **kw: opened.append(a) or connect(*a, **kw))
+    client = bot.flask_app.test_client()
+    monkeypatch.setattr(bot, "WEB_SECRET", "s3cret")
+    for _ in range(5):
+        # one thread per request, like the threaded status server
+        threads = [threading.Thread(target=lambda: client.get("/codestats/C0?secret=s3cret")) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+    assert len(opened) <= 8  # connections opened under the first burst, reused after it
+    assert len(bot.codes._idle_readers) <= bot.STORE_IDLE_READERS
+
+
+def test_resident_records_follow_the_loop_thread(store, monkeypatch):
+    bot.codes["C0"] = make_record()
+    info = bot.codes["C0"]
+    info["text"] = "changed in place, not saved"
+    seen = {}
+
+    def loop_thread():
+        seen["loop"] = bot.codes.peek("C0")["text"]
+
+    worker = threading.Thread(target=loop_thread)
+    monkeypatch.setattr(bot, "_loop_thread", worker)
+    worker.start()
+    worker.join()
+    # the loop may run on any thread; the main thread is just another reader then
+    assert seen["loop"] == "changed in place, not saved"
+    assert bot.codes.peek("C0")["text"] == make_record()["text"]
@@ -0,0 +1,110 @@
+import asyncio
+
+import bot
+from conftest import FakeBot, FakeContext, FakeUpdate, restart_store
+
+ADMIN = 1
+
+
+def add_code(code, creator, used_by=None, limit=None):
+    record = {"text": "reward", "used_by": used_by, "media": None, "created_by": creator}
+    if limit is not None:
+        record["limit"] = limit
+    bot.codes[code] = record
+
+
+def run(handler, user_id, *args):
+    update = FakeUpdate(1, user_id)
+    asyncio.run(handler(update, FakeContext(FakeBot(), args)))
+    return update.message.replies
+
+
+def test_index_follows_generate_delete_and_restart(store):
+    add_code("A1", ADMIN)
+    add_code("B1", 2)
+    add_code("A2", ADMIN)
+    add_code("ANON", None)
+    assert bot.codes.codes_by(ADMIN) == ["A1", "A2"]
+    assert bot.codes.creator_of("B1") == 2
+    assert bot.codes.creator_of("ANON") is None
+
+    del bot.codes["A1"]
+    assert bot.codes.codes_by(ADMIN) == ["A2"]
+
+    restart_store()
+    assert bot.codes.codes_by(ADMIN) == ["A2"]
+    assert bot.codes.creator_counts() == {ADMIN: 1, 2: 1}
+    assert bot.codes.metrics()["resident"] == 0
+
+
+def test_mycodes_lists_only_own_codes_with_totals(store):
+    add_code("MINE", ADMIN)
+    add_code("USED", ADMIN, used_by=42)
+    add_code("OTHER", 2)
+    [reply] = run(bot.mycodes, ADMIN)
+    assert "MINE" in reply and "USED" in reply and "OTHER" not in reply
+    assert "2 total, 1 active, 1 exhausted, 1 redemptions" in reply
+
+
+def test_deletecodes_mine_exhausted(store):
+    add_code("FRESH", ADMIN)
+    add_code("USED", ADMIN, used_by=42)
+    add_code("FULL", ADMIN, used_by=[1, 2], limit=2)
+    add_code("OPEN", ADMIN, used_by=[1], limit=2)
+    add_code("OTHERS", 2, used_by=7)
+
+    [reply] = run(bot.deletecodes, ADMIN, "mine", "--exhausted")
+    assert "Deleted 2" in reply
+    assert bot.codes.codes_by(ADMIN) == ["FRESH", "OPEN"]
+    assert "OTHERS" in bot.codes
+
+    [reply] = run(bot.deletecodes, ADMIN, "everyone")
+    assert "Usage" in reply
+    assert len(bot.codes) == 3
+
+
+def test_creator_queries_use_the_index(store):
+    for i in range(50):
+        add_code(f"C{i}", i % 3 or None)
+    assert bot.codes.creator_counts() == {1: 17, 2: 16}
+    assert bot.codes.codes_by(2, 2, 1) == ["C5", "C8"]
+    assert not hasattr(bot.codes, "_creator")  # nothing per code stays resident
+    plan = bot._store.execute(
+        f"EXPLAIN QUERY PLAN SELECT code FROM codes WHERE {bot.CREATED_BY_SQL} = ? ORDER BY rowid", (1,)
+    ).fetchall()
+    assert "codes_created_by" in plan[0][-1]
+
+
+class PagedMessage:
+    def __init__(self):
+        self.edits = []
+
+    async def edit_message_text(self, text, **kwargs):
+        self.edits.append((text, kwargs.get("reply_markup")))
+
+    async def answer(self):
+        pass
+
+
+def test_listcodes_is_paged(store, monkeypatch):
+    monkeypatch.setattr(bot, "CODES_PAGE_SIZE", 4)
+    for i in range(10):
+        add_code(f"P{i}", ADMIN if i % 2 else 2)
+    update = FakeUpdate(1, ADMIN)
+    asyncio.run(bot.listcodes(update, FakeContext(FakeBot())))
+    [reply] = update.message.replies
+    assert "10 total, page 1/3" in reply and "P3" in reply and "P4" not in reply
+
+    query = PagedMessage()
+    query.data = "listcodes:3"
+    query.from_user = update.effective_user
+    update.callback_query = query
+    asyncio.run(bot.codes_page_callback(update, FakeContext(FakeBot())))
+    text, keyboard = query.edits[0]
+    assert "page 3/3" in text and "P9" in text and "P7" not in text
+    assert [b.callback_data for b in keyboard.inline_keyboard[0]] == ["listcodes:2"]
+
+    query.data = "mycodes:2"
+    asyncio.run(bot.codes_page_callback(update, FakeContext(FakeBot())))
+    text, _ = query.edits[1]
+    assert "5 total" in text and "page 2/2" in text and "P9" in text and "P2" not in text
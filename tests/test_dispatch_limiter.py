@@ -0,0 +1,135 @@
+import asyncio
+import datetime
+
+from telegram import CallbackQuery, Chat, Message, Update, User
+
+import bot
+
+
+def command_update(text):
+    message = Message(1, datetime.datetime.now(), Chat(1, "private"), text=text)
+    return Update(1, message=message)
+
+
+def test_update_priority():
+    assert bot.update_priority(command_update("/redeem ABC")) == "high"
+    assert bot.update_priority(command_update("/ping@SomeBot")) == "low"
+    assert bot.update_priority(command_update("/listcodes")) == "low"
+    assert bot.update_priority(command_update("/generate X hi")) == "normal"
+    query = CallbackQuery("1", User(1, "u", False), "chat", data="request_screenshot:ABC")
+    assert bot.update_priority(Update(2, callback_query=query)) == "low"
+
+
+def test_full_limiter_sheds_low_admits_high_and_queues_normal():
+    async def scenario():
+        limiter = bot.AdaptiveLimiter(2, 1, 10, target=1.0)
+        assert await limiter.acquire("normal")
+        assert await limiter.acquire("normal")
+
+        assert not await limiter.acquire("low")
+        assert limiter.metrics()["shed"] == {"low": 1}
+        assert await limiter.acquire("high")
+        assert limiter.in_flight == 3
+
+        waiting = asyncio.ensure_future(limiter.acquire("normal"))
+        await asyncio.sleep(0)
+        assert not waiting.done()
+        assert limiter.metrics()["waiting"] == 1
+
+        limiter.release(0.01)
+        limiter.release(0.01)
+        assert await waiting
+        assert limiter.in_flight == 2
+
+    asyncio.run(scenario())
+
+
+def test_limit_backs_off_on_slow_handlers_and_recovers():
+    async def scenario():
+        limiter = bot.AdaptiveLimiter(10, 2, 20, target=0.5)
+        await limiter.acquire()
+        limiter.release(5.0)
+        assert limiter.limit == 10 * bot.LIMIT_BACKOFF
+        # a burst of slow completions inside one target period only backs off once
+        await limiter.acquire()
+        limiter.release(5.0)
+        assert limiter.limit == 10 * bot.LIMIT_BACKOFF
+
+        start = limiter.limit
+        for _ in range(50):
+            for _ in range(int(limiter.limit)):
+                await limiter.acquire()
+            for _ in range(int(limiter.limit)):
+                limiter.release(0.01)
+        assert limiter.limit > start
+        assert limiter.limit <= 20
+
+    asyncio.run(scenario())
+
+
+def test_cancelled_waiter_passes_slot_on():
+    async def scenario():
+        limiter = bot.AdaptiveLimiter(1, 1, 1, target=1.0)
+        await limiter.acquire()
+        first = asyncio.ensure_future(limiter.acquire())
+        second = asyncio.ensure_future(limiter.acquire())
+        await asyncio.sleep(0)
+        first.cancel()
+        await asyncio.sleep(0)
+        limiter.release(0.01)
+        assert await second
+        assert limiter.in_flight == 1
+
+    asyncio.run(scenario())
+
+
+def test_high_priority_bypass_is_bounded_and_served_first():
+    async def scenario():
+        limiter = bot.AdaptiveLimiter(1, 1, 1, target=1.0, burst=2)
+        for _ in range(3):  # the limit plus the burst
+            assert await limiter.acquire("high")
+        normal = asyncio.ensure_future(limiter.acquire("normal"))
+        high = asyncio.ensure_future(limiter.acquire("high"))
+        await asyncio.sleep(0)
+        assert not high.done() and limiter.metrics()["waiting"] == 2
+
+        limiter.release(0.01)  # back inside the burst: the /redeem goes first
+        assert await high
+        assert not normal.done()
+        for _ in range(3):
+            limiter.release(0.01)
+        assert await normal
+
+    asyncio.run(scenario())
+
+
+class PlainDispatch:
+    async def process_update(self, update):
+        self.handled = update
+
+
+class Dispatch(bot.GuardedDispatch, PlainDispatch):
+    pass
+
+
+class AnsweringBot:
+    def __init__(self):
+        self.answers = []
+
+    async def answer_callback_query(self, callback_query_id, text=None, **kwargs):
+        self.answers.append(text)
+
+
+def test_shed_callback_query_is_answered(monkeypatch):
+    limiter = bot.AdaptiveLimiter(1, 1, 1, target=1.0)
+    limiter.in_flight = 1
+    monkeypatch.setattr(bot, "dispatch_limiter", limiter)
+    query = CallbackQuery("1", User(1, "u", False), "chat", data="request_screenshot:ABC")
+    answering = AnsweringBot()
+    query.set_bot(answering)
+
+    dispatch = Dispatch()
+    asyncio.run(dispatch.process_update(Update(2, callback_query=query)))
+    assert not hasattr(dispatch, "handled")
+    assert limiter.metrics()["shed"] == {"low": 1}
+    assert answering.answers and "busy" in answering.answers[0]
@@ -0,0 +1,145 @@
+import asyncio
+import os
+import subprocess
+import sys
+import time
+
+import pytest
+from telegram.ext import ApplicationHandlerStop
+
+import bot
+from conftest import FakeApplication, FakeBot, FakeContext, FakeUpdate
+
+
+class FakeSuccessor:
+    pid = 4242
+
+    def __init__(self):
+        self.killed = False
+
+    def poll(self):
+        return 1 if self.killed else None
+
+    def kill(self):
+        self.killed = True
+
+
+@pytest.fixture
+def restart_state(store, monkeypatch):
+    for name in ("_stop_event", "_successor", "_restart_in_progress"):
+        monkeypatch.setattr(bot, name, getattr(bot, name))
+    monkeypatch.delenv("BOT_SUPERVISOR_PID", raising=False)
+    return store
+
+
+def test_restart_waits_until_successor_is_ready(restart_state, monkeypatch):
+    spawned = []
+
+    def popen(args, env):
+        spawned.append(env)
+        # the successor connects to Telegram first, then announces it is ready
+        asyncio.get_running_loop().call_later(0.05, bot.save_json_state, bot.HANDOFF_READY_FILE, {"pid": 4242})
+        return FakeSuccessor()
+
+    monkeypatch.setattr(bot.subprocess, "Popen", popen)
+
+    async def scenario():
+        bot._stop_event = asyncio.Event()
+        restart = asyncio.create_task(bot.perform_restart())
+        await asyncio.sleep(0.02)
+        assert not bot._stop_event.is_set()  # still serving while the successor starts
+        await restart
+        return bot._stop_event.is_set()
+
+    assert asyncio.run(scenario())
+    assert spawned[0]["BOT_HANDOFF"] == "1"
+    assert spawned[0]["BOT_SUPERVISOR_PID"] == str(os.getpid())
+    assert bot._successor.pid == 4242
+
+
+def test_restart_is_aborted_if_successor_dies(restart_state, monkeypatch):
+    successor = FakeSuccessor()
+    successor.killed = True
+    monkeypatch.setattr(bot.subprocess, "Popen", lambda args, env: successor)
+
+    async def scenario():
+        bot._stop_event = asyncio.Event()
+        await bot.perform_restart()
+        return bot._stop_event.is_set()
+
+    assert not asyncio.run(scenario())
+    assert bot._successor is None and not bot._restart_in_progress
+
+
+def test_successor_waits_for_release(restart_state):
+    async def scenario():
+        waiting = asyncio.create_task(bot.wait_for_release())
+        await asyncio.sleep(0.05)
+        assert bot.load_json_state(bot.HANDOFF_READY_FILE, None) == {"pid": os.getpid()}
+        assert not waiting.done()
+        bot.save_json_state(bot.HANDOFF_RELEASED_FILE, {"released_at": time.time(), "pid": 1})
+        await asyncio.wait_for(waiting, timeout=1)
+
+    asyncio.run(scenario())
+
+
+class ProofBot(FakeBot):
+    async def send_media_group(self, chat_id, media, **kwargs):
+        self.sent.append((chat_id, f"album:{len(media)}"))
+
+
+def test_unsent_outbound_items_move_to_successor(restart_state, monkeypatch):
+    instance = bot.current_bot()
+    successor_bot = ProofBot()
+    monkeypatch.setattr(instance, "application", FakeApplication(successor_bot))
+    proof = {"kind": "photo", "file_id": "F", "code": "ONE", "user_id": 7, "name": "User 7", "chat_id": 7}
+
+    async def old_process():
+        bot.queue_notification(7, "hello")
+        instance.proof_batches[99] = [proof, dict(proof, user_id=8)]
+        await bot.hand_off_outbound()
+
+    async def new_process():
+        bot.take_over_outbound()
+        await asyncio.gather(*bot._background_tasks)
+
+    asyncio.run(old_process())
+    assert bot.notification_queue.empty() and not instance.proof_batches
+    assert bot.load_json_state(bot.HANDOFF_OUTBOUND_FILE, None) is not None
+
+    asyncio.run(new_process())
+    assert bot.notification_queue.get_nowait() == (instance.name, 7, "hello")
+    bot.notification_queue.task_done()
+    assert successor_bot.sent == [(99, "album:2")]
+    assert bot.load_json_state(bot.HANDOFF_OUTBOUND_FILE, None) is None
+
+
+def test_redelivered_update_waits_for_recovery(restart_state):
+    # recovery runs after the successor starts polling and may hold the update's reward
+    bot._rewards_in_flight.add(21)
+    update = FakeUpdate(21, 42)
+    with pytest.raises(ApplicationHandlerStop):
+        asyncio.run(bot.skip_processed_update(update, FakeContext(FakeBot())))
+
+
+@pytest.mark.skipif(not sys.platform.startswith("linux"), reason="child subreaper is Linux only")
+def test_supervisor_follows_successors(tmp_path):
+    successor_file = tmp_path / "successor.json"
+    # a bot that restarts once more: it starts its successor, names it and exits
+    restarting_bot = (
+        "import json, subprocess, sys, time\n"
+        "time.sleep(0.2)\n"  # up and running under the supervisor
+        "c = subprocess.Popen([sys.executable, '-c', 'import time; time.sleep(0.5); raise SystemExit(3)'])\n"
+        f"json.dump({{'pid': c.pid}}, open({str(successor_file)!r}, 'w'))\n"
+    )
+    first_process = (
+        "import os, subprocess, sys\n"
+        f"b = subprocess.Popen([sys.executable, '-c', {restarting_bot!r}])\n"
+        f"os.execv(sys.executable, [sys.executable, '-c', {bot._SUPERVISOR_SRC!r}, str(b.pid), {str(successor_file)!r}])\n"
+    )
+    started = time.monotonic()
+    result = subprocess.run([sys.executable, "-c", first_process], timeout=10)
+    # the original PID lived until the successor's successor exited, with its exit code
+    assert result.returncode == 3
+    assert time.monotonic() - started >= 0.7
+    assert not successor_file.exists()
@@ -0,0 +1,96 @@
+import asyncio
+import threading
+import tracemalloc
+
+import bot
+from conftest import FakeBot, FakeContext, FakeUpdate
+
+ADMIN = 1
+
+
+def run_memstats(*args):
+    update = FakeUpdate(1, ADMIN)
+    asyncio.run(bot.memstats(update, FakeContext(FakeBot(), args)))
+    return update.message
+
+
+def test_report_counts_structures(store, monkeypatch):
+    bot.codes["MULTI"] = {"text": "x", "used_by": [1, 2, 3], "limit": 5, "media": None, "created_by": ADMIN}
+    bot.codes["ONE"] = {"text": "x", "used_by": 9, "media": None, "created_by": ADMIN}
+    monkeypatch.setitem(bot.pending_screenshots, 5, {"code": "ONE"})
+    report = bot.memory_report()
+    assert report["structures"]["used_by_entries"] == 3
+    assert report["structures"]["pending_screenshots"] == 1
+    assert report["tracing"] is False
+    assert "pending screenshots: 1" in run_memstats().replies[0]
+
+
+def test_tracing_is_opt_in_and_diff_is_a_document(store):
+    assert not tracemalloc.is_tracing()
+    assert "Tracing is off" in run_memstats("trace", "diff").replies[0]
+
+    run_memstats("trace", "start")
+    try:
+        assert tracemalloc.is_tracing()
+        hog = [bytearray(1000) for _ in range(2000)]
+        message = run_memstats("trace", "diff", "5")
+        [document] = message.documents
+        text = document.input_file_content.decode()
+        assert text.startswith("Top 5 allocation changes")
+        assert "test_memstats.py" in text
+        del hog
+    finally:
+        run_memstats("trace", "stop")
+    assert not tracemalloc.is_tracing()
+
+
+def test_http_memstats_requires_secret(store, monkeypatch):
+    monkeypatch.setattr(bot, "WEB_SECRET", "s3cret")
+    client = bot.flask_app.test_client()
+    assert client.get("/memstats").status_code == 401
+    assert client.get("/memstats?secret=s3cret").get_json()["ok"] is True
+    assert client.get("/memstats?secret=s3cret&diff=10").status_code == 409
+
+
+def test_report_is_built_off_the_event_loop(store, monkeypatch):
+    threads = []
+    original = bot.memory_report
+
+    def recording():
+        threads.append((threading.current_thread(), bot.current_bot().name))
+        return original()
+
+    monkeypatch.setattr(bot, "memory_report", recording)
+    assert "Memory" in run_memstats().replies[0]
+    [(thread, name)] = threads
+    assert thread is not threading.main_thread() and name == bot.current_bot().name
+
+
+def test_heap_walk_is_reused_within_the_ttl(store, monkeypatch):
+    monkeypatch.setattr(bot, "_gc_objects", (0.0, 0))
+    first = bot.memory_report()["gc_objects"]
+    hog = [object() for _ in range(10_000)]
+    assert bot.memory_report()["gc_objects"] == first
+    monkeypatch.setattr(bot, "MEMSTATS_GC_TTL", 0)
+    assert bot.memory_report()["gc_objects"] > first
+    del hog
+
+
+def test_http_trace_diff_is_per_bot(store, monkeypatch):
+    monkeypatch.setattr(bot, "WEB_SECRET", "s3cret")
+    shop = bot.BotInstance("shop2", "2:TEST", [2], [])
+    monkeypatch.setitem(bot.BOTS, "shop2", shop)
+    client = bot.flask_app.test_client()
+    assert client.get("/memstats?secret=s3cret&diff=5&bot=nope").status_code == 404
+
+    bot.run_as(shop, bot.start_trace)
+    try:
+        assert client.get("/memstats?secret=s3cret&diff=5").status_code == 409  # the primary bot is not tracing
+        resp = client.get("/memstats?secret=s3cret&diff=5&bot=shop2")
+        assert resp.status_code == 200 and "bot shop2" in resp.get_data(as_text=True)
+        run_memstats("trace", "start")
+        run_memstats("trace", "stop")
+        assert tracemalloc.is_tracing()  # still wanted by shop2
+    finally:
+        bot.run_as(shop, bot.stop_trace)
+    assert not tracemalloc.is_tracing()
@@ -0,0 +1,84 @@
+import asyncio
+import json
+import os
+
+import pytest
+
+import bot
+from conftest import FakeBot, FakeContext, FakeUpdate
+
+
+@pytest.fixture
+def two_bots(store, monkeypatch):
+    shop = bot.BotInstance("shop2", "2:TEST", [2], ["@two"])
+    monkeypatch.setitem(bot.BOTS, "shop2", shop)
+    monkeypatch.setattr(shop, "force_channels", set())
+    bot.run_as(shop, bot.init_store)
+    yield bot.BOTS["main"], shop
+    shop.store.close()
+
+
+def test_state_is_isolated_per_bot(two_bots, store):
+    main, shop = two_bots
+    bot.run_as(shop, bot.codes.__setitem__, "SHOP", {"text": "r", "used_by": None, "media": None, "created_by": 2})
+    assert "SHOP" not in bot.codes
+    assert bot.run_as(shop, bot.codes.__contains__, "SHOP")
+    assert os.path.exists(os.path.join(store, "shop2", "bot.db"))
+
+    assert bot.is_admin(1) and not bot.is_admin(2)
+    assert bot.run_as(shop, bot.is_admin, 2) and not bot.run_as(shop, bot.is_admin, 1)
+
+    def ban():
+        bot.BANNED_USERS.add(42)
+        bot.save_banned_users()
+
+    bot.run_as(shop, ban)
+    assert 42 not in bot.BANNED_USERS
+    assert json.load(open(os.path.join(store, "shop2", "banned_users.json"))) == [42]
+
+
+def test_redeem_runs_against_the_updates_bot(two_bots):
+    main, shop = two_bots
+    bot.run_as(shop, bot.codes.__setitem__, "SHOP", {"text": "r", "used_by": None, "media": None, "created_by": 2})
+    fake_bot = FakeBot()
+    main_redemptions = main.redemptions_total
+
+    update = FakeUpdate(5, 7)
+    asyncio.run(bot.redeem(update, FakeContext(fake_bot, ["SHOP"])))
+    assert update.message.replies == ["❌ Invalid Code"]
+
+    asyncio.run(bot.run_as_async(shop, bot.redeem, FakeUpdate(5, 7), FakeContext(fake_bot, ["SHOP"])))
+    assert bot.run_as(shop, lambda: bot.codes["SHOP"]["used_by"]) == 7
+    assert shop.redemptions_total == 1 and main.redemptions_total == main_redemptions
+    # update IDs are per bot: the same ID is still unseen by the main bot
+    assert not bot.is_update_processed(5)
+
+
+def test_notifications_remember_their_bot(two_bots):
+    main, shop = two_bots
+    while not bot.notification_queue.empty():
+        bot.notification_queue.get_nowait()
+        bot.notification_queue.task_done()
+    bot.run_as(shop, bot.queue_notification, 7, "hi")
+    bot.queue_notification(8, "hello")
+    assert bot.notification_queue.get_nowait() == ("shop2", 7, "hi")
+    assert bot.notification_queue.get_nowait() == ("main", 8, "hello")
+    bot.notification_queue.task_done()
+    bot.notification_queue.task_done()
+
+
+def test_load_bots_validates_file(tmp_path, monkeypatch):
+    bots_file = tmp_path / "bots.json"
+    monkeypatch.setattr(bot, "BOTS_FILE", str(bots_file))
+    bots_file.write_text(json.dumps([{"name": "shop2", "token": "2:T", "admin_ids": [2], "force_channels": ["two"]}]))
+    bots = bot.load_bots()
+    assert list(bots) == ["main", "shop2"]
+    assert bots["shop2"].force_channels == {"@two"}
+    assert bots["shop2"].data_dir.endswith(os.path.join("", "shop2"))
+
+    bots_file.write_text(json.dumps([{"name": "main", "token": "2:T", "admin_ids": [2]}]))
+    with pytest.raises(ValueError):
+        bot.load_bots()
+    bots_file.write_text(json.dumps([{"name": "../x", "token": "2:T", "admin_ids": [2]}]))
+    with pytest.raises(ValueError):
+        bot.load_bots()
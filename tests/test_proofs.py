@@ -0,0 +1,90 @@
+import asyncio
+
+import pytest
+
+import bot
+
+
+class ProofBot:
+    def __init__(self):
+        self.sent = []  # (creator_id, kind, count)
+        self.captions = []
+
+    async def send_photo(self, chat_id, photo, caption=None, **kwargs):
+        self.sent.append((chat_id, "photo", 1))
+
+    async def send_document(self, chat_id, document, caption=None, **kwargs):
+        self.sent.append((chat_id, "document", 1))
+
+    async def send_media_group(self, chat_id, media, **kwargs):
+        self.sent.append((chat_id, "album", len(media)))
+        self.captions.append(media[0].caption)
+
+
+@pytest.fixture
+def proofs(monkeypatch):
+    monkeypatch.setattr(bot, "PROOF_BATCH_WINDOW", 0.05)
+    for state in (bot._proof_batches, bot._proof_flush_tasks, bot._proof_last_sent):
+        state.clear()
+    yield
+    for state in (bot._proof_batches, bot._proof_flush_tasks, bot._proof_last_sent):
+        state.clear()
+
+
+def proof(i, kind="photo"):
+    return {"kind": kind, "file_id": f"F{i}", "code": "CODE", "user_id": i, "name": f"User {i}", "chat_id": i}
+
+
+def test_first_proof_goes_out_at_once_and_a_burst_is_batched(proofs):
+    sender = ProofBot()
+
+    async def scenario():
+        assert await bot.forward_proof(sender, 9, proof(0))
+        for i in range(1, 13):
+            assert not await bot.forward_proof(sender, 9, proof(i))
+        await bot.forward_proof(sender, 9, proof(13, "document"))
+        assert sender.sent == [(9, "photo", 1)]  # the rest waits for the window
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    # photos and documents cannot share an album; a chunk of one is sent on its own
+    assert sender.sent[1:] == [(9, "album", 10), (9, "album", 2), (9, "document", 1)]
+    assert "10 Screenshots" in sender.captions[0]
+    assert not bot._proof_batches and not bot._proof_flush_tasks
+
+
+def test_other_creators_are_not_held_back(proofs):
+    sender = ProofBot()
+
+    async def scenario():
+        await bot.forward_proof(sender, 1, proof(0))
+        await bot.forward_proof(sender, 1, proof(1))  # queued for creator 1
+        assert await bot.forward_proof(sender, 2, proof(2))
+        await asyncio.sleep(0.1)
+
+    asyncio.run(scenario())
+    assert sender.sent == [(1, "photo", 1), (2, "photo", 1), (1, "photo", 1)]
+
+
+def test_flush_all_sends_queued_proofs_now(proofs, monkeypatch):
+    monkeypatch.setattr(bot, "PROOF_BATCH_WINDOW", 60)
+    sender = ProofBot()
+
+    async def scenario():
+        for i in range(4):
+            await bot.forward_proof(sender, 9, proof(i))
+        timer = bot._proof_flush_tasks[9]
+        await bot.flush_all_proofs(sender)
+        await asyncio.sleep(0)
+        return timer
+
+    timer = asyncio.run(scenario())
+    assert timer.cancelled()
+    assert sender.sent == [(9, "photo", 1), (9, "album", 3)]
+    assert not bot._proof_batches
+
+
+def test_album_caption_stays_within_telegram_limit():
+    caption = bot._album_caption([proof(i) for i in range(10)] * 10)
+    assert len(caption) <= bot.PROOF_CAPTION_LIMIT
+    assert "more" in caption
@@ -0,0 +1,192 @@
+import asyncio
+
+import pytest
+from telegram.error import BadRequest, TimedOut
+from telegram.ext import ApplicationHandlerStop
+
+import bot
+from conftest import FakeApplication, FakeBot, FakeContext, FakeUpdate, restart_store
+
+
+def add_code(code, multi=False):
+    bot.codes[code] = {
+        "text": "reward",
+        "used_by": [] if multi else None,
+        "media": None,
+        "created_by": None,
+    }
+    if multi:
+        bot.codes[code]["limit"] = 10
+    bot.save_code(code)
+
+
+def redeem(fake_bot, update_id, user_id, code):
+    update = FakeUpdate(update_id, user_id)
+    context = FakeContext(fake_bot, [code])
+    asyncio.run(bot.redeem(update, context))
+    asyncio.run(bot.mark_update_processed(update, context))
+    return update
+
+
+def test_redeem_completes_update(store):
+    add_code("ONE")
+    fake_bot = FakeBot()
+    redeem(fake_bot, 10, 42, "ONE")
+    assert bot.codes["ONE"]["used_by"] == 42
+    assert bot.list_pending_rewards() == []
+    assert bot.is_update_processed(10)
+    assert any("reward" in text for _, text in fake_bot.sent)
+
+
+def test_failed_reward_send_keeps_pending_reward(store):
+    add_code("ONE")
+    fake_bot = FakeBot()
+    fake_bot.fail_with = TimedOut()
+    update = FakeUpdate(11, 42)
+    context = FakeContext(fake_bot, ["ONE"])
+    with pytest.raises(TimedOut):
+        asyncio.run(bot.redeem(update, context))
+    asyncio.run(bot.mark_update_processed(update, context))
+
+    assert bot.codes["ONE"]["used_by"] == 42
+    assert [p["update_id"] for p in bot.list_pending_rewards()] == [11]
+    assert not bot.is_update_processed(11)
+
+    # the retry delivers it and only then completes the update
+    fake_bot.fail_with = None
+    asyncio.run(bot.recover_pending_rewards(FakeApplication(fake_bot)))
+    assert bot.list_pending_rewards() == []
+    assert bot.is_update_processed(11)
+    assert any("reward" in text for chat_id, text in fake_bot.sent if chat_id == 42)
+
+
+def test_journalled_reward_is_recovered_after_restart(store):
+    add_code("MULTI", multi=True)
+    bot.codes["MULTI"]["used_by"].append(7)
+    bot.journal_redemption("MULTI", 20, 7, 7)
+
+    restart_store()
+    assert bot.codes["MULTI"]["used_by"] == [7]
+    fake_bot = FakeBot()
+    asyncio.run(bot.recover_pending_rewards(FakeApplication(fake_bot)))
+    assert [chat_id for chat_id, _ in fake_bot.sent].count(7) == 2  # reward + screenshot prompt
+    assert bot.list_pending_rewards() == []
+    assert bot.is_update_processed(20)
+
+
+def test_redelivered_journalled_update_only_delivers_reward(store):
+    add_code("ONE")
+    bot.codes["ONE"]["used_by"] = 42
+    bot.journal_redemption("ONE", 30, 42, 42)
+    restart_store()
+
+    fake_bot = FakeBot()
+    update = redeem(fake_bot, 30, 42, "ONE")
+    assert update.message.replies == []  # no "Already Redeemed"
+    assert any("reward" in text for _, text in fake_bot.sent)
+    assert bot.is_update_processed(30)
+
+
+def test_processed_update_is_skipped_after_restart(store):
+    bot.complete_update(40)
+    restart_store()
+    with pytest.raises(ApplicationHandlerStop):
+        asyncio.run(bot.skip_processed_update(FakeUpdate(40, 1), FakeContext(FakeBot())))
+    # a new update passes through
+    asyncio.run(bot.skip_processed_update(FakeUpdate(41, 1), FakeContext(FakeBot())))
+
+
+def test_dedup_window_is_bounded(store, monkeypatch):
+    monkeypatch.setattr(bot, "UPDATE_DEDUP_WINDOW", 5)
+    for update_id in range(1, 21):
+        bot.complete_update(update_id)
+    assert len(bot._processed_ids) == 5
+    assert bot._store.execute("SELECT COUNT(*) FROM processed_updates").fetchone()[0] == 5
+    assert bot.is_update_processed(3)  # older than the window: below the watermark
+
+
+def test_code_order_survives_redemptions_and_restart(store):
+    for i in range(1, 6):
+        add_code(str(i), multi=True)
+    fake_bot = FakeBot()
+    redeem(fake_bot, 50, 100, "1")
+    redeem(fake_bot, 51, 101, "3")
+    before = list(bot.codes)
+    restart_store()
+    assert list(bot.codes) == before == ["1", "2", "3", "4", "5"]
+
+
+class MediaFailingBot(FakeBot):
+    """Fails photo sends with `photo_error`; text messages go through."""
+
+    def __init__(self, photo_error):
+        super().__init__()
+        self.photo_error = photo_error
+
+    async def send_photo(self, chat_id, photo, **kwargs):
+        if self.photo_error is not None:
+            raise self.photo_error
+        return await super().send_photo(chat_id, photo, **kwargs)
+
+
+def add_photo_code(code):
+    bot.codes[code] = {
+        "text": "reward",
+        "used_by": None,
+        "media": {"type": "photo", "file_id": "FILE1"},
+        "created_by": None,
+    }
+
+
+def test_failed_media_reward_stays_owed(store):
+    add_photo_code("PIC")
+    fake_bot = MediaFailingBot(TimedOut())
+    update = FakeUpdate(60, 42)
+    context = FakeContext(fake_bot, ["PIC"])
+    with pytest.raises(TimedOut):
+        asyncio.run(bot.redeem(update, context))
+    asyncio.run(bot.mark_update_processed(update, context))
+
+    assert bot.codes["PIC"]["used_by"] == 42
+    assert [p["update_id"] for p in bot.list_pending_rewards()] == [60]
+    assert not bot.is_update_processed(60)
+    assert fake_bot.sent == []  # no "failed" notice for a send that will be retried
+
+    fake_bot.photo_error = None
+    asyncio.run(bot.recover_pending_rewards(FakeApplication(fake_bot)))
+    assert (42, "photo:FILE1") in fake_bot.sent
+    assert bot.list_pending_rewards() == []
+    assert bot.is_update_processed(60)
+
+
+def test_refused_media_falls_back_to_text(store):
+    add_photo_code("PIC")
+    fake_bot = MediaFailingBot(BadRequest("Wrong file identifier"))
+    redeem(fake_bot, 61, 42, "PIC")
+
+    rewards = [text for chat_id, text in fake_bot.sent if chat_id == 42 and "reward" in text]
+    assert rewards and "could not be delivered" in rewards[0]
+    assert bot.list_pending_rewards() == []
+    assert bot.is_update_processed(61)
+
+
+class DeletingBot(FakeBot):
+    """Deletes the code while the creator notification is in flight (a concurrent /deletecode)."""
+
+    def __init__(self, code):
+        super().__init__()
+        self.code = code
+
+    async def send_message(self, chat_id, text, **kwargs):
+        if self.code in bot.codes:
+            del bot.codes[self.code]
+        return await super().send_message(chat_id, text, **kwargs)
+
+
+def test_code_deleted_mid_redeem_completes_without_reward(store):
+    bot.codes["GONE"] = {"text": "reward", "used_by": None, "media": None, "created_by": 5}
+    fake_bot = DeletingBot("GONE")
+    redeem(fake_bot, 30, 42, "GONE")
+    assert bot.list_pending_rewards() == []
+    assert bot.is_update_processed(30)
+    assert any(chat_id == 42 and "removed" in text for chat_id, text in fake_bot.sent)
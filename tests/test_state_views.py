@@ -0,0 +1,88 @@
+import sys
+import threading
+
+import pytest
+
+import bot
+
+NOW = 1_000_000 * 3600
+
+
+@pytest.fixture
+def fast_switching():
+    """Switch threads as often as possible so readers land in the middle of writes."""
+    interval = sys.getswitchinterval()
+    sys.setswitchinterval(1e-6)
+    yield
+    sys.setswitchinterval(interval)
+
+
+def read_until(stop, check):
+    errors = []
+
+    def reader():
+        while not stop.is_set():
+            try:
+                check()
+            except Exception as e:  # AssertionError, or "changed size during iteration"
+                errors.append(e)
+                return
+
+    thread = threading.Thread(target=reader)
+    thread.start()
+    return thread, errors
+
+
+def test_views_stay_consistent_under_writes(store, fast_switching):
+    instance = bot.current_bot()
+    stop = threading.Event()
+    versions = []
+
+    def check():
+        view = instance.view
+        assert view.codes_count == sum(view.creator_counts.values())
+        assert len(view.banned_users) % 10 == 0  # bans are published in batches of 10
+        assert all(isinstance(user_id, int) for user_id in view.banned_users)
+        assert not versions or view.version >= versions[-1]
+        versions.append(view.version)
+
+    thread, errors = read_until(stop, check)
+    try:
+        for i in range(300):
+            bot.codes[f"C{i}"] = {"text": "x", "used_by": None, "media": None, "created_by": i % 7}
+            if i % 3 == 0:
+                del bot.codes[f"C{i // 3}"]
+            bot.BANNED_USERS.update(range(i * 10, i * 10 + 10))
+            bot.save_banned_users()
+    finally:
+        stop.set()
+        thread.join()
+    assert not errors, errors[0]
+    assert len(set(versions)) > 1
+    assert instance.view.codes_count == len(bot.codes) == 200
+    assert len(instance.view.banned_users) == 3000
+
+
+def test_other_threads_never_see_half_applied_redemptions(store, fast_switching):
+    bot.codes["CAMP"] = {"text": "x", "used_by": [], "limit": 10**6, "media": None, "created_by": 1}
+    stop = threading.Event()
+
+    def check():
+        record = bot.codes.peek("CAMP")
+        counted = sum(record.get("stats", {}).get("minute", {}).get("c", []))
+        assert len(record["used_by"]) == counted
+        for info in bot.codes.values():
+            assert info is not bot.codes._hot.get("CAMP")
+
+    thread, errors = read_until(stop, check)
+    try:
+        for user_id in range(2000):
+            info = bot.codes["CAMP"]
+            info["used_by"].append(user_id)
+            bot.record_redemption(info, NOW)
+            bot.save_code("CAMP")
+    finally:
+        stop.set()
+        thread.join()
+    assert not errors, errors[0]
+    assert len(bot.codes.peek("CAMP")["used_by"]) == 2000
@@ -0,0 +1,48 @@
+import json
+import threading
+
+import bot
+
+
+def test_viewers_share_one_snapshot_per_tick(store, monkeypatch):
+    scans = []
+    monkeypatch.setattr(bot, "compute_active_users", lambda: scans.append(1) or 7)
+    hub = bot.StatusHub(interval=60)
+    monkeypatch.setattr(bot.current_bot(), "status_hub", hub)
+
+    client = bot.flask_app.test_client()
+    threads = [threading.Thread(target=lambda: client.get("/status")) for _ in range(20)]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    assert hub.seq == 1
+    assert len(scans) == 1
+    assert client.get("/status").get_json()["active_users"] == 7
+
+
+def test_stream_sends_full_snapshot_then_deltas(store, monkeypatch):
+    monkeypatch.setattr(bot.current_bot(), "status_hub", bot.StatusHub(interval=0.01))
+    response = bot.flask_app.test_client().get("/status/stream", buffered=False)
+    assert response.mimetype == "text/event-stream"
+    chunks = response.response
+    first = json.loads(next(chunks).decode().split("data: ", 1)[1])
+    assert {"uptime", "active_users", "codes_count", "queues", "redemptions_per_sec"} <= set(first)
+
+    bot.codes["NEW"] = {"text": "x", "used_by": None, "media": None, "created_by": None}
+    for _ in range(50):
+        delta = json.loads(next(chunks).decode().split("data: ", 1)[1])
+        if "codes_count" in delta:
+            break
+    assert delta["codes_count"] == 1
+    assert "version" not in delta
+    response.close()
+
+
+def test_redemption_rate(store, monkeypatch):
+    hub = bot.StatusHub(interval=0)
+    hub.get()
+    monkeypatch.setattr(bot.current_bot(), "redemptions_total", bot.current_bot().redemptions_total + 10)
+    hub._built_at -= 2  # pretend two seconds passed
+    _, snapshot = hub.get()
+    assert 4 <= snapshot["redemptions_per_sec"] <= 5
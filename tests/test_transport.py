@@ -0,0 +1,110 @@
+import asyncio
+
+import pytest
+from telegram.error import TimedOut
+from telegram.request import HTTPXRequest
+
+import bot
+
+
+def test_pool_overrides_are_validated(monkeypatch):
+    monkeypatch.setattr(bot, "BOT_API_POOLS", '{"bulk": {"pool_size": 4, "keepalive": 5}}')
+    config = bot.load_transport_config()
+    assert config["bulk"]["pool_size"] == 4 and config["bulk"]["keepalive"] == 5
+    assert config["interactive"] == bot.TRANSPORT_DEFAULTS["interactive"]
+
+    for bad in ('{"rewards": {}}', '{"bulk": {"size": 4}}', '{"bulk": {"pool_size": 0}}', "[]"):
+        monkeypatch.setattr(bot, "BOT_API_POOLS", bad)
+        with pytest.raises(ValueError):
+            bot.load_transport_config()
+
+
+def test_pool_wait_is_measured(monkeypatch):
+    async def slow_request(self, *args, **kwargs):
+        await asyncio.sleep(0.05)
+        return 200, b"{}"
+
+    monkeypatch.setattr(HTTPXRequest, "do_request", slow_request)
+    settings = {**bot.TRANSPORT_DEFAULTS["bulk"], "pool_size": 2, "pool_timeout": 1}
+    request = bot.MeteredRequest("bulk", **settings)
+
+    async def burst():
+        await asyncio.gather(*(request.do_request("url", "POST") for _ in range(4)))
+
+    asyncio.run(burst())
+    metrics = request.metrics()
+    assert metrics["requests"] == 4
+    assert metrics["waited"] == 2
+    assert metrics["pool_wait_ms"]["max"] >= 40
+    assert metrics["in_flight"] == 0
+
+
+def test_pool_timeout_raises_timed_out(monkeypatch):
+    async def slow_request(self, *args, **kwargs):
+        await asyncio.sleep(0.2)
+        return 200, b"{}"
+
+    monkeypatch.setattr(HTTPXRequest, "do_request", slow_request)
+    settings = {**bot.TRANSPORT_DEFAULTS["interactive"], "pool_size": 1, "pool_timeout": 0.01}
+    request = bot.MeteredRequest("interactive", **settings)
+
+    async def burst():
+        return await asyncio.gather(*(request.do_request("url", "POST") for _ in range(2)), return_exceptions=True)
+
+    results = asyncio.run(burst())
+    assert any(isinstance(r, TimedOut) for r in results)
+    assert request.metrics()["pool_timeouts"] == 1
+
+
+def test_background_traffic_uses_the_bulk_pool(monkeypatch):
+    instance = bot.current_bot()
+    for attr in ("application", "bulk_bot", "transport"):
+        monkeypatch.setattr(instance, attr, getattr(instance, attr))  # restored after the test
+    app = bot.build_application(instance)
+    assert app.bot.request is instance.transport["interactive"]
+    assert instance.bulk_bot.request is instance.transport["bulk"]
+    assert bot.bulk_bot(app.bot) is instance.bulk_bot
+
+
+class PooledBot:
+    """Sends every copy through a MeteredRequest and counts the calls that went out."""
+
+    def __init__(self, request):
+        self.request = request
+        self.sent = 0
+
+    async def copy_message(self, **kwargs):
+        await self.request.do_request("url", "POST")
+        self.sent += 1
+
+    async def edit_message_text(self, **kwargs):
+        pass
+
+
+def test_stopped_broadcast_stops_sending_on_a_contended_pool(store, monkeypatch):
+    async def slow_request(self, *args, **kwargs):
+        await asyncio.sleep(0.002)
+        return 200, b"{}"
+
+    monkeypatch.setattr(HTTPXRequest, "do_request", slow_request)
+    monkeypatch.setattr(bot, "broadcast_limiter", bot.RateLimiter(100_000, burst=1000))
+    settings = {**bot.TRANSPORT_DEFAULTS["bulk"], "pool_size": 2, "pool_timeout": 5}
+
+    async def trial():
+        sender = PooledBot(bot.MeteredRequest("bulk", **settings))
+        bot.save_json_state(bot.BROADCAST_RECIPIENTS_FILE, list(range(1, 5001)))
+        job = {
+            "code": None, "from_chat_id": 1, "message_id": 1, "status_chat_id": 1, "status_message_id": 1,
+            "started_at": 0, "cursor": 0, "sent": 0, "blocked": 0, "failed": 0, "skipped": 0,
+        }
+        bot.start_broadcast_task(sender, job)
+        await asyncio.sleep(0.02)
+        await bot.stop_broadcast()
+        stopped_at = sender.sent
+        await asyncio.sleep(0.05)
+        return sender.sent - stopped_at, sender.request.in_flight
+
+    for _ in range(20):
+        sent_after_stop, in_flight = asyncio.run(trial())
+        assert sent_after_stop == 0
+        assert in_flight == 0